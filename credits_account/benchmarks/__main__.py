@@ -0,0 +1,5 @@
+import sys
+
+from credits_account.benchmarks.credit_benchmarks import main
+
+sys.exit(main())
@@ -0,0 +1,237 @@
+import argparse
+import json
+import platform
+import statistics
+import sys
+import timeit
+from copy import deepcopy
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from credits_account.benchmarks.synthetic_accounts import (
+    SyntheticAccountGenerator,
+    SyntheticAccountSpec,
+)
+from credits_account.domain.entities import CreditAccount
+from credits_account.infra.repository.in_memory_credit_account_repository import (
+    InMemoryCreditAccountRepository,
+)
+
+TIERS: Dict[str, SyntheticAccountSpec] = {
+    "small": SyntheticAccountSpec(transactions=10, movements_per_transaction=10),
+    "medium": SyntheticAccountSpec(transactions=100, movements_per_transaction=20),
+    "large": SyntheticAccountSpec(transactions=1000, movements_per_transaction=50),
+}
+
+
+@dataclass
+class BenchmarkResult:
+    tier: str
+    operation: str
+    transactions: int
+    movements_per_transaction: int
+    repeat: int
+    min: float
+    median: float
+    mean: float
+    number: int = 1
+
+
+@dataclass
+class BenchmarkComparison:
+    tier: str
+    operation: str
+    baseline: float
+    current: float
+
+    @property
+    def ratio(self) -> float:
+        return self.current / self.baseline if self.baseline else float("inf")
+
+
+def copy_account(account: CreditAccount) -> CreditAccount:
+    copied_account = CreditAccount.restore(
+        company_id=account.company_id,
+        reference_date=account._reference_date,
+        credit_state_list=deepcopy(account._credit_state_list),
+    )
+    copied_account.version = account.version
+    return copied_account
+
+
+def run_benchmarks(
+    tiers: Sequence[str] = ("small", "medium"),
+    repeat: int = 5,
+    number: int = 3,
+    on_result: Optional[Callable[[BenchmarkResult], None]] = None,
+) -> List[BenchmarkResult]:
+    """Times every operation on accounts of each tier with ``timeit.repeat``.
+
+    Each of the ``repeat`` rounds calls the operation ``number`` times and
+    records the time per call. Every call runs on a fresh copy of the
+    generated account; building the copies is not timed.
+    """
+    assert repeat > 0, "The repeat should be greater than 0"
+    assert number > 0, "The number should be greater than 0"
+    results: List[BenchmarkResult] = []
+    for tier in tiers:
+        spec = TIERS[tier]
+        generator = SyntheticAccountGenerator(spec)
+        account = generator.make_account()
+        origin = generator.get_refundable_origin(account)
+        repository, (company_id, *_) = generator.make_repository(1)
+
+        def load_and_consume() -> Tuple[InMemoryCreditAccountRepository, CreditAccount]:
+            # every saved copy needs a repository of its own to not be stale
+            shard = repository.shard([company_id])
+            loaded_account = shard.load_account_by_company_id(company_id)
+            assert loaded_account, "The generated account should be loaded"
+            loaded_account._reference_date = spec.reference_date
+            loaded_account.consume(1, "Você consumiu créditos")
+            return shard, loaded_account
+
+        operations: Dict[str, Any] = {
+            "add": (
+                lambda: copy_account(account),
+                lambda state: state.add(
+                    100, "Você adicionou créditos", "subscription"
+                ),
+            ),
+            "consume": (
+                lambda: copy_account(account),
+                lambda state: state.consume(1, "Você consumiu créditos"),
+            ),
+            "refund": (
+                lambda: copy_account(account),
+                lambda state: state.refund(*origin),
+            ),
+            "expire": (lambda: copy_account(account), lambda state: state.expire()),
+            "renew": (lambda: copy_account(account), lambda state: state.renew()),
+            "get_balance": (
+                lambda: copy_account(account),
+                lambda state: state.get_balance(),
+            ),
+            "repository_load": (
+                lambda: company_id,
+                repository.load_account_by_company_id,
+            ),
+            "repository_save": (
+                load_and_consume,
+                lambda state: state[0].save(state[1]),
+            ),
+        }
+        for operation, (setup, call) in operations.items():
+            timings = _time(setup, call, repeat, number)
+            result = BenchmarkResult(
+                tier=tier,
+                operation=operation,
+                transactions=spec.transactions,
+                movements_per_transaction=spec.movements_per_transaction,
+                repeat=repeat,
+                min=min(timings),
+                median=statistics.median(timings),
+                mean=statistics.fmean(timings),
+                number=number,
+            )
+            results.append(result)
+            if on_result:
+                on_result(result)
+    return results
+
+
+def write_results(results: List[BenchmarkResult], path: str) -> None:
+    document = {
+        "created_at": datetime.now().isoformat(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "results": [asdict(result) for result in results],
+    }
+    with open(path, "w") as output:
+        json.dump(document, output, indent=2)
+
+
+def load_results(path: str) -> List[BenchmarkResult]:
+    with open(path) as results_file:
+        document = json.load(results_file)
+    return [BenchmarkResult(**result) for result in document["results"]]
+
+
+def compare_results(
+    baseline: List[BenchmarkResult], current: List[BenchmarkResult]
+) -> List[BenchmarkComparison]:
+    """Pairs the min of every operation and tier present in both runs.
+
+    The fastest round is the one least disturbed by the rest of the machine,
+    so it is the steadiest figure to compare across runs.
+    """
+    baseline_mins = {
+        (result.tier, result.operation): result.min for result in baseline
+    }
+    return [
+        BenchmarkComparison(
+            result.tier,
+            result.operation,
+            baseline_mins[(result.tier, result.operation)],
+            result.min,
+        )
+        for result in current
+        if (result.tier, result.operation) in baseline_mins
+    ]
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Credit account benchmarks")
+    parser.add_argument(
+        "--tiers", default="small,medium", help=f"comma separated, any of {list(TIERS)}"
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--number", type=int, default=3, help="calls per round")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare with the results of a JSON file")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=1.2,
+        help="exit with 1 when a min is this many times the baseline's",
+    )
+    args = parser.parse_args(argv)
+    results = run_benchmarks(
+        args.tiers.split(","),
+        args.repeat,
+        args.number,
+        on_result=lambda result: print(
+            f"{result.tier:<8} {result.operation:<16} "
+            f"median {result.median * 1000:10.3f} ms  "
+            f"min {result.min * 1000:10.3f} ms"
+        ),
+    )
+    if args.output:
+        write_results(results, args.output)
+    if not args.baseline:
+        return 0
+    regressions = 0
+    for comparison in compare_results(load_results(args.baseline), results):
+        regressed = comparison.ratio > args.threshold
+        regressions += regressed
+        print(
+            f"{comparison.tier:<8} {comparison.operation:<16} "
+            f"{comparison.ratio:6.2f}x{'  REGRESSION' if regressed else ''}"
+        )
+    return 1 if regressions else 0
+
+
+def _time(
+    setup: Callable[[], Any],
+    operation: Callable[[Any], Any],
+    repeat: int,
+    number: int,
+) -> List[float]:
+    states: List[Any] = []
+    rounds = timeit.repeat(
+        lambda: operation(states.pop()),
+        lambda: states.extend(setup() for _ in range(number)),
+        repeat=repeat,
+        number=number,
+    )
+    return [seconds / number for seconds in rounds]
@@ -0,0 +1,118 @@
+import random
+import uuid
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from typing import List, Tuple
+
+from credits_account.domain.entities import CreditAccount, CreditTransaction
+from credits_account.domain.entities.credit_movement import AddCreditMovement
+from credits_account.infra.repository.in_memory_credit_account_repository import (
+    CreditAccountRow,
+    InMemoryCreditAccountRepository,
+)
+
+
+@dataclass(frozen=True)
+class SyntheticAccountSpec:
+    transactions: int
+    movements_per_transaction: int
+    refund_ratio: float = 0.1
+    history_days: int = 365
+    seed: int = 0
+    reference_date: date = date(2023, 1, 1)
+
+
+class SyntheticAccountGenerator:
+    """Builds the same accounts for the same spec, run after run.
+
+    Transactions are created evenly over the ``history_days`` before the
+    reference date, so the oldest ones are expired. Each one gets an ADD and
+    ``movements_per_transaction - 1`` consumes with their own origin, and about
+    ``refund_ratio`` of those consumes are refunded by an extra movement.
+    """
+
+    def __init__(self, spec: SyntheticAccountSpec) -> None:
+        assert spec.transactions > 0, "The transactions should be greater than 0"
+        assert (
+            spec.movements_per_transaction > 0
+        ), "The movements per transaction should be greater than 0"
+        self.spec = spec
+
+    def make_account(self, account_number: int = 0) -> CreditAccount:
+        account = self._build_account(account_number)
+        account.mark_as_persisted()
+        return account
+
+    def _build_account(self, account_number: int) -> CreditAccount:
+        rnd = random.Random(f"{self.spec.seed}:{account_number}")
+        company_id = uuid.UUID(int=rnd.getrandbits(128))
+        transactions = [
+            self._make_transaction(rnd, company_id, position)
+            for position in range(self.spec.transactions)
+        ]
+        return CreditAccount(
+            company_id, transactions, reference_date=self.spec.reference_date
+        )
+
+    def make_repository(
+        self, accounts: int
+    ) -> Tuple[InMemoryCreditAccountRepository, List[uuid.UUID]]:
+        repository = InMemoryCreditAccountRepository()
+        company_ids: List[uuid.UUID] = []
+        for account_number in range(accounts):
+            account = self._build_account(account_number)
+            reference_date = datetime.combine(self.spec.reference_date, time())
+            repository.credit_account_rows[account.company_id] = CreditAccountRow(
+                reference_date,
+                reference_date,
+                id=account.get_id(),
+                balance=0,
+                company_id=account.company_id,
+            )
+            repository.save(account)
+            # rows are stamped with the save date, back-date them to the history
+            for transaction in account._credit_state_list:
+                assert transaction.id, "Saved transactions should have an id"
+                repository.credit_rows[transaction.id].created_at = datetime.combine(
+                    transaction.creation_date, time()
+                )
+            company_ids.append(account.company_id)
+        return repository, company_ids
+
+    def get_refundable_origin(self, account: CreditAccount) -> Tuple[str, str]:
+        for transaction in reversed(account._credit_state_list):
+            for object_type, object_id in transaction.list_movement_origins():
+                if transaction.can_refund(object_type, object_id):
+                    return object_type, object_id
+        raise ValueError("The account has no refundable consume")
+
+    def _make_transaction(
+        self, rnd: random.Random, company_id: uuid.UUID, position: int
+    ) -> CreditTransaction:
+        days_ago = (
+            self.spec.history_days
+            * (self.spec.transactions - 1 - position)
+            // self.spec.transactions
+        )
+        creation_date = self.spec.reference_date - timedelta(days=days_ago)
+        transaction = CreditTransaction(
+            creation_date=creation_date,
+            account_id=company_id,
+            type="subscription",
+            contract_service_id=uuid.UUID(int=rnd.getrandbits(128)),
+        )
+        consumes = self.spec.movements_per_transaction - 1
+        transaction.register_movement(
+            AddCreditMovement(consumes * 10 + 100, "Você adicionou créditos")
+        )
+        for consume in range(consumes):
+            object_id = f"{position}-{consume}"
+            transaction.consume(
+                rnd.randint(1, 10),
+                ignore_is_expired_check=True,
+                object_type="booking",
+                object_id=object_id,
+            )
+            if rnd.random() < self.spec.refund_ratio:
+                transaction.refund("booking", object_id)
+        return transaction
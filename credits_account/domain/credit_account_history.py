@@ -1,36 +1,186 @@
-from typing import Any, Dict, List, Set, Tuple
-from itertools import chain
+from bisect import bisect_left, bisect_right, insort
+from dataclasses import dataclass, field
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    overload,
+)
 
 
-class CreditAccountHistory:
+class OperationsView(Sequence[Any]):
+    """Read-only view over the history's list of one operation type."""
+
+    def __init__(self, operations: List[Any]) -> None:
+        self._operations = operations
+
+    @overload
+    def __getitem__(self, position: int) -> Any:
+        ...
+
+    @overload
+    def __getitem__(self, position: slice) -> List[Any]:
+        ...
+
+    def __getitem__(self, position: Any) -> Any:
+        return self._operations[position]
+
+    def __len__(self) -> int:
+        return len(self._operations)
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self._operations)
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, OperationsView):
+            return self._operations == other._operations
+        return self._operations == other
+
+
+class HistoryCursor(NamedTuple):
+    """Position right after an operation returned in a page."""
+
+    timestamp: Any
+    sequence: int
+
+
+@dataclass
+class HistoryPage:
+    operations: List[Any] = field(default_factory=list)
+    next_cursor: Optional[HistoryCursor] = None
+
+
+class _Timeline:
+    """Operations sorted by (timestamp, registration sequence)."""
+
     def __init__(self) -> None:
-        #TODO: Create a base class to operations and assign the new type below
-        self._operations:Dict[str, Any] = {}
-    
+        self.keys: List[HistoryCursor] = []
+        self.operations: List[Any] = []
+
+    def add(self, key: HistoryCursor, operation: Any) -> None:
+        if not self.keys or self.keys[-1] <= key:
+            self.keys.append(key)
+            self.operations.append(operation)
+            return
+        position = bisect_right(self.keys, key)
+        insort(self.keys, key)
+        self.operations.insert(position, operation)
+
+    def page(
+        self,
+        start: Any,
+        end: Any,
+        cursor: Optional[HistoryCursor],
+        limit: int,
+    ) -> HistoryPage:
+        first = 0 if start is None else bisect_left(self.keys, (start,))
+        if cursor is not None:
+            first = max(first, bisect_right(self.keys, tuple(cursor)))
+        last = len(self.keys) if end is None else bisect_left(self.keys, (end,))
+        stop = min(last, first + limit)
+        if stop <= first:
+            return HistoryPage()
+        next_cursor = self.keys[stop - 1] if stop < last else None
+        return HistoryPage(self.operations[first:stop], next_cursor)
+
+
+def _created_at(operation: Any) -> Any:
+    return operation.created_at
+
+
+class CreditAccountHistory:
+    def __init__(self, timestamp_of: Callable[[Any], Any] = _created_at) -> None:
+        # TODO: Create a base class to operations and assign the new type below
+        self._operations: Dict[str, Any] = {}
+        self._operations_by_id: Dict[Any, Any] = {}
+        self._credits_by_id: Dict[Any, Any] = {}
+        self._members: Dict[int, Any] = {}
+        self._timestamp_of = timestamp_of
+        self._timeline = _Timeline()
+        self._timelines_by_type: Dict[str, _Timeline] = {}
+        self._sequence = 0
+
     def list_operation_types(self) -> Tuple[str, ...]:
         return tuple(self._operations)
-    
+
     def register_operation(self, *operations: Any) -> None:
         for operation in operations:
             operation_type = operation.type.upper()
             if operation_type not in self._operations:
                 self._operations[operation_type] = []
             self._operations[operation_type].append(operation)
-    
-    def get_operations(self, operation_type:str) -> List[Any]:
-        return self._operations.get(operation_type.upper(), [])
-    
+            self._index(operation, self._operations_by_id)
+            key = HistoryCursor(self._timestamp_of(operation), self._sequence)
+            self._sequence += 1
+            self._timeline.add(key, operation)
+            if operation_type not in self._timelines_by_type:
+                self._timelines_by_type[operation_type] = _Timeline()
+            self._timelines_by_type[operation_type].add(key, operation)
+            for credit in operation.credits:
+                self._index(credit, self._credits_by_id)
+
+    def get_operations(self, operation_type: str) -> Sequence[Any]:
+        return OperationsView(self._operations.get(operation_type.upper(), []))
+
+    def query(
+        self,
+        start: Any = None,
+        end: Any = None,
+        operation_type: Optional[str] = None,
+        limit: int = 50,
+        cursor: Optional[HistoryCursor] = None,
+    ) -> HistoryPage:
+        """A page of operations with ``start <= timestamp < end`` in time order.
+
+        Pass the ``next_cursor`` of a page to get the following one; it is
+        None on the last page. Timestamps must be comparable with each other
+        and with the bounds.
+        """
+        assert limit > 0, "The page size should be greater than 0"
+        timeline = self._timeline
+        if operation_type:
+            timeline = self._timelines_by_type.get(
+                operation_type.upper(), _Timeline()
+            )
+        return timeline.page(start, end, cursor, limit)
+
+    def get_operation(self, operation_id: Any) -> Optional[Any]:
+        return self._operations_by_id.get(operation_id)
+
+    def get_credit(self, credit_id: Any) -> Optional[Any]:
+        return self._credits_by_id.get(credit_id)
+
     def __iter__(self) -> Any:
         for operation_list in self._operations.values():
             for operation in operation_list:
                 yield operation
-    
-    def __contains__(self, other:Any) -> bool:
-        operation_list = []
-        for operation_type_list in self._operations.values():
-            operation_list.extend(operation_type_list)
-        credit_list = [credit for operation in operation_list for credit in operation.credits]
-        if other in chain(operation_list, credit_list):
+
+    def __contains__(self, other: Any) -> bool:
+        """Whether ``other`` is a registered operation or credit.
+
+        Matches the very same object, or an equal one with the same ``id``.
+        Without an ``id`` every member is compared until an equal one is found.
+        """
+        if id(other) in self._members:
             return True
+        other_id = getattr(other, "id", None)
+        if other_id is None:
+            return any(member == other for member in self._members.values())
+        for index in (self._operations_by_id, self._credits_by_id):
+            member = index.get(other_id)
+            if member is not None and member == other:
+                return True
         return False
 
+    def _index(self, member: Any, index_by_id: Dict[Any, Any]) -> None:
+        # keeping the member alive keeps its id() from being reused
+        self._members[id(member)] = member
+        member_id = getattr(member, "id", None)
+        if member_id is not None and member_id not in index_by_id:
+            index_by_id[member_id] = member
@@ -0,0 +1,162 @@
+from bisect import bisect_right
+from datetime import date
+from typing import Dict, List, Tuple
+
+from credits_account.domain.entities.credit_transaction import CreditTransaction
+
+
+class CreditExpirationIndex:
+    """Keeps an account's transactions ordered by expiration date.
+
+    The remaining value of every transaction is stored in a Fenwick tree
+    following that order, so the value of the transactions expiring up to a
+    date is a bisect plus a prefix sum. Transactions carrying an EXPIRE
+    movement are expired whatever the date, so they are summed apart.
+
+    The tree is built in one linear pass from the sorted transactions. An
+    insert out of order, or a removal, only marks it stale, and it is
+    rebuilt once before the next query that sums it.
+    """
+
+    def __init__(self, transactions: List[CreditTransaction] = []) -> None:
+        self._keys: List[Tuple[date, int]] = []
+        self._ordered: List[CreditTransaction] = []
+        self._positions: Dict[int, int] = {}
+        self._live_values: Dict[int, int] = {}
+        self._flagged_values: Dict[int, int] = {}
+        self._tree: List[int] = [0]
+        self._live_total = 0
+        self._flagged_total = 0
+        self._sequence = 0
+        self._stale_tree = True
+        for transaction in sorted(transactions, key=_expiration_date):
+            if transaction in self:
+                continue
+            self._keys.append((transaction.get_expiration_date(), self._sequence))
+            self._sequence += 1
+            self._positions[id(transaction)] = len(self._ordered)
+            self._ordered.append(transaction)
+            self._live_values[id(transaction)] = 0
+            self._flagged_values[id(transaction)] = 0
+            self.update(transaction)
+        self._rebuild()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, transaction: CreditTransaction) -> bool:
+        return id(transaction) in self._positions
+
+    def add(self, transaction: CreditTransaction) -> None:
+        if transaction in self:
+            self.update(transaction)
+            return
+        key = (transaction.get_expiration_date(), self._sequence)
+        self._sequence += 1
+        self._live_values[id(transaction)] = 0
+        self._flagged_values[id(transaction)] = 0
+        position = bisect_right(self._keys, key)
+        self._keys.insert(position, key)
+        self._ordered.insert(position, transaction)
+        self._positions[id(transaction)] = position
+        if not self._stale_tree and position == len(self._tree) - 1:
+            self._append_to_tree(0)
+        else:
+            self._stale_tree = True
+        self.update(transaction)
+
+    def update(self, transaction: CreditTransaction) -> None:
+        """Syncs the index with the current remaining value of ``transaction``."""
+        if transaction not in self:
+            self.add(transaction)
+            return
+        transaction_id = id(transaction)
+        remaining_value = transaction.get_remaining_value()
+        live_value, flagged_value = remaining_value, 0
+        if transaction.has_expired_operation():
+            live_value, flagged_value = 0, remaining_value
+        live_delta = live_value - self._live_values[transaction_id]
+        if live_delta:
+            self._live_values[transaction_id] = live_value
+            self._live_total += live_delta
+            if not self._stale_tree:
+                self._add_to_tree(self._positions[transaction_id], live_delta)
+        flagged_delta = flagged_value - self._flagged_values[transaction_id]
+        if flagged_delta:
+            self._flagged_values[transaction_id] = flagged_value
+            self._flagged_total += flagged_delta
+
+    def remove(self, *transactions: CreditTransaction) -> None:
+        removed = {
+            id(transaction) for transaction in transactions if transaction in self
+        }
+        if not removed:
+            return
+        for transaction_id in removed:
+            del self._positions[transaction_id]
+            self._live_total -= self._live_values.pop(transaction_id)
+            self._flagged_total -= self._flagged_values.pop(transaction_id)
+        kept = [
+            (key, transaction)
+            for key, transaction in zip(self._keys, self._ordered)
+            if id(transaction) not in removed
+        ]
+        self._keys = [key for key, _ in kept]
+        self._ordered = [transaction for _, transaction in kept]
+        self._stale_tree = True
+
+    def get_balance(self, at: date) -> int:
+        return self._live_total - self._sum_expiring_until(at)
+
+    def get_expired_value(self, at: date) -> int:
+        return self._sum_expiring_until(at) + self._flagged_total
+
+    def get_expiring_until(self, at: date) -> List[CreditTransaction]:
+        return self._ordered[: self._count_expiring_until(at)]
+
+    def _count_expiring_until(self, at: date) -> int:
+        return bisect_right(self._keys, (at, self._sequence))
+
+    def _sum_expiring_until(self, at: date) -> int:
+        if self._stale_tree:
+            self._rebuild()
+        return self._prefix_sum(self._count_expiring_until(at))
+
+    def _rebuild(self) -> None:
+        self._positions = {
+            id(transaction): position
+            for position, transaction in enumerate(self._ordered)
+        }
+        # every node adds its sum to its parent, in one pass over the array
+        self._tree = [0] + [
+            self._live_values[id(transaction)] for transaction in self._ordered
+        ]
+        for index in range(1, len(self._tree)):
+            parent = index + (index & -index)
+            if parent < len(self._tree):
+                self._tree[parent] += self._tree[index]
+        self._stale_tree = False
+
+    def _append_to_tree(self, value: int) -> None:
+        index = len(self._tree)
+        lowest_bit = index & -index
+        self._tree.append(
+            value + self._prefix_sum(index - 1) - self._prefix_sum(index - lowest_bit)
+        )
+
+    def _add_to_tree(self, position: int, value: int) -> None:
+        index = position + 1
+        while index < len(self._tree):
+            self._tree[index] += value
+            index += index & -index
+
+    def _prefix_sum(self, count: int) -> int:
+        total = 0
+        while count > 0:
+            total += self._tree[count]
+            count -= count & -count
+        return total
+
+
+def _expiration_date(transaction: CreditTransaction) -> date:
+    return transaction.get_expiration_date()
@@ -13,3 +13,24 @@ class OperationCreditsEnum(enum.Enum):
     @classmethod
     def as_tuple(cls) -> List[Tuple[str, str]]:
         return [(each.name, each.value) for each in OperationCreditsEnum]
+
+    @property
+    def code(self) -> "OperationCode":
+        return OperationCode[self.name]
+
+
+@enum.unique
+class OperationCode(enum.IntEnum):
+    ADD = 1
+    CONSUME = 2
+    EXPIRE = 3
+    REFUND = 4
+    RENEW = 5
+
+    @classmethod
+    def from_operation_type(cls, operation_type: str) -> "OperationCode":
+        return cls[operation_type.upper()]
+
+    @property
+    def operation(self) -> OperationCreditsEnum:
+        return OperationCreditsEnum[self.name]
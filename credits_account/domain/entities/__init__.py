@@ -1,2 +1,5 @@
 from .credit_account import CreditAccount
 from .credit_transaction import CreditTransaction
+from .credit_transaction_snapshot import CreditTransactionSnapshot
+from .consume_request import ConsumeRequest, ConsumeResult
+from .archived_credit_period import ArchivedCreditPeriod
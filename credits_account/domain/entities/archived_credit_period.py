@@ -0,0 +1,87 @@
+import uuid
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Dict, List, Tuple
+
+from credits_account.domain.entities.credit_transaction import CreditTransaction
+
+Origin = Tuple[str, str]
+
+
+@dataclass
+class ArchivedCreditPeriod:
+    """Summary of the compacted transactions that expired in one month.
+
+    Only aggregates and credit ids are kept: consume origins that can still be
+    refunded point at the ids of the credits holding them, and
+    ``refunded_origins`` counts the archived credits that refunded an origin.
+    """
+
+    period: date
+    credit_ids: List[uuid.UUID] = field(default_factory=list, repr=False)
+    remaining_value: int = 0
+    consumed_value: int = 0
+    refunded_value: int = 0
+    expired_value: int = 0
+    refundable_origins: Dict[Origin, List[uuid.UUID]] = field(
+        default_factory=dict, repr=False
+    )
+    refunded_origins: Dict[Origin, int] = field(default_factory=dict, repr=False)
+
+    @staticmethod
+    def period_of(transaction: CreditTransaction) -> date:
+        expiration_date = transaction.get_expiration_date()
+        return date(expiration_date.year, expiration_date.month, 1)
+
+    def archive(self, transaction: CreditTransaction) -> None:
+        assert transaction.id, "Only persisted credits can be archived"
+        self.credit_ids.append(transaction.id)
+        self._add_totals(transaction, 1)
+        for origin in transaction.list_movement_origins():
+            if transaction.can_refund(*origin):
+                self.refundable_origins.setdefault(origin, []).append(transaction.id)
+            else:
+                self.refunded_origins[origin] = self.refunded_origins.get(origin, 0) + 1
+
+    def unarchive(self, transaction: CreditTransaction) -> None:
+        self.credit_ids = [
+            credit_id for credit_id in self.credit_ids if credit_id != transaction.id
+        ]
+        self._add_totals(transaction, -1)
+        for origin in transaction.list_movement_origins():
+            if transaction.can_refund(*origin):
+                credit_ids = [
+                    credit_id
+                    for credit_id in self.refundable_origins.pop(origin, [])
+                    if credit_id != transaction.id
+                ]
+                if credit_ids:
+                    self.refundable_origins[origin] = credit_ids
+            elif self.refunded_origins.get(origin, 0) > 1:
+                self.refunded_origins[origin] -= 1
+            else:
+                self.refunded_origins.pop(origin, None)
+
+    def copy(self) -> "ArchivedCreditPeriod":
+        return ArchivedCreditPeriod(
+            period=self.period,
+            credit_ids=list(self.credit_ids),
+            remaining_value=self.remaining_value,
+            consumed_value=self.consumed_value,
+            refunded_value=self.refunded_value,
+            expired_value=self.expired_value,
+            refundable_origins={
+                origin: list(credit_ids)
+                for origin, credit_ids in self.refundable_origins.items()
+            },
+            refunded_origins=dict(self.refunded_origins),
+        )
+
+    def __len__(self) -> int:
+        return len(self.credit_ids)
+
+    def _add_totals(self, transaction: CreditTransaction, sign: int) -> None:
+        self.remaining_value += sign * transaction.get_remaining_value()
+        self.consumed_value += sign * transaction.get_consumed_value()
+        self.refunded_value += sign * transaction.get_refunded_value()
+        self.expired_value += sign * transaction.get_expired_movement_value()
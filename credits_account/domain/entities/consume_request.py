@@ -0,0 +1,19 @@
+from dataclasses import dataclass
+from datetime import date
+from typing import Optional
+
+
+@dataclass
+class ConsumeRequest:
+    value: int
+    description: str
+    consumed_at: Optional[date] = None
+    object_type: str = ""
+    object_id: str = ""
+
+
+@dataclass
+class ConsumeResult:
+    request: ConsumeRequest
+    consumed: bool
+    error: str = ""
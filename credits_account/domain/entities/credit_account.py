@@ -1,9 +1,20 @@
 from datetime import date, datetime
-from typing import List, Optional
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
 from uuid import UUID, uuid1
 
+from credits_account.domain import instrumentation
+from credits_account.domain.credit_expiration_index import CreditExpirationIndex
+from credits_account.domain.entities.archived_credit_period import (
+    ArchivedCreditPeriod,
+)
+from credits_account.domain.entities.consume_request import (
+    ConsumeRequest,
+    ConsumeResult,
+)
 from credits_account.domain.entities.credit_transaction import CreditTransaction
 
+ArchiveLoader = Callable[[List[UUID]], List[CreditTransaction]]
+
 
 class CreditAccount:
     def __init__(
@@ -11,32 +22,47 @@ class CreditAccount:
         company_id: UUID,
         credit_state_list: List[CreditTransaction],
         reference_date: date = date.today(),
+        archived_periods: Iterable[ArchivedCreditPeriod] = (),
+        archive_loader: Optional[ArchiveLoader] = None,
     ) -> None:
         self._id = company_id
+        self.version = 0
         self._credit_state_list: List[CreditTransaction] = credit_state_list
         self._reference_date: date = reference_date
         self._transactions: List[CreditTransaction] = [*credit_state_list]
+        self._expiration_index = CreditExpirationIndex(credit_state_list)
+        self._transactions_by_origin: Dict[
+            Tuple[str, str], Dict[int, CreditTransaction]
+        ] = {}
+        self._pending_transactions: Dict[int, CreditTransaction] = {}
+        self._archive: Dict[date, ArchivedCreditPeriod] = {
+            period.period: period for period in archived_periods
+        }
+        self._archive_loader = archive_loader
+        self._archived_transactions: Dict[UUID, CreditTransaction] = {}
+        self._pending_archive = False
+        for transaction in credit_state_list:
+            self._register_origins(transaction)
+            if transaction.get_pending_movements():
+                self._pending_transactions[id(transaction)] = transaction
 
     @staticmethod
     def restore(
         company_id: UUID,
         reference_date: date,
         credit_state_list: List[CreditTransaction] = [],
+        archived_periods: Iterable[ArchivedCreditPeriod] = (),
+        archive_loader: Optional[ArchiveLoader] = None,
     ) -> "CreditAccount":
         account = CreditAccount(
             company_id,
             credit_state_list=credit_state_list,
             reference_date=reference_date,
+            archived_periods=archived_periods,
+            archive_loader=archive_loader,
         )
         return account
 
-    def __ensure_account_has_enough_balance_to_consume(self, value: int) -> bool:
-        if value > self.get_balance() or value <= 0:
-            raise ValueError(
-                f"CreditAccount {self.get_id()} don't have enough balance to consume"
-            )
-        return True
-
     def add(self, value: int, description: str, credit_type: str) -> None:
         credit_state = CreditTransaction(
             creation_date=self._reference_date,
@@ -51,6 +77,7 @@ class CreditAccount:
         credit_state.add(value, description)
         self._credit_state_list.append(credit_state)
         self._transactions.append(credit_state)
+        self._track(credit_state)
 
     def consume(
         self,
@@ -60,36 +87,229 @@ class CreditAccount:
         object_type: str = "",
         object_id: str = "",
     ) -> None:
-        if type(consumed_at) == datetime:
-            consumed_at = consumed_at.date()
-        self.__ensure_account_has_enough_balance_to_consume(value)
-        total = int(value)
-        for transaction in self._credit_state_list[::-1]:
-            not_consumed_credit = transaction.consume(
-                total,
-                reference_date=consumed_at
-                or date(
-                    self._reference_date.year,
-                    self._reference_date.month,
-                    self._reference_date.day,
-                ),
-                object_type=object_type,
-                object_id=object_id,
-                description=description,
+        request = ConsumeRequest(
+            value, description, consumed_at, object_type, object_id
+        )
+        result = self.consume_many([request])[0]
+        if not result.consumed:
+            raise ValueError(result.error)
+
+    def consume_many(self, requests: List[ConsumeRequest]) -> List[ConsumeResult]:
+        """Consumes each request in order against a single balance computation.
+
+        Requests are atomic and independent: a request that is not positive or
+        does not fit in what is left of the balance fails without consuming
+        anything, and the following requests are still attempted.
+        """
+        not_enough_balance = (
+            f"CreditAccount {self.get_id()} don't have enough balance to consume"
+        )
+        available = self.get_balance()
+        transactions = self._credit_state_list[::-1]
+        remaining_values = [t.get_remaining_value() for t in transactions]
+        first_available = 0
+        scanned = 0
+        results: List[ConsumeResult] = []
+        for request in requests:
+            consumed_at = request.consumed_at
+            if type(consumed_at) == datetime:
+                consumed_at = consumed_at.date()
+            consumed_at = consumed_at or date(
+                self._reference_date.year,
+                self._reference_date.month,
+                self._reference_date.day,
             )
-            total = not_consumed_credit
-            if not_consumed_credit < 0:
-                break
+            value = int(request.value)
+            if value > available or value <= 0:
+                results.append(ConsumeResult(request, False, not_enough_balance))
+                continue
+            while (
+                first_available < len(transactions)
+                and remaining_values[first_available] <= 0
+            ):
+                first_available += 1
+            plan: List[Tuple[int, int]] = []
+            missing = value
+            for position in range(first_available, len(transactions)):
+                if missing <= 0:
+                    break
+                scanned += 1
+                if remaining_values[position] <= 0:
+                    continue
+                if transactions[position].is_expired(consumed_at):
+                    continue
+                planned = min(missing, remaining_values[position])
+                plan.append((position, planned))
+                missing -= planned
+            if missing > 0:
+                error = f"{not_enough_balance} at {consumed_at}"
+                results.append(ConsumeResult(request, False, error))
+                continue
+            for position, planned in plan:
+                transaction = transactions[position]
+                transaction.consume(
+                    planned,
+                    reference_date=consumed_at,
+                    object_type=request.object_type,
+                    object_id=request.object_id,
+                    description=request.description,
+                )
+                remaining_values[position] -= planned
+                self._track(transaction)
+                self._register_origins(
+                    transaction, (request.object_type, request.object_id)
+                )
+            available -= value
+            results.append(ConsumeResult(request, True))
+        if instrumentation.enabled:
+            instrumentation.record(
+                "CreditAccount.consume_many", "transactions_scanned", scanned
+            )
+        return results
 
     def expire(self, consumed_at: Optional[date] = None) -> None:
         if type(consumed_at) == datetime:
             consumed_at = consumed_at.date()
-        for transaction in self._credit_state_list[::-1]:
+        expiring = self._expiration_index.get_expiring_until(self._reference_date)
+        for transaction in expiring[::-1]:
             transaction.expire(self._reference_date)
+            self._track(transaction)
+        if instrumentation.enabled:
+            instrumentation.record(
+                "CreditAccount.expire", "transactions_scanned", len(expiring)
+            )
 
     def refund(self, object_type: str, object_id: str) -> bool:
-        for transaction in self._credit_state_list:
-            transaction.refund(object_type, object_id)
+        refunded = False
+        origin = (object_type, object_id)
+        self._unarchive_refundable(origin)
+        for transaction in self._transactions_by_origin.get(origin, {}).values():
+            if not transaction.refund(object_type, object_id):
+                continue
+            self._track(transaction)
+            refunded = True
+        return refunded
+
+    def is_refunded(self, object_type: str, object_id: str) -> bool:
+        origin = (object_type, object_id)
+        for transaction in self._transactions_by_origin.get(origin, {}).values():
+            if not transaction.can_refund(object_type, object_id):
+                return True
+        return any(
+            origin in period.refunded_origins for period in self._archive.values()
+        )
+
+    def compact(self) -> int:
+        """Archives persisted transactions that expired and had their EXPIRE logged.
+
+        Archived transactions leave the working set used by consume, expire,
+        refund and renew, so compaction belongs after the account was expired
+        and renewed. Only their period totals and credit ids are kept; with an
+        ``archive_loader`` the transactions themselves are dropped and loaded
+        again only when a refund of an archived consume brings them back.
+        Returns how many transactions were archived.
+        """
+        archived = [
+            transaction
+            for transaction in self._credit_state_list
+            if transaction.id
+            and transaction.has_expired_operation()
+            and transaction.is_expired(self._reference_date)
+            and not transaction.get_pending_movements()
+        ]
+        if not archived:
+            return 0
+        archived_ids = {id(transaction) for transaction in archived}
+        self._credit_state_list[:] = [
+            transaction
+            for transaction in self._credit_state_list
+            if id(transaction) not in archived_ids
+        ]
+        self._transactions = [
+            transaction
+            for transaction in self._transactions
+            if id(transaction) not in archived_ids
+        ]
+        self._expiration_index.remove(*archived)
+        for transaction in archived:
+            for origin in transaction.list_movement_origins():
+                transactions = self._transactions_by_origin.get(origin, {})
+                transactions.pop(id(transaction), None)
+                if not transactions:
+                    self._transactions_by_origin.pop(origin, None)
+            period = ArchivedCreditPeriod.period_of(transaction)
+            if period not in self._archive:
+                self._archive[period] = ArchivedCreditPeriod(period)
+            self._archive[period].archive(transaction)
+            if not self._archive_loader and transaction.id:
+                self._archived_transactions[transaction.id] = transaction
+        self._pending_archive = True
+        return len(archived)
+
+    def get_archived_periods(self) -> List[ArchivedCreditPeriod]:
+        return [self._archive[period] for period in sorted(self._archive)]
+
+    def get_archived_transactions(self) -> List[CreditTransaction]:
+        """The archived transactions, loaded on demand; changes to them are lost."""
+        credit_ids = [
+            credit_id
+            for period in self.get_archived_periods()
+            for credit_id in period.credit_ids
+        ]
+        if self._archive_loader:
+            return self._archive_loader(credit_ids)
+        return [self._archived_transactions[credit_id] for credit_id in credit_ids]
+
+    def has_pending_archive(self) -> bool:
+        """Whether the archive changed since it was loaded or last persisted."""
+        return self._pending_archive
+
+    def mark_archive_as_persisted(self) -> None:
+        self._pending_archive = False
+
+    def _unarchive_refundable(self, origin: Tuple[str, str]) -> None:
+        for period in list(self._archive.values()):
+            credit_ids = period.refundable_origins.get(origin)
+            if not credit_ids:
+                continue
+            for transaction in self._load_archived(credit_ids):
+                period.unarchive(transaction)
+                self._credit_state_list.append(transaction)
+                self._transactions.append(transaction)
+                self._expiration_index.add(transaction)
+                self._register_origins(transaction)
+            if not period.credit_ids:
+                del self._archive[period.period]
+            self._pending_archive = True
+
+    def _load_archived(self, credit_ids: List[UUID]) -> List[CreditTransaction]:
+        if self._archive_loader:
+            return self._archive_loader(list(credit_ids))
+        return [self._archived_transactions.pop(credit_id) for credit_id in credit_ids]
+
+    def get_pending_transactions(self) -> List[CreditTransaction]:
+        """Transactions holding movements not persisted since the account was loaded."""
+        for transaction_id, transaction in list(self._pending_transactions.items()):
+            if not transaction.get_pending_movements():
+                del self._pending_transactions[transaction_id]
+        return list(self._pending_transactions.values())
+
+    def mark_as_persisted(self) -> None:
+        for transaction in self._pending_transactions.values():
+            transaction.mark_all_as_persisted()
+        self._pending_transactions.clear()
+
+    def _track(self, transaction: CreditTransaction) -> None:
+        self._expiration_index.update(transaction)
+        self._pending_transactions[id(transaction)] = transaction
+
+    def _register_origins(
+        self, transaction: CreditTransaction, *origins: Tuple[str, str]
+    ) -> None:
+        for origin in origins or transaction.list_movement_origins():
+            if origin not in self._transactions_by_origin:
+                self._transactions_by_origin[origin] = {}
+            self._transactions_by_origin[origin][id(transaction)] = transaction
 
     def renew(self) -> None:
         for credit in self._credit_state_list:
@@ -103,26 +323,28 @@ class CreditAccount:
                 continue
             self._transactions.append(renewed_credit)
             self._credit_state_list.append(renewed_credit)
+            self._track(renewed_credit)
+        if instrumentation.enabled:
+            instrumentation.record(
+                "CreditAccount.renew",
+                "transactions_scanned",
+                len(self._credit_state_list),
+            )
 
     def get_id(self) -> UUID:
         return self._id
 
     def get_balance(self, at: Optional[date] = None) -> int:
-        at = at or self._reference_date
-        total = 0
-        for transaction in self._credit_state_list:
-            if transaction.is_expired(at):
-                continue
-            total += transaction.get_remaining_value()
-        return total
+        return self._expiration_index.get_balance(at or self._reference_date)
 
     def count_expired(self) -> int:
-        total = 0
-        for transaction in self._credit_state_list:
-            if not transaction.is_expired(self._reference_date):
-                continue
-            total += transaction.get_remaining_value()
-        return total
+        archived_value = sum(
+            period.remaining_value for period in self._archive.values()
+        )
+        return (
+            self._expiration_index.get_expired_value(self._reference_date)
+            + archived_value
+        )
 
     @property
     def company_id(self) -> UUID:
@@ -132,3 +354,14 @@ class CreditAccount:
         string = f"CreditAccount(id={self.get_id()}, "
         string += f"balance={self.get_balance()})"
         return string
+
+
+instrumentation.instrument(
+    CreditAccount,
+    "consume",
+    "consume_many",
+    "expire",
+    "refund",
+    "renew",
+    "get_balance",
+)
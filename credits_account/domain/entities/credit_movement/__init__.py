@@ -4,3 +4,4 @@ from .credit_movement_factory import CreditMovementFactory
 from .expire_movement import ExpireCreditMovement
 from .refund_movement import RefundCreditMovement
 from .renew_movement import RenewCreditMovement
+from .columnar_movement_store import ColumnarMovementStore
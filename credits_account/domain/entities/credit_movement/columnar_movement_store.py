@@ -0,0 +1,165 @@
+import uuid
+from array import array
+from typing import (
+    Any,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Type,
+    Union,
+    overload,
+)
+
+from credits_account.domain.credit_operations_enum import OperationCode
+from credits_account.domain.entities.credit_movement.add_movement import (
+    AddCreditMovement,
+)
+from credits_account.domain.entities.credit_movement.consume_moviment import (
+    ConsumeCreditMovement,
+)
+from credits_account.domain.entities.credit_movement.expire_movement import (
+    ExpireCreditMovement,
+)
+from credits_account.domain.entities.credit_movement.refund_movement import (
+    RefundCreditMovement,
+)
+from credits_account.domain.entities.credit_movement.renew_movement import (
+    RenewCreditMovement,
+)
+
+_EMPTY_UUID = bytes(16)
+
+
+class ColumnarMovementStore:
+    """Array backed replacement for a transaction's list of movements.
+
+    Values and operation codes live in contiguous ``array`` columns, ids are
+    packed as 16 bytes per row, and descriptions and origins are interned in
+    side tables. Movement objects are built on access, so
+    changes made to them are not seen by the store until ``update_ids``.
+    """
+
+    def __init__(self) -> None:
+        self._credit_movements = array("q")
+        self._operation_movements = array("q")
+        self._operation_codes = array("b")
+        self._descriptions = array("l")
+        self._description_table: List[str] = []
+        self._description_codes: Dict[str, int] = {}
+        self._ids = bytearray()
+        self._operation_ids = bytearray()
+        self._origins = array("l")
+        self._origin_table: List[Tuple[str, str]] = [("", "")]
+        self._origin_codes: Dict[Tuple[str, str], int] = {("", ""): 0}
+
+    def __len__(self) -> int:
+        return len(self._operation_codes)
+
+    def __iter__(self) -> Iterator[Any]:
+        for position in range(len(self)):
+            yield self._materialize(position)
+
+    @overload
+    def __getitem__(self, position: int) -> Any:
+        ...
+
+    @overload
+    def __getitem__(self, position: slice) -> List[Any]:
+        ...
+
+    def __getitem__(self, position: Union[int, slice]) -> Any:
+        if isinstance(position, slice):
+            return [self._materialize(i) for i in range(len(self))[position]]
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError("movement index out of range")
+        return self._materialize(position)
+
+    def append(self, movement: Any) -> None:
+        self._credit_movements.append(movement.credit_movement)
+        self._operation_movements.append(movement.operation_movement)
+        self._operation_codes.append(movement.operation_code)
+        description = movement.operation_log
+        if description not in self._description_codes:
+            self._description_codes[description] = len(self._description_table)
+            self._description_table.append(description)
+        self._descriptions.append(self._description_codes[description])
+        self._ids += self._pack(movement.id)
+        self._operation_ids += self._pack(movement.operation_id)
+        origin = (
+            getattr(movement, "object_type", ""),
+            getattr(movement, "object_id", ""),
+        )
+        if origin not in self._origin_codes:
+            self._origin_codes[origin] = len(self._origin_table)
+            self._origin_table.append(origin)
+        self._origins.append(self._origin_codes[origin])
+
+    def update_ids(self, position: int, movement: Any) -> None:
+        offset = position * 16
+        self._ids[offset : offset + 16] = self._pack(movement.id)
+        self._operation_ids[offset : offset + 16] = self._pack(movement.operation_id)
+
+    def total(self, operation_code: Optional[OperationCode] = None) -> int:
+        if operation_code is None:
+            return sum(self._credit_movements)
+        return sum(
+            value
+            for code, value in zip(self._operation_codes, self._credit_movements)
+            if code == operation_code
+        )
+
+    def _materialize(self, position: int) -> Any:
+        offset = position * 16
+        operation_code = self._operation_codes[position]
+        description = self._description_table[self._descriptions[position]]
+        operation_id = self._unpack(self._operation_ids[offset : offset + 16])
+        movement_id = self._unpack(self._ids[offset : offset + 16])
+        credit_movement = self._credit_movements[position]
+        movement: Union[ConsumeCreditMovement, RefundCreditMovement]
+        if operation_code == OperationCode.CONSUME:
+            movement = ConsumeCreditMovement(
+                credit_movement,
+                self._operation_movements[position],
+                description,
+                operation_id,
+                movement_id,
+            )
+        elif operation_code == OperationCode.REFUND:
+            movement = RefundCreditMovement(
+                credit_movement,
+                self._operation_movements[position],
+                description,
+                operation_id,
+                movement_id,
+            )
+        else:
+            movement_class = _MOVEMENT_CLASSES[operation_code]
+            return movement_class(
+                credit_movement, description, operation_id, movement_id
+            )
+        movement.set_movement_origin(*self._origin_table[self._origins[position]])
+        return movement
+
+    @staticmethod
+    def _pack(value: Optional[uuid.UUID]) -> bytes:
+        return value.bytes if value else _EMPTY_UUID
+
+    @staticmethod
+    def _unpack(value: bytearray) -> Optional[uuid.UUID]:
+        if value == _EMPTY_UUID:
+            return None
+        return uuid.UUID(bytes=bytes(value))
+
+
+_MOVEMENT_CLASSES: Dict[
+    int,
+    Type[Union[AddCreditMovement, ExpireCreditMovement, RenewCreditMovement]],
+] = {
+    OperationCode.ADD: AddCreditMovement,
+    OperationCode.EXPIRE: ExpireCreditMovement,
+    OperationCode.RENEW: RenewCreditMovement,
+}
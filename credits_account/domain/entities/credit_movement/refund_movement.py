@@ -1,20 +1,23 @@
 import uuid
-from dataclasses import dataclass
-from typing import Any, Optional
+from dataclasses import dataclass, field
+from typing import Any, ClassVar, Optional
 
+from credits_account.domain.credit_operations_enum import OperationCode
 
-@dataclass
+
+@dataclass(slots=True)
 class RefundCreditMovement:
     credit_movement: int
     operation_movement: int
     operation_log: str
     operation_id: Optional[uuid.UUID] = None
     id: Optional[uuid.UUID] = None
+    object_type: str = field(default="", init=False, repr=False, compare=False)
+    object_id: str = field(default="", init=False, repr=False, compare=False)
+    operation_type: ClassVar[str] = "REFUND"
+    operation_code: ClassVar[OperationCode] = OperationCode.REFUND
 
     def __post_init__(self) -> None:
-        self.object_type: str = ""
-        self.object_id: str = ""
-        self.operation_type: str = "REFUND"
         if self.credit_movement < 0:
             self.credit_movement = self.credit_movement * -1
             self.operation_movement = self.operation_movement * -1
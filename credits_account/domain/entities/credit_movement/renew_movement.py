@@ -1,17 +1,21 @@
 import uuid
-from dataclasses import dataclass
-from typing import Any, Optional
+from dataclasses import dataclass, field
+from typing import Any, ClassVar, Optional
 
+from credits_account.domain.credit_operations_enum import OperationCode
 
-@dataclass
+
+@dataclass(slots=True)
 class RenewCreditMovement:
     credit_movement: int
     operation_log: str
     operation_id: Optional[uuid.UUID] = None
     id: Optional[uuid.UUID] = None
+    operation_movement: int = field(init=False, repr=False, compare=False)
+    operation_type: ClassVar[str] = "RENEW"
+    operation_code: ClassVar[OperationCode] = OperationCode.RENEW
 
     def __post_init__(self) -> None:
-        self.operation_type: str = "RENEW"
         self.operation_movement = self.credit_movement
         if self.credit_movement < 0:
             self.credit_movement = self.credit_movement * -1
@@ -1,16 +1,22 @@
 import uuid
-from calendar import monthrange
-from dataclasses import dataclass
+from array import array
+from dataclasses import dataclass, field
 from datetime import date
-from typing import List, Optional, Tuple, Union
+from typing import Dict, List, Optional, Sequence, Set, Tuple, Union, cast
+
+from credits_account.domain import expiration_calendar
 
 from credits_account.domain.entities.credit_movement import (
     AddCreditMovement,
+    ColumnarMovementStore,
     ConsumeCreditMovement,
     ExpireCreditMovement,
     RefundCreditMovement,
     RenewCreditMovement,
 )
+from credits_account.domain.entities.credit_transaction_snapshot import (
+    CreditTransactionSnapshot,
+)
 
 SupportedMovements = Union[
     AddCreditMovement,
@@ -29,12 +35,27 @@ class CreditTransaction:
     contract_service_id: Optional[uuid.UUID] = None
     id: Optional[uuid.UUID] = None
     contract_service_creation_date: Optional[date] = None
+    columnar_storage: bool = field(default=False, repr=False, compare=False)
 
     def __post_init__(self) -> None:
         self.contract_service_creation_date = (
             self.contract_service_creation_date or self.creation_date
         )
-        self._usage_list: List[SupportedMovements] = []
+        self._usage_list: Union[List[SupportedMovements], ColumnarMovementStore] = (
+            ColumnarMovementStore() if self.columnar_storage else []
+        )
+        self._remaining_value: int = 0
+        self._consumed_value: int = 0
+        self._refunded_value: int = 0
+        self._expired_value: int = 0
+        self._granted_value: int = 0
+        self._snapshot: Optional[CreditTransactionSnapshot] = None
+        self._expiration_date: Optional[date] = None
+        self._expiration_key: Optional[Tuple[date, Optional[date]]] = None
+        self._movements_by_type: Dict[str, "array[int]"] = {}
+        self._movements_by_origin: Dict[Tuple[str, str], "array[int]"] = {}
+        self._refunded_origins: Set[Tuple[str, str]] = set()
+        self._pending_movements: Dict[int, Tuple[int, SupportedMovements]] = {}
         if not self.creation_date:
             self.creation_date = date.today()
 
@@ -61,58 +82,56 @@ class CreditTransaction:
         assert value >= 0, "The consume credit value should be greater than 0"
         if self.is_expired(reference_date) and not ignore_is_expired_check:
             raise ValueError(f"An expired credit cannot be consumed")
-        if self.get_remaining_value() >= value:
+        remaining_value = self._remaining_value
+        if remaining_value >= value:
             movement = ConsumeCreditMovement(
                 value, value, description or "Você consumiu créditos"
             )
             movement.set_movement_origin(object_type, object_id)
-            self._usage_list.append(movement)
+            self.register_movement(movement)
             return 0
-        not_processed_value = value - self.get_remaining_value()
-        remaining_value = self.get_remaining_value()
+        not_processed_value = value - remaining_value
         movement = ConsumeCreditMovement(
             remaining_value, remaining_value, description or "Você consumiu créditos"
         )
         movement.set_movement_origin(object_type, object_id)
-        self._usage_list.append(movement)
+        self.register_movement(movement)
         return not_processed_value
 
     def renew(self) -> "CreditTransaction":
-        add_movement = 0
-        for movement in self._usage_list:
-            if movement.operation_type.lower() not in ("add", "renew"):
-                continue
-            add_movement += movement.credit_movement
         transaction = CreditTransaction(
             creation_date=self.get_expiration_date(),
             account_id=self.account_id,
             type=self.type,
             contract_service_id=self.contract_service_id,
             contract_service_creation_date=self.contract_service_creation_date,
+            columnar_storage=self.columnar_storage,
         )
         transaction.register_movement(
             RenewCreditMovement(
-                add_movement,
+                self._granted_value,
                 "Seus créditos foram renovados",
             )
         )
         return transaction
 
-    def refund(self, object_type: str, object_id: str) -> None:
-        for consume in self.get_consumed_movements():
-            if consume.object_type != object_type or consume.object_id != object_id:
-                continue
-            if not self.can_refund(object_type, object_id):
-                continue
-            movement = RefundCreditMovement(
-                consume.credit_movement,
-                consume.operation_movement,
-                "Seus créditos foram estornados",
-                None,
-                None,
-            )
-            movement.set_movement_origin(object_type, object_id)
-            self.register_movement(movement)
+    def refund(self, object_type: str, object_id: str) -> bool:
+        if not self.can_refund(object_type, object_id):
+            return False
+        consume = self._get_first_consume(object_type, object_id)
+        if not consume:
+            return False
+        credit_movement, operation_movement = consume
+        movement = RefundCreditMovement(
+            credit_movement,
+            operation_movement,
+            "Seus créditos foram estornados",
+            None,
+            None,
+        )
+        movement.set_movement_origin(object_type, object_id)
+        self.register_movement(movement)
+        return True
 
     def expire(self, at: Optional[date] = None) -> None:
         if self.has_expired_operation() and self.is_expired(at or self.creation_date):
@@ -128,7 +147,9 @@ class CreditTransaction:
         self.register_movement(movement)
 
     def get_remaining_value(self, usage_list: List[SupportedMovements] = []) -> int:
-        return sum(usage_list or self._usage_list)
+        if usage_list:
+            return sum(movement.credit_movement for movement in usage_list)
+        return self._remaining_value
 
     def is_expired(self, reference_date: Optional[date] = None) -> bool:
         reference_date = reference_date or self.creation_date
@@ -136,54 +157,191 @@ class CreditTransaction:
             reference_date >= self.get_expiration_date() or self.has_expired_operation()
         )
 
+    def get_movements(self, operation_type: str) -> List[SupportedMovements]:
+        positions: Sequence[int] = self._movements_by_type.get(
+            operation_type.upper(), ()
+        )
+        return [self._usage_list[position] for position in positions]
+
+    def get_movements_by_origin(
+        self, object_type: str, object_id: str, operation_type: str
+    ) -> List[SupportedMovements]:
+        operation_type = operation_type.upper()
+        positions: Sequence[int] = self._movements_by_origin.get(
+            (object_type, object_id), ()
+        )
+        movements = [self._usage_list[position] for position in positions]
+        return [
+            movement
+            for movement in movements
+            if movement.operation_type == operation_type
+        ]
+
+    def _get_first_consume(
+        self, object_type: str, object_id: str
+    ) -> Optional[Tuple[int, int]]:
+        if self._snapshot:
+            consume = self._snapshot.consumes_by_origin.get((object_type, object_id))
+            if consume:
+                return consume
+        consumes = self.get_movements_by_origin(object_type, object_id, "CONSUME")
+        if not consumes:
+            return None
+        return consumes[0].credit_movement, consumes[0].operation_movement
+
+    def list_movement_origins(self) -> Tuple[Tuple[str, str], ...]:
+        if not self._snapshot:
+            return tuple(self._movements_by_origin)
+        origins = dict.fromkeys(self._snapshot.consumes_by_origin)
+        origins.update(dict.fromkeys(self._movements_by_origin))
+        return tuple(origins)
+
+    def count_movements(self, operation_type: str) -> int:
+        operation_type = operation_type.upper()
+        count = len(self._movements_by_type.get(operation_type, []))
+        if self._snapshot:
+            count += self._snapshot.movement_counts.get(operation_type, 0)
+        return count
+
     def get_consumed_movements(self) -> List[ConsumeCreditMovement]:
-        movements = []
-        for use in self._usage_list:
-            if use.operation_type.lower() != "consume":
-                continue
-            movements.append(use)
-        return movements
+        return cast(List[ConsumeCreditMovement], self.get_movements("CONSUME"))
 
     def get_consumed_value(self) -> int:
-        consumed_value = 0
-        for use in self.get_consumed_movements():
-            consumed_value += use.credit_movement
-        return consumed_value
+        return self._consumed_value
+
+    def get_refunded_value(self) -> int:
+        return self._refunded_value
+
+    def get_expired_movement_value(self) -> int:
+        return self._expired_value
 
     def has_expired_operation(self) -> bool:
-        for transaction in self._usage_list:
-            if transaction.operation_type.lower() == "expire":
-                return True
-        return False
+        if self._snapshot and self._snapshot.expired:
+            return True
+        return "EXPIRE" in self._movements_by_type
 
     def get_expiration_date(self, at: Optional[date] = None) -> date:
-        at = at or self.creation_date
-        next_day = self.contract_service_creation_date.day
-        next_year = at.year
-        next_month = at.month + 1
-        if next_month >= 13:
-            next_month = 1
-            next_year += 1
-        next_month_max_day = monthrange(next_year, next_month)[-1]
-        if next_day >= next_month_max_day:
-            next_day = next_month_max_day
-        return date(month=next_month, day=next_day, year=next_year)
+        if at:
+            return expiration_calendar.get_expiration_date(
+                at, self.contract_service_creation_date or self.creation_date
+            )
+        # keyed on the dates it derives from, so reassigning them is noticed
+        key = (self.creation_date, self.contract_service_creation_date)
+        if self._expiration_date is None or self._expiration_key != key:
+            self._expiration_date = expiration_calendar.get_expiration_date(
+                self.creation_date,
+                self.contract_service_creation_date or self.creation_date,
+            )
+            self._expiration_key = key
+        return self._expiration_date
 
     def get_expired_value(self, reference_date: date) -> int:
         # TODO: rename to not_consumed_as_expired
         if not self.is_expired(reference_date):
             return 0
-        return sum(self._usage_list)
+        return self._remaining_value
+
+    def get_pending_movements(self) -> List[SupportedMovements]:
+        return [movement for _, movement in self._pending_movements.values()]
+
+    def mark_as_persisted(self, *movements: SupportedMovements) -> None:
+        """Drops the given movements from the pending ones; none drops nothing."""
+        for movement in movements:
+            position, _ = self._pending_movements.pop(id(movement), (None, None))
+            if position is not None and isinstance(
+                self._usage_list, ColumnarMovementStore
+            ):
+                self._usage_list.update_ids(position, movement)
+        if not self._pending_movements:
+            self._pending_movements = {}
+
+    def mark_all_as_persisted(self) -> None:
+        self.mark_as_persisted(*self.get_pending_movements())
 
     def register_movement(self, movement: SupportedMovements) -> None:
+        position = len(self._usage_list)
         self._usage_list.append(movement)
+        self._pending_movements[id(movement)] = (position, movement)
+        self._remaining_value += movement.credit_movement
+        operation_type = movement.operation_type.upper()
+        if operation_type not in self._movements_by_type:
+            self._movements_by_type[operation_type] = array("q")
+        self._movements_by_type[operation_type].append(position)
+        if operation_type == "CONSUME":
+            self._consumed_value += movement.credit_movement
+        elif operation_type == "REFUND":
+            self._refunded_value += movement.credit_movement
+        elif operation_type == "EXPIRE":
+            self._expired_value += movement.credit_movement
+        else:
+            self._granted_value += movement.credit_movement
+        if isinstance(movement, (ConsumeCreditMovement, RefundCreditMovement)):
+            self._register_movement_origin(operation_type, movement, position)
+
+    def _register_movement_origin(
+        self,
+        operation_type: str,
+        movement: Union[ConsumeCreditMovement, RefundCreditMovement],
+        position: int,
+    ) -> None:
+        origin = (movement.object_type, movement.object_id)
+        if origin not in self._movements_by_origin:
+            self._movements_by_origin[origin] = array("q")
+        self._movements_by_origin[origin].append(position)
+        if operation_type == "REFUND":
+            self._refunded_origins.add(origin)
 
     def can_refund(self, object_type: str, object_id: str) -> bool:
-        for movement in self._usage_list:
-            if (
-                movement.operation_type.lower() == "refund"
-                and movement.object_type == object_type
-                and movement.object_id == object_id
-            ):
-                return False
-        return True
+        return (object_type, object_id) not in self._refunded_origins
+
+    def take_snapshot(self) -> CreditTransactionSnapshot:
+        """Folds every registered movement into a snapshot of the current state."""
+        movements = len(self._usage_list)
+        movement_counts = {
+            operation_type: len(positions)
+            for operation_type, positions in self._movements_by_type.items()
+        }
+        consumes_by_origin: Dict[Tuple[str, str], Tuple[int, int]] = {}
+        if self._snapshot:
+            movements += self._snapshot.movements
+            for operation_type, count in self._snapshot.movement_counts.items():
+                movement_counts[operation_type] = (
+                    movement_counts.get(operation_type, 0) + count
+                )
+            consumes_by_origin.update(self._snapshot.consumes_by_origin)
+        for origin in self._movements_by_origin:
+            if origin not in consumes_by_origin:
+                consume = self._get_first_consume(*origin)
+                if consume:
+                    consumes_by_origin[origin] = consume
+        return CreditTransactionSnapshot(
+            credit_id=self.id,
+            movements=movements,
+            remaining_value=self._remaining_value,
+            consumed_value=self._consumed_value,
+            refunded_value=self._refunded_value,
+            expired_value=self._expired_value,
+            granted_value=self._granted_value,
+            expired=self.has_expired_operation(),
+            expiration_date=self.get_expiration_date(),
+            movement_counts=movement_counts,
+            consumes_by_origin=consumes_by_origin,
+            refunded_origins=tuple(self._refunded_origins),
+        )
+
+    def restore_snapshot(self, snapshot: CreditTransactionSnapshot) -> None:
+        """Starts an empty transaction from ``snapshot``.
+
+        Movements folded into the snapshot are not materialized again, so
+        ``get_movements`` only returns the ones registered after it. The
+        expiration date is still derived from this credit's own dates, as on a
+        load without snapshots.
+        """
+        assert not self._usage_list, "A snapshot can only restore an empty credit"
+        self._snapshot = snapshot
+        self._remaining_value = snapshot.remaining_value
+        self._consumed_value = snapshot.consumed_value
+        self._refunded_value = snapshot.refunded_value
+        self._expired_value = snapshot.expired_value
+        self._granted_value = snapshot.granted_value
+        self._refunded_origins = set(snapshot.refunded_origins)
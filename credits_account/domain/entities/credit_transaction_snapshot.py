@@ -0,0 +1,29 @@
+import uuid
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Dict, Optional, Tuple
+
+Origin = Tuple[str, str]
+
+
+@dataclass
+class CreditTransactionSnapshot:
+    """State of a CreditTransaction after its first ``movements`` movements.
+
+    ``consumes_by_origin`` keeps the credit and operation movement of the first
+    consume of every origin, which is what a refund needs, so movements folded
+    into a snapshot never have to be replayed.
+    """
+
+    credit_id: Optional[uuid.UUID]
+    movements: int
+    remaining_value: int
+    consumed_value: int
+    refunded_value: int
+    expired_value: int
+    granted_value: int
+    expired: bool
+    expiration_date: date
+    movement_counts: Dict[str, int] = field(default_factory=dict)
+    consumes_by_origin: Dict[Origin, Tuple[int, int]] = field(default_factory=dict)
+    refunded_origins: Tuple[Origin, ...] = ()
@@ -0,0 +1,29 @@
+from calendar import monthrange
+from datetime import date
+from functools import lru_cache
+
+EXPIRATION_CALENDAR_SIZE = 4096
+
+
+@lru_cache(maxsize=EXPIRATION_CALENDAR_SIZE)
+def _month_expiration_date(year: int, month: int, anchor_day: int) -> date:
+    next_day = anchor_day
+    next_year = year
+    next_month = month + 1
+    if next_month >= 13:
+        next_month = 1
+        next_year += 1
+    next_month_max_day = monthrange(next_year, next_month)[-1]
+    if next_day >= next_month_max_day:
+        next_day = next_month_max_day
+    return date(month=next_month, day=next_day, year=next_year)
+
+
+def get_expiration_date(at: date, contract_service_creation_date: date) -> date:
+    return _month_expiration_date(
+        at.year, at.month, contract_service_creation_date.day
+    )
+
+
+def clear_expiration_calendar() -> None:
+    _month_expiration_date.cache_clear()
@@ -0,0 +1,77 @@
+import functools
+import time
+from typing import Any, Callable, Dict, List, Optional, Protocol, Tuple
+
+
+class MetricsSink(Protocol):
+    def record_call(self, operation: str, seconds: float) -> None:
+        ...
+
+    def record_count(self, operation: str, metric: str, value: int) -> None:
+        ...
+
+
+enabled = False
+_sink: Optional[MetricsSink] = None
+_hot_paths: List[Tuple[type, str]] = []
+_originals: Dict[Tuple[type, str], Callable[..., Any]] = {}
+
+
+def instrument(cls: type, *method_names: str) -> None:
+    """Registers methods of ``cls`` to be timed while instrumentation is enabled."""
+    for method_name in method_names:
+        _hot_paths.append((cls, method_name))
+        if enabled:
+            _wrap(cls, method_name)
+
+
+def enable(sink: MetricsSink) -> None:
+    """Times every registered method and sends timings and counts to ``sink``.
+
+    Methods are only wrapped while enabled and ``disable`` puts the original
+    functions back, so a disabled process runs the same code as before. Code
+    in the hot paths reports extra counts through ``record`` behind a check
+    of ``enabled``.
+    """
+    global enabled, _sink
+    _sink = sink
+    if enabled:
+        return
+    enabled = True
+    for cls, method_name in _hot_paths:
+        _wrap(cls, method_name)
+
+
+def disable() -> None:
+    global enabled, _sink
+    for (cls, method_name), method in _originals.items():
+        setattr(cls, method_name, method)
+    _originals.clear()
+    enabled = False
+    _sink = None
+
+
+def record(operation: str, metric: str, value: int) -> None:
+    sink = _sink
+    if sink:
+        sink.record_count(operation, metric, value)
+
+
+def _wrap(cls: type, method_name: str) -> None:
+    if (cls, method_name) in _originals:
+        return
+    method = cls.__dict__[method_name]
+    operation = f"{cls.__name__}.{method_name}"
+
+    @functools.wraps(method)
+    def timed(*args: Any, **kwargs: Any) -> Any:
+        started_at = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            sink = _sink
+            if sink:
+                sink.record_call(operation, time.perf_counter() - started_at)
+
+    _originals[(cls, method_name)] = method
+    setattr(cls, method_name, timed)
@@ -0,0 +1,111 @@
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Dict, List
+from uuid import UUID
+
+import numpy as np
+
+from credits_account.domain import expiration_calendar
+from credits_account.domain.credit_operations_enum import OperationCode
+from credits_account.infra.repository.in_memory_credit_account_repository import (
+    InMemoryCreditAccountRepository,
+)
+
+
+@dataclass
+class FleetAccountBalance:
+    company_id: UUID
+    balance: int
+    expired: int
+    movements_by_type: Dict[str, int] = field(default_factory=dict)
+
+
+class FleetBalanceEngine:
+    """Vectorized balance, expiration and movement totals for every account.
+
+    Repository rows are read once into NumPy columns; ``compute`` can then be
+    called for any reference date and matches ``CreditAccount.get_balance``
+    and ``CreditAccount.count_expired`` of the hydrated accounts.
+    """
+
+    def __init__(self, repository: InMemoryCreditAccountRepository) -> None:
+        self._company_ids: List[UUID] = []
+        account_codes: Dict[UUID, int] = {}
+        for company_id, account_row in repository.credit_account_rows.items():
+            account_codes[account_row.id] = len(self._company_ids)
+            self._company_ids.append(company_id)
+
+        credit_codes: Dict[UUID, int] = {}
+        credit_accounts: List[int] = []
+        expiration_dates: List[date] = []
+        for credit in repository.credit_rows.values():
+            if credit.account_id not in account_codes:
+                continue
+            credit_codes[credit.id] = len(credit_accounts)
+            credit_accounts.append(account_codes[credit.account_id])
+            expiration_dates.append(
+                expiration_calendar.get_expiration_date(
+                    credit.created_at,
+                    repository.contracted_service_creation_date or credit.created_at,
+                )
+            )
+
+        log_credits: List[int] = []
+        log_movements: List[int] = []
+        log_codes: List[int] = []
+        for clog in repository.credit_logs_rows.values():
+            olog = repository.operation_logs_rows.get(clog.operation_id)
+            if not olog or clog.credit_id not in credit_codes:
+                continue
+            log_credits.append(credit_codes[clog.credit_id])
+            log_movements.append(clog.credit_moviment)
+            log_codes.append(OperationCode.from_operation_type(olog.operation))
+
+        self._credit_accounts = np.array(credit_accounts, dtype=np.int64)
+        self._expiration_dates = np.array(expiration_dates, dtype="datetime64[D]")
+        self._log_credits = np.array(log_credits, dtype=np.int64)
+        self._log_movements = np.array(log_movements, dtype=np.int64)
+        self._log_codes = np.array(log_codes, dtype=np.int8)
+
+        self._remaining = np.zeros(len(credit_accounts), dtype=np.int64)
+        np.add.at(self._remaining, self._log_credits, self._log_movements)
+        self._has_expire_movement = np.zeros(len(credit_accounts), dtype=bool)
+        self._has_expire_movement[
+            self._log_credits[self._log_codes == OperationCode.EXPIRE]
+        ] = True
+
+    def compute(self, at: date) -> Dict[UUID, FleetAccountBalance]:
+        accounts_count = len(self._company_ids)
+        expired_credits = (
+            self._expiration_dates <= np.datetime64(at, "D")
+        ) | self._has_expire_movement
+        balances = np.zeros(accounts_count, dtype=np.int64)
+        np.add.at(
+            balances,
+            self._credit_accounts[~expired_credits],
+            self._remaining[~expired_credits],
+        )
+        expired = np.zeros(accounts_count, dtype=np.int64)
+        np.add.at(
+            expired,
+            self._credit_accounts[expired_credits],
+            self._remaining[expired_credits],
+        )
+        movements_by_type = np.zeros((accounts_count, len(OperationCode)), np.int64)
+        np.add.at(
+            movements_by_type,
+            (self._credit_accounts[self._log_credits], self._log_codes - 1),
+            self._log_movements,
+        )
+        return {
+            company_id: FleetAccountBalance(
+                company_id=company_id,
+                balance=int(balances[position]),
+                expired=int(expired[position]),
+                movements_by_type={
+                    code.name: int(movements_by_type[position, code - 1])
+                    for code in OperationCode
+                },
+            )
+            for position, company_id in enumerate(self._company_ids)
+        }
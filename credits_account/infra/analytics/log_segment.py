@@ -0,0 +1,209 @@
+import mmap
+import shutil
+import struct
+import sys
+import tempfile
+from array import array
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import IO, Any, Dict, Iterable, List, Literal, Optional, Sequence, Tuple
+
+from credits_account.domain.credit_operations_enum import OperationCode
+from credits_account.infra.repository.in_memory_credit_account_repository import (
+    CreditLogRow,
+)
+
+SEGMENT_MAGIC = b"CLSG"
+FOOTER_MAGIC = b"CLSF"
+SEGMENT_VERSION = 1
+HEADER = struct.Struct("<4sHHQ")
+FOOTER_COLUMN = struct.Struct("<16sQQI4x")
+FOOTER_DATES = struct.Struct("<qq")
+TRAILER = struct.Struct("<Q4s")
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+# the struct formats used by the columns, for both memoryview and array
+ColumnFormat = Literal["q", "B", "b"]
+
+# name, memoryview format, NumPy dtype and width in bytes, in file order
+COLUMNS: Tuple[Tuple[str, ColumnFormat, str, int], ...] = (
+    ("movement", "q", "<i8", 8),
+    ("date", "q", "<M8[D]", 8),
+    ("account_id", "B", "V16", 16),
+    ("credit_id", "B", "V16", 16),
+    ("operation_code", "b", "i1", 1),
+)
+
+
+@dataclass
+class SegmentColumn:
+    name: str
+    offset: int
+    size: int
+    itemsize: int
+
+
+def to_epoch_day(value: date) -> int:
+    if isinstance(value, datetime):
+        value = value.date()
+    return value.toordinal() - EPOCH_ORDINAL
+
+
+def write_log_segment(
+    path: str,
+    rows: Iterable[Tuple[CreditLogRow, str]],
+    chunk_size: int = 65536,
+) -> int:
+    """Writes credit log rows and their operation type as a columnar segment.
+
+    The layout is a header with the row count, one fixed-width little-endian
+    column after the other and a footer indexing the columns and the date
+    range, closed by its offset. Columns are spooled to temporary files, so
+    memory stays bounded by ``chunk_size`` rows. Returns the rows written.
+    """
+    spools: List[IO[bytes]] = [tempfile.TemporaryFile() for _ in COLUMNS]
+    try:
+        buffers = _new_buffers()
+        rows_count = 0
+        first_day: Optional[int] = None
+        last_day: Optional[int] = None
+        for row, operation in rows:
+            day = to_epoch_day(row.created_at)
+            first_day = day if first_day is None else min(first_day, day)
+            last_day = day if last_day is None else max(last_day, day)
+            buffers["movement"].append(row.credit_moviment)
+            buffers["date"].append(day)
+            buffers["account_id"].frombytes(row.account_id.bytes)
+            buffers["credit_id"].frombytes(row.credit_id.bytes)
+            operation_code = OperationCode.from_operation_type(operation)
+            buffers["operation_code"].append(operation_code)
+            rows_count += 1
+            if rows_count % chunk_size == 0:
+                _flush_buffers(buffers, spools)
+                buffers = _new_buffers()
+        _flush_buffers(buffers, spools)
+        if first_day is None or last_day is None:
+            first_day = last_day = 0
+        with open(path, "wb") as segment:
+            segment.write(HEADER.pack(SEGMENT_MAGIC, SEGMENT_VERSION, 0, rows_count))
+            columns = [
+                _copy_column(segment, spool, name, itemsize)
+                for spool, (name, _, _, itemsize) in zip(spools, COLUMNS)
+            ]
+            _pad(segment)
+            footer_offset = segment.tell()
+            for column in columns:
+                segment.write(
+                    FOOTER_COLUMN.pack(
+                        column.name.encode(),
+                        column.offset,
+                        column.size,
+                        column.itemsize,
+                    )
+                )
+            segment.write(FOOTER_DATES.pack(first_day, last_day))
+            segment.write(TRAILER.pack(footer_offset, FOOTER_MAGIC))
+        return rows_count
+    finally:
+        for spool in spools:
+            spool.close()
+
+
+class LogSegment:
+    """Read-only, memory-mapped view over a segment file.
+
+    Columns are exposed as ``memoryview`` or NumPy arrays pointing at the
+    mapping, so nothing is copied or deserialized. Views must be released
+    before ``close``.
+    """
+
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as segment:
+            self._mmap = mmap.mmap(segment.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        magic, version, _, self.rows = HEADER.unpack_from(self._mmap, 0)
+        if magic != SEGMENT_MAGIC or version != SEGMENT_VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a version {SEGMENT_VERSION} log segment")
+        footer_offset, footer_magic = TRAILER.unpack_from(
+            self._mmap, len(self._mmap) - TRAILER.size
+        )
+        if footer_magic != FOOTER_MAGIC:
+            self.close()
+            raise ValueError(f"{path} has no log segment footer")
+        self.columns: Dict[str, SegmentColumn] = {}
+        offset = footer_offset
+        for _ in COLUMNS:
+            name, column_offset, size, itemsize = FOOTER_COLUMN.unpack_from(
+                self._mmap, offset
+            )
+            column = SegmentColumn(
+                name.rstrip(b"\0").decode(), column_offset, size, itemsize
+            )
+            self.columns[column.name] = column
+            offset += FOOTER_COLUMN.size
+        first_day, last_day = FOOTER_DATES.unpack_from(self._mmap, offset)
+        self.first_date = date.fromordinal(first_day + EPOCH_ORDINAL)
+        self.last_date = date.fromordinal(last_day + EPOCH_ORDINAL)
+
+    def __enter__(self) -> "LogSegment":
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def memoryview(self, name: str) -> memoryview:
+        """The column as a flat memoryview; id columns take 16 bytes per row."""
+        column = self.columns[name]
+        view = self._view[column.offset : column.offset + column.size]
+        return view.cast(_COLUMN_FORMATS[name])
+
+    def numpy(self, name: str) -> Any:
+        """The column as a NumPy array over the mapping; requires numpy."""
+        import numpy as np
+
+        column = self.columns[name]
+        return np.frombuffer(
+            self._mmap,
+            dtype=_COLUMN_DTYPES[name],
+            count=self.rows,
+            offset=column.offset,
+        )
+
+    def close(self) -> None:
+        self._view.release()
+        self._mmap.close()
+
+
+_COLUMN_FORMATS: Dict[str, ColumnFormat] = {
+    name: view_format for name, view_format, _, _ in COLUMNS
+}
+_COLUMN_DTYPES: Dict[str, str] = {name: dtype for name, _, dtype, _ in COLUMNS}
+
+
+def _new_buffers() -> Dict[str, array]:
+    return {name: array(view_format) for name, view_format, _, _ in COLUMNS}
+
+
+def _flush_buffers(buffers: Dict[str, array], spools: Sequence[IO[bytes]]) -> None:
+    for spool, (name, _, _, _) in zip(spools, COLUMNS):
+        if sys.byteorder == "big":
+            buffers[name].byteswap()
+        buffers[name].tofile(spool)
+
+
+def _copy_column(
+    segment: IO[bytes], spool: IO[bytes], name: str, itemsize: int
+) -> SegmentColumn:
+    _pad(segment)
+    offset = segment.tell()
+    spool.seek(0)
+    shutil.copyfileobj(spool, segment)
+    return SegmentColumn(name, offset, segment.tell() - offset, itemsize)
+
+
+def _pad(segment: IO[bytes]) -> None:
+    segment.write(bytes(-segment.tell() % 8))
@@ -0,0 +1,74 @@
+import csv
+import io
+import json
+from dataclasses import fields
+from datetime import date
+from typing import Any, Dict, Iterable, List, TextIO
+from uuid import UUID
+
+DEFAULT_CHUNK_SIZE = 1000
+
+
+def to_record(row: Any) -> Dict[str, Any]:
+    """Turns a log row dataclass into a dict of JSON and CSV friendly values."""
+    record: Dict[str, Any] = {}
+    for row_field in fields(row):
+        value = getattr(row, row_field.name)
+        if isinstance(value, (UUID, date)):
+            value = str(value) if isinstance(value, UUID) else value.isoformat()
+        record[row_field.name] = value
+    return record
+
+
+def write_jsonl(
+    rows: Iterable[Any], stream: TextIO, chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> int:
+    """Writes one JSON object per row, ``chunk_size`` rows per write.
+
+    Only one chunk is held in memory, so ``rows`` can be a generator over any
+    number of rows. Returns how many rows were written.
+    """
+    assert chunk_size > 0, "The chunk size should be greater than 0"
+    written = 0
+    buffer: List[str] = []
+    for row in rows:
+        buffer.append(json.dumps(to_record(row), ensure_ascii=False) + "\n")
+        if len(buffer) >= chunk_size:
+            stream.write("".join(buffer))
+            written += len(buffer)
+            buffer.clear()
+    if buffer:
+        stream.write("".join(buffer))
+        written += len(buffer)
+    return written
+
+
+def write_csv(
+    rows: Iterable[Any], stream: TextIO, chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> int:
+    """Writes a header and one CSV line per row, ``chunk_size`` rows per write.
+
+    The header comes from the fields of the first row; nothing is written when
+    there are no rows. Returns how many rows were written.
+    """
+    assert chunk_size > 0, "The chunk size should be greater than 0"
+    written = 0
+    buffer = io.StringIO()
+    writer = None
+    buffered = 0
+    for row in rows:
+        record = to_record(row)
+        if writer is None:
+            writer = csv.DictWriter(buffer, fieldnames=list(record))
+            writer.writeheader()
+        writer.writerow(record)
+        buffered += 1
+        if buffered >= chunk_size:
+            stream.write(buffer.getvalue())
+            buffer.seek(0)
+            buffer.truncate()
+            written += buffered
+            buffered = 0
+    if buffer.tell():
+        stream.write(buffer.getvalue())
+    return written + buffered
@@ -0,0 +1,167 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Callable, Dict, List, Optional, Sequence
+from uuid import UUID
+
+from credits_account.infra.repository.in_memory_credit_account_repository import (
+    CreditLogRow,
+    CreditRow,
+    InMemoryCreditAccountRepository,
+    OperationLogRow,
+    StaleAccountError,
+)
+
+
+@dataclass
+class ShardReport:
+    shard: int
+    accounts: int
+    credit_rows: int
+    credit_logs_rows: int
+    operation_logs_rows: int
+    elapsed_seconds: float
+    worker_pid: int
+    stale_company_ids: List[UUID] = field(default_factory=list)
+
+
+@dataclass
+class SweptAccount:
+    company_id: UUID
+    version: int
+    credit_rows: List[CreditRow] = field(default_factory=list)
+    credit_logs_rows: List[CreditLogRow] = field(default_factory=list)
+    operation_logs_rows: List[OperationLogRow] = field(default_factory=list)
+
+
+@dataclass
+class ShardResult:
+    report: ShardReport
+    accounts: List[SweptAccount] = field(default_factory=list)
+
+
+def sweep_shard(
+    shard: int,
+    repository: InMemoryCreditAccountRepository,
+    company_ids: Sequence[UUID],
+    reference_date: date,
+) -> ShardResult:
+    started_at = time.perf_counter()
+    known_credits = set(repository.credit_rows)
+    known_credit_logs = set(repository.credit_logs_rows)
+    known_operation_logs = set(repository.operation_logs_rows)
+    accounts = repository.load_accounts_by_company_ids(company_ids)
+    swept_accounts: Dict[UUID, SweptAccount] = {}
+    for account in accounts.values():
+        swept_accounts[account.get_id()] = SweptAccount(
+            account.company_id, account.version
+        )
+        account._reference_date = reference_date
+        account.expire()
+        account.renew()
+        repository.expire(account)
+        repository.add_credits(account)
+    credit_rows = [
+        row for key, row in repository.credit_rows.items() if key not in known_credits
+    ]
+    credit_logs_rows = [
+        row
+        for key, row in repository.credit_logs_rows.items()
+        if key not in known_credit_logs
+    ]
+    operation_logs_rows = [
+        row
+        for key, row in repository.operation_logs_rows.items()
+        if key not in known_operation_logs
+    ]
+    for credit_row in credit_rows:
+        swept_accounts[credit_row.account_id].credit_rows.append(credit_row)
+    for credit_log_row in credit_logs_rows:
+        swept_accounts[credit_log_row.account_id].credit_logs_rows.append(
+            credit_log_row
+        )
+    for operation_log_row in operation_logs_rows:
+        swept_accounts[operation_log_row.account_id].operation_logs_rows.append(
+            operation_log_row
+        )
+    report = ShardReport(
+        shard=shard,
+        accounts=len(accounts),
+        credit_rows=len(credit_rows),
+        credit_logs_rows=len(credit_logs_rows),
+        operation_logs_rows=len(operation_logs_rows),
+        elapsed_seconds=time.perf_counter() - started_at,
+        worker_pid=os.getpid(),
+    )
+    return ShardResult(report, list(swept_accounts.values()))
+
+
+class ExpireAndRenewSweep:
+    """Runs the nightly expire and renew over every account in a process pool.
+
+    Company ids are split in chunks of ``chunk_size``; each chunk is shipped to
+    a worker with a shard of the repository holding only its accounts, and the
+    rows the worker produced are merged back into ``repository``. Each account
+    is merged with a compare-and-swap on the version the worker loaded, so an
+    account written meanwhile keeps that write, is left unswept and is listed
+    in ``ShardReport.stale_company_ids``.
+    """
+
+    def __init__(
+        self,
+        repository: InMemoryCreditAccountRepository,
+        workers: Optional[int] = None,
+        chunk_size: int = 100,
+        on_shard_done: Optional[Callable[[ShardReport], None]] = None,
+    ) -> None:
+        assert chunk_size > 0, "The chunk size should be greater than 0"
+        self.repository = repository
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.on_shard_done = on_shard_done
+
+    def run(
+        self,
+        reference_date: date,
+        company_ids: Optional[Sequence[UUID]] = None,
+    ) -> List[ShardReport]:
+        if company_ids is None:
+            company_ids = list(self.repository.credit_account_rows)
+        chunks = [
+            company_ids[start : start + self.chunk_size]
+            for start in range(0, len(company_ids), self.chunk_size)
+        ]
+        reports: List[ShardReport] = []
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            futures = [
+                executor.submit(
+                    sweep_shard,
+                    shard,
+                    self.repository.shard(chunk),
+                    chunk,
+                    reference_date,
+                )
+                for shard, chunk in enumerate(chunks)
+            ]
+            for future in as_completed(futures):
+                result = future.result()
+                self.merge(result)
+                reports.append(result.report)
+                if self.on_shard_done:
+                    self.on_shard_done(result.report)
+        return sorted(reports, key=lambda report: report.shard)
+
+    def merge(self, result: ShardResult) -> None:
+        for swept_account in result.accounts:
+            try:
+                self.repository.import_account_rows(
+                    swept_account.company_id,
+                    swept_account.version,
+                    swept_account.credit_rows,
+                    swept_account.credit_logs_rows,
+                    swept_account.operation_logs_rows,
+                )
+            except StaleAccountError:
+                result.report.stale_company_ids.append(swept_account.company_id)
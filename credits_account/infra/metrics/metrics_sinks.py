@@ -0,0 +1,128 @@
+import logging
+import threading
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+LATENCY_BUCKETS: Tuple[float, ...] = (
+    0.00001,
+    0.0001,
+    0.0005,
+    0.001,
+    0.005,
+    0.01,
+    0.05,
+    0.1,
+    0.5,
+    1.0,
+    5.0,
+)
+
+
+@dataclass
+class OperationStats:
+    calls: int = 0
+    total_seconds: float = 0.0
+    buckets: List[int] = field(default_factory=lambda: [0] * len(LATENCY_BUCKETS))
+    counts: Dict[str, int] = field(default_factory=dict)
+
+
+class InMemoryMetricsSink:
+    """Aggregates call counts, a latency histogram and counts per operation.
+
+    A call slower than the largest bucket only shows up in the total count,
+    like Prometheus' ``+Inf`` bucket.
+    """
+
+    def __init__(self) -> None:
+        self.operations: Dict[str, OperationStats] = {}
+        self._lock = threading.Lock()
+
+    def record_call(self, operation: str, seconds: float) -> None:
+        with self._lock:
+            stats = self._get_stats(operation)
+            stats.calls += 1
+            stats.total_seconds += seconds
+            bucket = bisect_left(LATENCY_BUCKETS, seconds)
+            if bucket < len(LATENCY_BUCKETS):
+                stats.buckets[bucket] += 1
+
+    def record_count(self, operation: str, metric: str, value: int) -> None:
+        with self._lock:
+            counts = self._get_stats(operation).counts
+            counts[metric] = counts.get(metric, 0) + value
+
+    def reset(self) -> None:
+        with self._lock:
+            self.operations.clear()
+
+    def _get_stats(self, operation: str) -> OperationStats:
+        if operation not in self.operations:
+            self.operations[operation] = OperationStats()
+        return self.operations[operation]
+
+
+class LoggingMetricsSink:
+    """Logs every timing and count as it is recorded."""
+
+    def __init__(
+        self,
+        logger: logging.Logger = logging.getLogger("credits_account.metrics"),
+        level: int = logging.DEBUG,
+    ) -> None:
+        self.logger = logger
+        self.level = level
+
+    def record_call(self, operation: str, seconds: float) -> None:
+        self.logger.log(self.level, "%s took %.6fs", operation, seconds)
+
+    def record_count(self, operation: str, metric: str, value: int) -> None:
+        self.logger.log(self.level, "%s %s=%d", operation, metric, value)
+
+
+class PrometheusMetricsSink(InMemoryMetricsSink):
+    """In-memory sink that renders its metrics in the Prometheus text format."""
+
+    def __init__(self, namespace: str = "credits_account") -> None:
+        super().__init__()
+        self.namespace = namespace
+
+    def render(self) -> str:
+        with self._lock:
+            operations = sorted(self.operations.items())
+            calls = f"{self.namespace}_calls_total"
+            seconds = f"{self.namespace}_call_seconds"
+            lines = [
+                f"# HELP {calls} Calls of an instrumented operation.",
+                f"# TYPE {calls} counter",
+            ]
+            for operation, stats in operations:
+                lines.append(f'{calls}{{operation="{operation}"}} {stats.calls}')
+            lines += [
+                f"# HELP {seconds} Latency of an instrumented operation.",
+                f"# TYPE {seconds} histogram",
+            ]
+            for operation, stats in operations:
+                cumulative = 0
+                for bound, bucket in zip(LATENCY_BUCKETS, stats.buckets):
+                    cumulative += bucket
+                    lines.append(
+                        f'{seconds}_bucket{{operation="{operation}",le="{bound}"}} '
+                        f"{cumulative}"
+                    )
+                lines += [
+                    f'{seconds}_bucket{{operation="{operation}",le="+Inf"}} '
+                    f"{stats.calls}",
+                    f'{seconds}_sum{{operation="{operation}"}} {stats.total_seconds}',
+                    f'{seconds}_count{{operation="{operation}"}} {stats.calls}',
+                ]
+            metrics = sorted({m for _, stats in operations for m in stats.counts})
+            for metric in metrics:
+                name = f"{self.namespace}_{metric}_total"
+                lines += [f"# TYPE {name} counter"]
+                for operation, stats in operations:
+                    if metric in stats.counts:
+                        lines.append(
+                            f'{name}{{operation="{operation}"}} {stats.counts[metric]}'
+                        )
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,115 @@
+import asyncio
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, Iterable, Optional, Protocol, TypeVar
+from uuid import UUID
+
+from credits_account.domain.entities.credit_account import CreditAccount
+from credits_account.infra.repository.in_memory_credit_account_repository import (
+    InMemoryCreditAccountRepository,
+)
+
+T = TypeVar("T")
+
+
+class AsyncCreditAccountRepository(Protocol):
+    async def load_account_by_company_id(
+        self, company_id: UUID
+    ) -> Optional[CreditAccount]:
+        ...
+
+    async def load_accounts_by_company_ids(
+        self, company_ids: Iterable[UUID]
+    ) -> Dict[UUID, CreditAccount]:
+        ...
+
+    async def add_credits(self, account: CreditAccount) -> None:
+        ...
+
+    async def consume_credits(self, account: CreditAccount) -> None:
+        ...
+
+    async def expire(self, account: CreditAccount) -> None:
+        ...
+
+    async def save(self, account: CreditAccount) -> None:
+        ...
+
+
+class AsyncInMemoryCreditAccountRepository:
+    """In-memory repository for asyncio callers.
+
+    Every call works on memory and completes without awaiting, so it is atomic
+    for the event loop; bulk loads yield between accounts to keep the loop
+    responsive.
+    """
+
+    def __init__(
+        self, repository: Optional[InMemoryCreditAccountRepository] = None
+    ) -> None:
+        self.repository = repository or InMemoryCreditAccountRepository()
+
+    async def load_account_by_company_id(
+        self, company_id: UUID
+    ) -> Optional[CreditAccount]:
+        return self.repository.load_account_by_company_id(company_id)
+
+    async def load_accounts_by_company_ids(
+        self, company_ids: Iterable[UUID]
+    ) -> Dict[UUID, CreditAccount]:
+        accounts: Dict[UUID, CreditAccount] = {}
+        for company_id in company_ids:
+            if company_id in accounts:
+                continue
+            account = self.repository.load_account_by_company_id(company_id)
+            if account:
+                accounts[company_id] = account
+            await asyncio.sleep(0)
+        return accounts
+
+    async def add_credits(self, account: CreditAccount) -> None:
+        self.repository.add_credits(account)
+
+    async def consume_credits(self, account: CreditAccount) -> None:
+        self.repository.consume_credits(account)
+
+    async def expire(self, account: CreditAccount) -> None:
+        self.repository.expire(account)
+
+    async def save(self, account: CreditAccount) -> None:
+        self.repository.save(account)
+
+
+class ThreadPoolCreditAccountRepository:
+    """Runs a blocking repository in an executor so it doesn't block the loop."""
+
+    def __init__(self, repository: Any, executor: Optional[Executor] = None) -> None:
+        self.repository = repository
+        self.executor = executor
+
+    async def _run(self, method: Callable[..., T], *args: Any) -> T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, method, *args)
+
+    async def load_account_by_company_id(
+        self, company_id: UUID
+    ) -> Optional[CreditAccount]:
+        return await self._run(self.repository.load_account_by_company_id, company_id)
+
+    async def load_accounts_by_company_ids(
+        self, company_ids: Iterable[UUID]
+    ) -> Dict[UUID, CreditAccount]:
+        return await self._run(
+            self.repository.load_accounts_by_company_ids, list(company_ids)
+        )
+
+    async def add_credits(self, account: CreditAccount) -> None:
+        await self._run(self.repository.add_credits, account)
+
+    async def consume_credits(self, account: CreditAccount) -> None:
+        await self._run(self.repository.consume_credits, account)
+
+    async def expire(self, account: CreditAccount) -> None:
+        await self._run(self.repository.expire, account)
+
+    async def save(self, account: CreditAccount) -> None:
+        await self._run(self.repository.save, account)
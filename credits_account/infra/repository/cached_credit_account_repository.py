@@ -0,0 +1,191 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from datetime import date
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from uuid import UUID
+
+from credits_account.domain.entities import (
+    CreditTransaction,
+    CreditTransactionSnapshot,
+)
+from credits_account.domain.entities.archived_credit_period import (
+    ArchivedCreditPeriod,
+)
+from credits_account.domain.entities.credit_account import (
+    ArchiveLoader,
+    CreditAccount,
+)
+
+
+@dataclass
+class CachedAccount:
+    """What is kept of a loaded account: one snapshot per credit.
+
+    Snapshots are never changed once taken, so every hit shares them and only
+    builds fresh, empty credits to restore them into.
+    """
+
+    company_id: UUID
+    version: int
+    credits: List[Tuple[CreditTransaction, CreditTransactionSnapshot]]
+    archived_periods: List[ArchivedCreditPeriod]
+    archive_loader: Optional[ArchiveLoader]
+
+    @staticmethod
+    def of(account: CreditAccount) -> "CachedAccount":
+        return CachedAccount(
+            company_id=account.company_id,
+            version=account.version,
+            credits=[
+                (replace(credit), credit.take_snapshot())
+                for credit in account._credit_state_list
+            ],
+            archived_periods=[
+                period.copy() for period in account.get_archived_periods()
+            ],
+            archive_loader=account._archive_loader,
+        )
+
+    def restore(self) -> CreditAccount:
+        credit_state_list: List[CreditTransaction] = []
+        for credit, snapshot in self.credits:
+            credit_state = replace(credit)
+            credit_state.restore_snapshot(snapshot)
+            credit_state_list.append(credit_state)
+        account = CreditAccount.restore(
+            company_id=self.company_id,
+            reference_date=date.today(),
+            credit_state_list=credit_state_list,
+            archived_periods=[period.copy() for period in self.archived_periods],
+            archive_loader=self.archive_loader,
+        )
+        account.version = self.version
+        return account
+
+
+class CachedCreditAccountRepository:
+    """Bounded LRU of hydrated accounts in front of another repository.
+
+    Entries live for at most ``ttl`` seconds and the least recently used one is
+    dropped once ``max_size`` accounts are cached; both count as evictions.
+    Callers always get an account rebuilt from the cached snapshots, so
+    changing a loaded account never touches the cached one; like snapshotted
+    loads, it only holds the movements registered after the load. Every write
+    goes to ``repository`` and then invalidates the account, including writes
+    rejected as stale.
+    """
+
+    def __init__(
+        self,
+        repository: Any,
+        max_size: int = 1024,
+        ttl: Optional[float] = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        assert max_size > 0, "The cache size should be greater than 0"
+        self.repository = repository
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._clock = clock
+        self._accounts: "OrderedDict[UUID, Tuple[float, CachedAccount]]" = (
+            OrderedDict()
+        )
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def load_account_by_company_id(self, company_id: UUID) -> Optional[CreditAccount]:
+        with self._lock:
+            cached_account = self._get(company_id)
+            generation = self._generation
+        if cached_account:
+            return cached_account.restore()
+        account = self.repository.load_account_by_company_id(company_id)
+        if not account:
+            return None
+        cached_account = CachedAccount.of(account)
+        with self._lock:
+            # an account written while it was loading may already be outdated
+            if generation == self._generation:
+                self._put(company_id, cached_account)
+        return account
+
+    def load_accounts_by_company_ids(
+        self, company_ids: Iterable[UUID]
+    ) -> Dict[UUID, CreditAccount]:
+        accounts: Dict[UUID, CreditAccount] = {}
+        for company_id in company_ids:
+            if company_id in accounts:
+                continue
+            account = self.load_account_by_company_id(company_id)
+            if account:
+                accounts[company_id] = account
+        return accounts
+
+    def create_account(self, account: CreditAccount) -> None:
+        try:
+            self.repository.create_account(account)
+        finally:
+            self.invalidate(account.company_id)
+
+    def add_credits(self, account: CreditAccount) -> None:
+        try:
+            self.repository.add_credits(account)
+        finally:
+            self.invalidate(account.company_id)
+
+    def consume_credits(self, account: CreditAccount) -> None:
+        try:
+            self.repository.consume_credits(account)
+        finally:
+            self.invalidate(account.company_id)
+
+    def expire(self, account: CreditAccount) -> None:
+        try:
+            self.repository.expire(account)
+        finally:
+            self.invalidate(account.company_id)
+
+    def save(self, account: CreditAccount) -> None:
+        try:
+            self.repository.save(account)
+        finally:
+            self.invalidate(account.company_id)
+
+    def invalidate(self, company_id: Optional[UUID] = None) -> None:
+        """Drops one account, or every cached account when none is given."""
+        with self._lock:
+            self._generation += 1
+            if company_id is None:
+                self._accounts.clear()
+            else:
+                self._accounts.pop(company_id, None)
+
+    def __len__(self) -> int:
+        return len(self._accounts)
+
+    def _get(self, company_id: UUID) -> Optional[CachedAccount]:
+        entry = self._accounts.get(company_id)
+        if not entry:
+            self.misses += 1
+            return None
+        cached_at, account = entry
+        if self.ttl is not None and self._clock() - cached_at >= self.ttl:
+            del self._accounts[company_id]
+            self.evictions += 1
+            self.misses += 1
+            return None
+        self._accounts.move_to_end(company_id)
+        self.hits += 1
+        return account
+
+    def _put(self, company_id: UUID, account: CachedAccount) -> None:
+        self._accounts[company_id] = (self._clock(), account)
+        self._accounts.move_to_end(company_id)
+        while len(self._accounts) > self.max_size:
+            self._accounts.popitem(last=False)
+            self.evictions += 1
@@ -1,27 +1,44 @@
-from dataclasses import dataclass
+import functools
+import threading
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass, replace
 from datetime import date, datetime
 from sqlite3 import Date
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 from uuid import UUID, uuid1
 
-from credits_account.domain.entities import CreditTransaction
+from credits_account.domain import instrumentation
+from credits_account.domain.entities import (
+    CreditTransaction,
+    CreditTransactionSnapshot,
+)
+from credits_account.domain.entities.archived_credit_period import (
+    ArchivedCreditPeriod,
+)
 from credits_account.domain.entities.credit_account import CreditAccount
 from credits_account.domain.entities.credit_movement import CreditMovementFactory
 
+STREAM_CHUNK_SIZE = 1000
+
 
 @dataclass
 class CreditAccountRow:
-    created_at: datetime
-    updated_at: datetime
+    created_at: date
+    updated_at: date
     id: UUID
     balance: int
     company_id: UUID
+    version: int = 0
+
+
+class StaleAccountError(RuntimeError):
+    pass
 
 
 @dataclass
 class CreditRow:
-    created_at: datetime
-    updated_at: datetime
+    created_at: date
+    updated_at: date
     initial_value: int
     consumed_value: int
     expiration_date: date
@@ -33,8 +50,8 @@ class CreditRow:
 
 @dataclass
 class CreditLogRow:
-    created_at: datetime
-    updated_at: datetime
+    created_at: date
+    updated_at: date
     credit_moviment: int
     account_id: UUID
     credit_id: UUID
@@ -44,8 +61,8 @@ class CreditLogRow:
 
 @dataclass
 class OperationLogRow:
-    created_at: datetime
-    updated_at: datetime
+    created_at: date
+    updated_at: date
     owner_id: UUID
     description: str
     total_movement: int
@@ -56,13 +73,112 @@ class OperationLogRow:
     object_id: str = ""
 
 
+def in_date_range(
+    value: date, start: Optional[date] = None, end: Optional[date] = None
+) -> bool:
+    """Whether ``value`` is in ``[start, end)``; plain dates mean midnight."""
+    moment = as_datetime(value)
+    if start and moment < as_datetime(start):
+        return False
+    if end and moment >= as_datetime(end):
+        return False
+    return True
+
+
+def as_datetime(value: date) -> datetime:
+    if isinstance(value, datetime):
+        return value
+    return datetime(value.year, value.month, value.day)
+
+
+def make_credit_row(
+    account: CreditAccount, credit: CreditTransaction, now: date
+) -> CreditRow:
+    credit.id = uuid1()
+    return CreditRow(
+        created_at=now,
+        updated_at=now,
+        initial_value=credit.get_remaining_value(),
+        consumed_value=credit.get_consumed_value(),
+        expiration_date=credit.get_expiration_date(),
+        type=credit.type,
+        account_id=account.get_id(),
+        id=credit.id,
+        contracted_service_id=credit.contract_service_id,
+    )
+
+
+def make_movement_rows(
+    account: CreditAccount, credit: CreditTransaction, use: Any, now: date
+) -> Tuple[CreditLogRow, OperationLogRow]:
+    assert credit.id, "Movements can only be saved for persisted credits"
+    if not use.id:
+        use.id = uuid1()
+    if not use.operation_id:
+        use.operation_id = uuid1()
+    credit_log = CreditLogRow(
+        created_at=now,
+        updated_at=now,
+        credit_moviment=use.credit_movement,
+        account_id=account.get_id(),
+        credit_id=credit.id,
+        operation_id=use.operation_id,
+        id=use.id,
+    )
+    operation_log = OperationLogRow(
+        created_at=now,
+        updated_at=now,
+        owner_id=uuid1(),  # TODO: find a way to get it from input
+        description=use.operation_log,
+        total_movement=use.operation_movement,
+        operation=use.operation_type,
+        account_id=account.get_id(),
+        id=use.operation_id,
+        object_type=getattr(use, "object_type", ""),
+        object_id=getattr(use, "object_id", ""),
+    )
+    return credit_log, operation_log
+
+
+def restore_movement(clog: CreditLogRow, olog: OperationLogRow) -> Any:
+    movement = CreditMovementFactory(
+        clog.credit_moviment,
+        olog.operation,
+        olog.total_movement,
+        olog.description,
+        clog.operation_id,
+        clog.id,
+    ).make()
+    if hasattr(movement, "set_movement_origin"):
+        movement.set_movement_origin(olog.object_type, olog.object_id)
+    return movement
+
+
 class InMemoryCreditAccountRepository:
-    def __init__(self, contracted_service_creation_date: Optional[Date] = None) -> None:
+    def __init__(
+        self,
+        contracted_service_creation_date: Optional[Date] = None,
+        columnar_storage: bool = False,
+        lock_stripes: int = 64,
+        snapshot_every: Optional[int] = None,
+        compact_on_load: bool = False,
+    ) -> None:
+        assert (
+            snapshot_every is None or snapshot_every > 0
+        ), "The snapshot interval should be greater than 0"
         self.credit_account_rows: Dict[UUID, CreditAccountRow] = {}
         self.credit_rows: Dict[UUID, CreditRow] = {}
         self.credit_logs_rows: Dict[UUID, CreditLogRow] = {}
         self.operation_logs_rows: Dict[UUID, OperationLogRow] = {}
         self.contracted_service_creation_date = contracted_service_creation_date
+        self.columnar_storage = columnar_storage
+        self.snapshot_every = snapshot_every
+        self.compact_on_load = compact_on_load
+        self.credit_snapshots: Dict[UUID, CreditTransactionSnapshot] = {}
+        self.archived_periods: Dict[UUID, List[ArchivedCreditPeriod]] = {}
+        self._locks = [threading.Lock() for _ in range(lock_stripes)]
+        self._credit_ids_by_account: Dict[UUID, Dict[UUID, None]] = {}
+        self._credit_logs_by_credit: Dict[UUID, List[CreditLogRow]] = {}
 
     @staticmethod
     def populate(
@@ -75,15 +191,69 @@ class InMemoryCreditAccountRepository:
         InMemoryCreditAccountRepository._add_to_field(
             repo.credit_account_rows, credit_account_rows, "id"
         )
-        InMemoryCreditAccountRepository._add_to_field(
-            repo.credit_rows, credit_rows, "account_id"
-        )
-        InMemoryCreditAccountRepository._add_to_field(
-            repo.credit_logs_rows, credit_logs_rows, "account_id"
-        )
-        InMemoryCreditAccountRepository._add_to_field(
-            repo.operation_logs_rows, operation_logs_rows, "account_id"
+        repo.import_rows(credit_rows, credit_logs_rows, operation_logs_rows)
+        return repo
+
+    def import_rows(
+        self,
+        credit_rows: Iterable[CreditRow],
+        credit_logs_rows: Iterable[CreditLogRow],
+        operation_logs_rows: Iterable[OperationLogRow],
+    ) -> None:
+        for credit_row in credit_rows:
+            self._save_credit_row(credit_row)
+        for credit_log_row in credit_logs_rows:
+            self._save_credit_log_row(credit_log_row)
+        for operation_log_row in operation_logs_rows:
+            self._save_operation_log_row(operation_log_row)
+
+    def import_account_rows(
+        self,
+        company_id: UUID,
+        version: int,
+        credit_rows: Iterable[CreditRow],
+        credit_logs_rows: Iterable[CreditLogRow],
+        operation_logs_rows: Iterable[OperationLogRow],
+    ) -> None:
+        """Imports rows written to a copy of the account loaded at ``version``.
+
+        Like any other write, it raises StaleAccountError when the account
+        changed since that version and bumps the version otherwise.
+        """
+        with self._lock_for(company_id):
+            credit_account_row = self.credit_account_rows.get(company_id)
+            if not credit_account_row or credit_account_row.version != version:
+                raise StaleAccountError(
+                    f"CreditAccount of {company_id} was changed since it was loaded"
+                )
+            self.import_rows(credit_rows, credit_logs_rows, operation_logs_rows)
+            credit_account_row.version += 1
+
+    def shard(self, company_ids: Iterable[UUID]) -> "InMemoryCreditAccountRepository":
+        """Copies the rows of the given accounts into a new repository."""
+        # compacting on load would bump the versions the shard is merged against
+        repo = InMemoryCreditAccountRepository(
+            self.contracted_service_creation_date,
+            self.columnar_storage,
         )
+        for company_id in company_ids:
+            credit_account_row = self.credit_account_rows.get(company_id)
+            if not credit_account_row:
+                continue
+            repo.credit_account_rows[company_id] = replace(credit_account_row)
+            repo.archived_periods[credit_account_row.id] = [
+                period.copy()
+                for period in self.archived_periods.get(credit_account_row.id, [])
+            ]
+            for credit_id in self._credit_ids_by_account.get(credit_account_row.id, {}):
+                repo._save_credit_row(self.credit_rows[credit_id])
+                if credit_id in self.credit_snapshots:
+                    repo.credit_snapshots[credit_id] = self.credit_snapshots[credit_id]
+                for clog in self._credit_logs_by_credit.get(credit_id, []):
+                    repo._save_credit_log_row(clog)
+                    olog = self.operation_logs_rows.get(clog.operation_id)
+                    if olog:
+                        repo._save_operation_log_row(olog)
         return repo
 
     @staticmethod
@@ -101,164 +271,414 @@ class InMemoryCreditAccountRepository:
             created_at=now,
             updated_at=now,
             id=account.get_id(),
-            balance=account.balance,
+            balance=account.get_balance(),
             company_id=account.company_id,
         )
-        self.credit_account_rows[account.company_id] = row
+        with self._lock_for(account.company_id):
+            # replacing the row would reset the version other copies compare to
+            if account.company_id in self.credit_account_rows:
+                raise ValueError(
+                    f"CreditAccount {account.get_id()} was already created"
+                )
+            self.credit_account_rows[account.company_id] = row
+
+    def _save_credit_row(self, row: CreditRow) -> None:
+        self.credit_rows[row.id] = row
+        if row.account_id not in self._credit_ids_by_account:
+            self._credit_ids_by_account[row.account_id] = {}
+        self._credit_ids_by_account[row.account_id][row.id] = None
+
+    def _save_credit_log_row(self, row: CreditLogRow) -> None:
+        previous_row = self.credit_logs_rows.get(row.id)
+        self.credit_logs_rows[row.id] = row
+        if row.credit_id not in self._credit_logs_by_credit:
+            self._credit_logs_by_credit[row.credit_id] = []
+        credit_logs = self._credit_logs_by_credit[row.credit_id]
+        if previous_row and previous_row.credit_id == row.credit_id:
+            credit_logs[credit_logs.index(previous_row)] = row
+        else:
+            credit_logs.append(row)
+
+    def _save_operation_log_row(self, row: OperationLogRow) -> None:
+        self.operation_logs_rows[row.id] = row
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = dict(self.__dict__)
+        state["_locks"] = len(self._locks)
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        state["_locks"] = [threading.Lock() for _ in range(state["_locks"])]
+        self.__dict__.update(state)
+
+    def _lock_for(self, company_id: UUID) -> threading.Lock:
+        return self._locks[hash(company_id) % len(self._locks)]
+
+    @contextmanager
+    def _compare_and_swap(self, account: CreditAccount) -> Iterator[None]:
+        with self._lock_for(account.company_id):
+            credit_account_row = self.credit_account_rows.get(account.company_id)
+            if credit_account_row and credit_account_row.version != account.version:
+                raise StaleAccountError(
+                    f"CreditAccount {account.get_id()} was changed since it was loaded"
+                )
+            yield
+            if account.has_pending_archive():
+                self._save_archive(account)
+            if credit_account_row:
+                credit_account_row.version += 1
+                account.version = credit_account_row.version
 
     def load_account_by_company_id(self, company_id: UUID) -> Optional[CreditAccount]:
-        now = datetime.now()
-        credit_account_row = self.credit_account_rows.get(company_id)
-        if not credit_account_row:
-            return None
+        with self._lock_for(company_id):
+            credit_account_row = self.credit_account_rows.get(company_id)
+            if not credit_account_row:
+                return None
+            return self._restore_account(credit_account_row)
+
+    def load_accounts_by_company_ids(
+        self, company_ids: Iterable[UUID]
+    ) -> Dict[UUID, CreditAccount]:
+        accounts: Dict[UUID, CreditAccount] = {}
+        for company_id in company_ids:
+            if company_id in accounts:
+                continue
+            account = self.load_account_by_company_id(company_id)
+            if account:
+                accounts[company_id] = account
+        return accounts
+
+    def _restore_account(self, credit_account_row: CreditAccountRow) -> CreditAccount:
+        archived_periods = self.archived_periods.get(credit_account_row.id, [])
+        archived_ids = {
+            credit_id for period in archived_periods for credit_id in period.credit_ids
+        }
         credits_movements: List[CreditTransaction] = []
-        for credit in self.credit_rows.values():
-            credit_state = CreditTransaction(
-                creation_date=credit.created_at,
-                account_id=credit_account_row.id,
-                type=credit.type,
-                contract_service_id=credit.contracted_service_id,
-                id=credit.id,
-                contract_service_creation_date=self.contracted_service_creation_date,
+        rows = 1
+        for credit_id in self._credit_ids_by_account.get(credit_account_row.id, {}):
+            if credit_id in archived_ids:
+                continue
+            credit_state, credit_rows = self._restore_credit(
+                credit_account_row.id, credit_id
             )
-            if credit_state not in credits_movements:
-                credits_movements.append(credit_state)
-            for clog in self.credit_logs_rows.values():
-                if clog.credit_id != credit.id:
-                    continue
-                for olog in self.operation_logs_rows.values():
-                    if olog.id != clog.operation_id:
-                        continue
-                    movement = CreditMovementFactory(
-                        clog.credit_moviment,
-                        olog.operation,
-                        clog.operation_id,
-                        olog.total_movement,
-                        olog.description,
-                        clog.id,
-                    ).make()
-                    credit_state.register_movement(movement)
+            credits_movements.append(credit_state)
+            rows += credit_rows
 
         credit_account = CreditAccount.restore(
             company_id=credit_account_row.company_id,
             reference_date=date.today(),
             credit_state_list=credits_movements,
+            archived_periods=[period.copy() for period in archived_periods],
+            archive_loader=functools.partial(
+                self._load_archived_credits, credit_account_row.company_id
+            ),
         )
+        credit_account.version = credit_account_row.version
+        if instrumentation.enabled:
+            instrumentation.record(
+                f"{type(self).__name__}.load_account_by_company_id",
+                "rows_touched",
+                rows,
+            )
+        # the new archive is a write, so copies loaded before it become stale
+        if self.compact_on_load and credit_account.compact():
+            self._save_archive(credit_account)
+            credit_account_row.version += 1
+            credit_account.version = credit_account_row.version
         return credit_account
 
+    def _restore_credit(
+        self, account_id: UUID, credit_id: UUID
+    ) -> Tuple[CreditTransaction, int]:
+        credit = self.credit_rows[credit_id]
+        credit_state = CreditTransaction(
+            creation_date=credit.created_at,
+            account_id=account_id,
+            type=credit.type,
+            contract_service_id=credit.contracted_service_id,
+            id=credit.id,
+            contract_service_creation_date=self.contracted_service_creation_date,
+            columnar_storage=self.columnar_storage,
+        )
+        credit_logs = self._credit_logs_by_credit.get(credit.id, [])
+        snapshot = self.credit_snapshots.get(credit.id)
+        if snapshot:
+            credit_state.restore_snapshot(snapshot)
+            credit_logs = credit_logs[snapshot.movements :]
+        for clog in credit_logs:
+            olog = self.operation_logs_rows.get(clog.operation_id)
+            if not olog:
+                continue
+            credit_state.register_movement(restore_movement(clog, olog))
+        credit_state.mark_all_as_persisted()
+        return credit_state, 1 + 2 * len(credit_logs)
+
+    def _load_archived_credits(
+        self, company_id: UUID, credit_ids: List[UUID]
+    ) -> List[CreditTransaction]:
+        with self._lock_for(company_id):
+            account_id = self.credit_account_rows[company_id].id
+            return [
+                self._restore_credit(account_id, credit_id)[0]
+                for credit_id in credit_ids
+            ]
+
+    def _save_archive(self, account: CreditAccount) -> None:
+        self.archived_periods[account.get_id()] = [
+            period.copy() for period in account.get_archived_periods()
+        ]
+        account.mark_archive_as_persisted()
+
     def add_credits(self, account: CreditAccount) -> None:
+        with self._compare_and_swap(account):
+            self._after_write("add_credits", *self._add_credits(account))
+
+    def consume_credits(self, account: CreditAccount) -> None:
+        with self._compare_and_swap(account):
+            self._after_write(
+                "consume_credits", *self._save_pending_movements(account, "CONSUME")
+            )
+
+    def expire(self, account: CreditAccount) -> None:
+        with self._compare_and_swap(account):
+            self._after_write(
+                "expire", *self._save_pending_movements(account, "EXPIRE")
+            )
+
+    def save(self, account: CreditAccount) -> None:
+        with self._compare_and_swap(account):
+            self._after_write("save", *self._save(account))
+
+    def _after_write(
+        self, method_name: str, credits: List[CreditTransaction], rows: int
+    ) -> None:
+        if instrumentation.enabled:
+            instrumentation.record(
+                f"{type(self).__name__}.{method_name}", "rows_touched", rows
+            )
+        self._snapshot_if_due(credits)
+
+    def take_snapshots(self, company_id: UUID) -> int:
+        """Snapshots every credit of the account now; returns how many were taken."""
+        with self._lock_for(company_id):
+            credit_account_row = self.credit_account_rows.get(company_id)
+            if not credit_account_row:
+                return 0
+            account = self._restore_account(credit_account_row)
+            return sum(
+                self._take_snapshot(credit) for credit in account._credit_state_list
+            )
+
+    def _snapshot_if_due(self, credits: List[CreditTransaction]) -> None:
+        if not self.snapshot_every:
+            return
+        for credit in credits:
+            if not credit.id:
+                continue
+            snapshot = self.credit_snapshots.get(credit.id)
+            covered_movements = snapshot.movements if snapshot else 0
+            logs = len(self._credit_logs_by_credit.get(credit.id, []))
+            if logs - covered_movements >= self.snapshot_every:
+                self._take_snapshot(credit)
+
+    def _take_snapshot(self, credit: CreditTransaction) -> bool:
+        if not credit.id or credit.get_pending_movements():
+            return False
+        snapshot = credit.take_snapshot()
+        # a credit with log rows that were not replayed can't be summarized
+        if snapshot.movements != len(self._credit_logs_by_credit.get(credit.id, [])):
+            return False
+        self.credit_snapshots[credit.id] = snapshot
+        return True
+
+    def _add_credits(
+        self, account: CreditAccount
+    ) -> Tuple[List[CreditTransaction], int]:
         now = account._reference_date
-        for credit in account._transactions:
+        saved_credits: List[CreditTransaction] = []
+        rows = 0
+        for credit in account.get_pending_transactions():
             if credit.id:
                 continue
-            credit.id = uuid1()
-            credit_row = CreditRow(
-                created_at=now,
-                updated_at=now,
-                initial_value=credit.get_remaining_value(),
-                consumed_value=credit.get_consumed_value(),
-                expiration_date=credit.get_expiration_date(),
-                type=credit.type,
-                account_id=account.get_id(),
-                id=credit.id,
-                contracted_service_id=credit.contract_service_id,
-            )
-            self.credit_rows[credit.id] = credit_row
-            for use in credit._usage_list:
-                if not use.id:
-                    use.id = uuid1()
-                if not use.operation_id:
-                    use.operation_id = uuid1()
-                credit_log = CreditLogRow(
-                    created_at=now,
-                    updated_at=now,
-                    credit_moviment=use.credit_movement,
-                    account_id=account.get_id(),
-                    credit_id=credit.id,
-                    operation_id=use.operation_id,
-                    id=use.id,
-                )
-                self.credit_logs_rows[credit_log.id] = credit_log
-                operation_log = OperationLogRow(
-                    created_at=now,
-                    updated_at=now,
-                    owner_id=uuid1(),  # TODO: find a way to get it from input
-                    description=use.operation_log,
-                    total_movement=use.operation_movement,
-                    operation=use.operation_type,
-                    account_id=account.get_id(),
-                    id=use.operation_id,
-                    object_type="",
-                    object_id="",
-                )
-                self.operation_logs_rows[operation_log.id] = operation_log
+            rows += self._save_credit(account, credit, now)
+            for use in credit.get_pending_movements():
+                rows += self._save_movement(account, credit, use, now)
+            credit.mark_all_as_persisted()
+            saved_credits.append(credit)
+        return saved_credits, rows
 
-    def consume_credits(self, account: CreditAccount) -> None:
+    def _save(self, account: CreditAccount) -> Tuple[List[CreditTransaction], int]:
         now = account._reference_date
-        for credit in account._transactions:
-            if not credit.id or not credit.get_consumed_value():
+        saved_credits = account.get_pending_transactions()
+        rows = 0
+        for credit in saved_credits:
+            if not credit.id:
+                rows += self._save_credit(account, credit, now)
+            for use in credit.get_pending_movements():
+                rows += self._save_movement(account, credit, use, now)
+        account.mark_as_persisted()
+        return saved_credits, rows
+
+    def _save_pending_movements(
+        self, account: CreditAccount, operation_type: str
+    ) -> Tuple[List[CreditTransaction], int]:
+        now = account._reference_date
+        saved_credits: List[CreditTransaction] = []
+        rows = 0
+        for credit in account.get_pending_transactions():
+            if not credit.id:
+                continue
+            movements = [
+                use
+                for use in credit.get_pending_movements()
+                if use.operation_type == operation_type
+            ]
+            if not movements:
                 continue
-            for use in credit.get_consumed_movements():
-                if not use.id:
-                    use.id = uuid1()
-                if not use.operation_id:
-                    use.operation_id = uuid1()
-                credit_log = CreditLogRow(
-                    created_at=now,
-                    updated_at=now,
-                    credit_moviment=use.credit_movement,
-                    account_id=account.get_id(),
-                    credit_id=credit.id,
-                    operation_id=use.operation_id,
-                    id=use.id,
+            for use in movements:
+                rows += self._save_movement(account, credit, use, now)
+            credit.mark_as_persisted(*movements)
+            saved_credits.append(credit)
+        return saved_credits, rows
+
+    def iter_operation_logs(
+        self,
+        account_id: Optional[UUID] = None,
+        operation: Optional[str] = None,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+    ) -> Iterator[OperationLogRow]:
+        """Streams the operation log rows matching every given filter.
+
+        The row ids are taken under the account lock, or every lock without
+        ``account_id``, and the rows are read and filtered in chunks of
+        ``STREAM_CHUNK_SIZE``, taking the locks again for each chunk.
+        """
+        with self._locked(account_id):
+            if account_id:
+                operation_ids = list(
+                    dict.fromkeys(
+                        row.operation_id for row in self._credit_logs_of(account_id)
+                    )
                 )
-                self.credit_logs_rows[credit_log.id] = credit_log
-                operation_log = OperationLogRow(
-                    created_at=now,
-                    updated_at=now,
-                    owner_id=uuid1(),  # TODO: find a way to get it from input
-                    description=use.operation_log,
-                    total_movement=use.operation_movement,
-                    operation=use.operation_type,
-                    account_id=account.get_id(),
-                    id=use.operation_id,
-                    object_type=use.object_type,
-                    object_id=use.object_id,
+            else:
+                operation_ids = list(self.operation_logs_rows)
+        for offset in range(0, len(operation_ids), STREAM_CHUNK_SIZE):
+            with self._locked(account_id):
+                rows = self._matching_operation_logs(
+                    operation_ids[offset : offset + STREAM_CHUNK_SIZE],
+                    operation,
+                    start,
+                    end,
                 )
-                self.operation_logs_rows[operation_log.id] = operation_log
+            yield from rows
 
-    def expire(self, account: CreditAccount) -> None:
-        now = account._reference_date
-        for credit in account._transactions:
-            if not credit.id or not credit.is_expired(now):
+    def iter_credit_logs(
+        self,
+        account_id: Optional[UUID] = None,
+        operation: Optional[str] = None,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+    ) -> Iterator[CreditLogRow]:
+        """Streams the credit log rows matching every given filter.
+
+        ``operation`` is matched against the operation log of each row. Like
+        ``iter_operation_logs`` the rows are read in chunks under the locks;
+        with ``account_id`` they come grouped by credit.
+        """
+        with self._locked(account_id):
+            if account_id:
+                credit_log_ids = [row.id for row in self._credit_logs_of(account_id)]
+            else:
+                credit_log_ids = list(self.credit_logs_rows)
+        for offset in range(0, len(credit_log_ids), STREAM_CHUNK_SIZE):
+            with self._locked(account_id):
+                rows = self._matching_credit_logs(
+                    credit_log_ids[offset : offset + STREAM_CHUNK_SIZE],
+                    operation,
+                    start,
+                    end,
+                )
+            yield from rows
+
+    def _matching_operation_logs(
+        self,
+        operation_ids: List[UUID],
+        operation: Optional[str],
+        start: Optional[date],
+        end: Optional[date],
+    ) -> List[OperationLogRow]:
+        rows = []
+        for operation_id in operation_ids:
+            row = self.operation_logs_rows.get(operation_id)
+            if (
+                row
+                and (not operation or row.operation == operation.upper())
+                and in_date_range(row.created_at, start, end)
+            ):
+                rows.append(row)
+        return rows
+
+    def _matching_credit_logs(
+        self,
+        credit_log_ids: List[UUID],
+        operation: Optional[str],
+        start: Optional[date],
+        end: Optional[date],
+    ) -> List[CreditLogRow]:
+        rows = []
+        for credit_log_id in credit_log_ids:
+            row = self.credit_logs_rows.get(credit_log_id)
+            if not row:
                 continue
-            for use in credit._usage_list:
-                if use.operation_type != "EXPIRE":
+            if operation:
+                operation_log = self.operation_logs_rows.get(row.operation_id)
+                if not operation_log or operation_log.operation != operation.upper():
                     continue
-                if not use.id:
-                    use.id = uuid1()
-                if not use.operation_id:
-                    use.operation_id = uuid1()
-                credit_log = CreditLogRow(
-                    created_at=now,
-                    updated_at=now,
-                    credit_moviment=use.credit_movement,
-                    account_id=account.get_id(),
-                    credit_id=credit.id,
-                    operation_id=use.operation_id,
-                    id=use.id,
-                )
-                self.credit_logs_rows[credit_log.id] = credit_log
-                operation_log = OperationLogRow(
-                    created_at=now,
-                    updated_at=now,
-                    owner_id=uuid1(),  # TODO: find a way to get it from input
-                    description=use.operation_log,
-                    total_movement=use.operation_movement,
-                    operation=use.operation_type,
-                    account_id=account.get_id(),
-                    id=use.operation_id,
-                    object_type="",
-                    object_id="",
-                )
-                self.operation_logs_rows[operation_log.id] = operation_log
+            if in_date_range(row.created_at, start, end):
+                rows.append(row)
+        return rows
+
+    @contextmanager
+    def _locked(self, account_id: Optional[UUID]) -> Iterator[None]:
+        # accounts are stored under their company id, which is also their id
+        locks = [self._lock_for(account_id)] if account_id else self._locks
+        with ExitStack() as stack:
+            for lock in locks:
+                stack.enter_context(lock)
+            yield
+
+    def _credit_logs_of(self, account_id: UUID) -> List[CreditLogRow]:
+        return [
+            row
+            for credit_id in self._credit_ids_by_account.get(account_id, {})
+            for row in self._credit_logs_by_credit.get(credit_id, [])
+        ]
+
+    def _save_credit(
+        self, account: CreditAccount, credit: CreditTransaction, now: date
+    ) -> int:
+        self._save_credit_row(make_credit_row(account, credit, now))
+        return 1
+
+    def _save_movement(
+        self,
+        account: CreditAccount,
+        credit: CreditTransaction,
+        use: Any,
+        now: date,
+    ) -> int:
+        credit_log, operation_log = make_movement_rows(account, credit, use, now)
+        self._save_credit_log_row(credit_log)
+        self._save_operation_log_row(operation_log)
+        return 2
+
+
+instrumentation.instrument(
+    InMemoryCreditAccountRepository,
+    "load_account_by_company_id",
+    "add_credits",
+    "consume_credits",
+    "expire",
+    "save",
+)
@@ -0,0 +1,896 @@
+import functools
+import json
+import sqlite3
+import threading
+from datetime import date, datetime, time
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+from uuid import UUID
+
+from credits_account.domain import instrumentation
+from credits_account.domain.entities import (
+    CreditTransaction,
+    CreditTransactionSnapshot,
+)
+from credits_account.domain.entities.archived_credit_period import (
+    ArchivedCreditPeriod,
+)
+from credits_account.domain.entities.credit_account import CreditAccount
+from credits_account.infra.repository.in_memory_credit_account_repository import (
+    STREAM_CHUNK_SIZE,
+    CreditAccountRow,
+    CreditLogRow,
+    CreditRow,
+    OperationLogRow,
+    StaleAccountError,
+    as_datetime,
+    make_credit_row,
+    make_movement_rows,
+    restore_movement,
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS credit_accounts (
+    id BLOB PRIMARY KEY,
+    company_id BLOB NOT NULL UNIQUE,
+    balance INTEGER NOT NULL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    version INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS credits (
+    seq INTEGER PRIMARY KEY,
+    id BLOB NOT NULL UNIQUE,
+    account_id BLOB NOT NULL,
+    initial_value INTEGER NOT NULL,
+    consumed_value INTEGER NOT NULL,
+    expiration_date TEXT NOT NULL,
+    type TEXT NOT NULL,
+    contracted_service_id BLOB,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS credit_logs (
+    seq INTEGER PRIMARY KEY,
+    id BLOB NOT NULL UNIQUE,
+    account_id BLOB NOT NULL,
+    credit_id BLOB NOT NULL,
+    operation_id BLOB NOT NULL,
+    credit_moviment INTEGER NOT NULL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS operation_logs (
+    id BLOB PRIMARY KEY,
+    account_id BLOB NOT NULL,
+    owner_id BLOB NOT NULL,
+    description TEXT NOT NULL,
+    total_movement INTEGER NOT NULL,
+    operation TEXT NOT NULL,
+    object_type TEXT NOT NULL DEFAULT '',
+    object_id TEXT NOT NULL DEFAULT '',
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS credit_snapshots (
+    credit_id BLOB PRIMARY KEY,
+    account_id BLOB NOT NULL,
+    last_log_seq INTEGER NOT NULL,
+    movements INTEGER NOT NULL,
+    remaining_value INTEGER NOT NULL,
+    consumed_value INTEGER NOT NULL,
+    refunded_value INTEGER NOT NULL,
+    expired_value INTEGER NOT NULL,
+    granted_value INTEGER NOT NULL,
+    expired INTEGER NOT NULL,
+    expiration_date TEXT NOT NULL,
+    state TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS archived_credit_periods (
+    account_id BLOB NOT NULL,
+    period TEXT NOT NULL,
+    remaining_value INTEGER NOT NULL,
+    consumed_value INTEGER NOT NULL,
+    refunded_value INTEGER NOT NULL,
+    expired_value INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    PRIMARY KEY (account_id, period)
+);
+CREATE TABLE IF NOT EXISTS archived_credits (
+    credit_id BLOB PRIMARY KEY,
+    account_id BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS archived_credits_account
+    ON archived_credits (account_id);
+CREATE INDEX IF NOT EXISTS credit_snapshots_account
+    ON credit_snapshots (account_id);
+CREATE INDEX IF NOT EXISTS credits_account_created_at
+    ON credits (account_id, created_at);
+CREATE INDEX IF NOT EXISTS credit_logs_account_credit
+    ON credit_logs (account_id, credit_id);
+CREATE INDEX IF NOT EXISTS credit_logs_account_created_at
+    ON credit_logs (account_id, created_at);
+CREATE INDEX IF NOT EXISTS operation_logs_account_created_at
+    ON operation_logs (account_id, created_at);
+"""
+
+LOAD_CREDITS_QUERY = """
+SELECT
+    c.id, c.account_id, c.initial_value, c.consumed_value, c.expiration_date,
+    c.type, c.contracted_service_id, c.created_at, c.updated_at,
+    l.id, l.operation_id, l.credit_moviment, l.created_at, l.updated_at,
+    o.owner_id, o.description, o.total_movement, o.operation,
+    o.object_type, o.object_id, o.created_at, o.updated_at
+FROM credits AS c
+LEFT JOIN credit_snapshots AS s ON s.credit_id = c.id
+LEFT JOIN credit_logs AS l
+    ON l.account_id = c.account_id
+    AND l.credit_id = c.id
+    AND l.seq > COALESCE(s.last_log_seq, 0)
+LEFT JOIN operation_logs AS o ON o.id = l.operation_id
+WHERE c.account_id = ? AND c.id {credits}
+ORDER BY c.seq, l.seq
+"""
+
+LOAD_SNAPSHOTS_QUERY = """
+SELECT
+    credit_id, movements, remaining_value, consumed_value, refunded_value,
+    expired_value, granted_value, expired, expiration_date, state
+FROM credit_snapshots
+WHERE account_id = ? AND credit_id {credits}
+"""
+
+LOAD_ARCHIVED_PERIODS_QUERY = """
+SELECT
+    period, remaining_value, consumed_value, refunded_value, expired_value, state
+FROM archived_credit_periods
+WHERE account_id = ?
+ORDER BY period
+"""
+
+# credits of the working set, leaving the archived ones out
+UNARCHIVED_CREDITS = (
+    "NOT IN (SELECT credit_id FROM archived_credits WHERE account_id = ?)"
+)
+
+AnyDate = Union[date, datetime]
+
+
+def _to_blob(value: Optional[UUID]) -> Optional[bytes]:
+    return value.bytes if value else None
+
+
+def _to_uuid(value: Optional[bytes]) -> Optional[UUID]:
+    return UUID(bytes=value) if value else None
+
+
+def _to_date(value: str) -> AnyDate:
+    if len(value) > 10:
+        return datetime.fromisoformat(value)
+    return date.fromisoformat(value)
+
+
+def _to_date_bound(value: date) -> str:
+    """``value`` as an ISO string that compares like a date with stored ones.
+
+    Stored dates are either ``YYYY-MM-DD`` or a longer datetime, so a midnight
+    bound is written as a plain date: it sorts before every datetime of that
+    day and equal to the date itself, which is how a plain date is compared.
+    """
+    moment = as_datetime(value)
+    if moment.time() == time():
+        return moment.date().isoformat()
+    return moment.isoformat()
+
+
+def _dump_snapshot_state(snapshot: CreditTransactionSnapshot) -> str:
+    return json.dumps(
+        {
+            "movement_counts": snapshot.movement_counts,
+            "consumes_by_origin": [
+                [*origin, *consume]
+                for origin, consume in snapshot.consumes_by_origin.items()
+            ],
+            "refunded_origins": snapshot.refunded_origins,
+        }
+    )
+
+
+def _load_snapshot(row: Tuple[Any, ...]) -> CreditTransactionSnapshot:
+    state = json.loads(row[9])
+    return CreditTransactionSnapshot(
+        credit_id=UUID(bytes=row[0]),
+        movements=row[1],
+        remaining_value=row[2],
+        consumed_value=row[3],
+        refunded_value=row[4],
+        expired_value=row[5],
+        granted_value=row[6],
+        expired=bool(row[7]),
+        expiration_date=_to_date(row[8]),
+        movement_counts=state["movement_counts"],
+        consumes_by_origin={
+            (object_type, object_id): (credit_movement, operation_movement)
+            for object_type, object_id, credit_movement, operation_movement in state[
+                "consumes_by_origin"
+            ]
+        },
+        refunded_origins=tuple(
+            (object_type, object_id)
+            for object_type, object_id in state["refunded_origins"]
+        ),
+    )
+
+
+def _dump_archived_period_state(period: ArchivedCreditPeriod) -> str:
+    return json.dumps(
+        {
+            "credit_ids": [credit_id.hex for credit_id in period.credit_ids],
+            "refundable_origins": [
+                [*origin, [credit_id.hex for credit_id in credit_ids]]
+                for origin, credit_ids in period.refundable_origins.items()
+            ],
+            "refunded_origins": [
+                [*origin, count] for origin, count in period.refunded_origins.items()
+            ],
+        }
+    )
+
+
+def _load_archived_period(row: Tuple[Any, ...]) -> ArchivedCreditPeriod:
+    state = json.loads(row[5])
+    return ArchivedCreditPeriod(
+        period=date.fromisoformat(row[0]),
+        credit_ids=[UUID(credit_id) for credit_id in state["credit_ids"]],
+        remaining_value=row[1],
+        consumed_value=row[2],
+        refunded_value=row[3],
+        expired_value=row[4],
+        refundable_origins={
+            (object_type, object_id): [UUID(credit_id) for credit_id in credit_ids]
+            for object_type, object_id, credit_ids in state["refundable_origins"]
+        },
+        refunded_origins={
+            (object_type, object_id): count
+            for object_type, object_id, count in state["refunded_origins"]
+        },
+    )
+
+
+def _list_unassigned_ids(
+    persisted: List[Tuple[CreditTransaction, List[Any]]]
+) -> List[Tuple[Any, str]]:
+    unassigned_ids: List[Tuple[Any, str]] = []
+    for credit, movements in persisted:
+        if not credit.id:
+            unassigned_ids.append((credit, "id"))
+        for use in movements:
+            for id_field in ("id", "operation_id"):
+                if not getattr(use, id_field):
+                    unassigned_ids.append((use, id_field))
+    return unassigned_ids
+
+
+class SQLiteCreditAccountRepository:
+    """SQLite implementation of the credit account repository API.
+
+    The database runs in WAL mode, every flush writes its rows with one
+    ``executemany`` per table inside a single transaction and an account is
+    loaded with one joined query over its credits, credit logs and operation
+    logs. With ``snapshot_every`` set, a credit is snapshotted once it has that
+    many log rows after its last snapshot and loads replay only those rows.
+    Compacted accounts store their archived period totals, and archived
+    credits are only read back when a refund needs them.
+
+    The connection is shared by every thread, so each load, flush and chunk
+    of a streamed query runs under one lock and transactions never interleave.
+    """
+
+    def __init__(
+        self,
+        database: str = ":memory:",
+        contracted_service_creation_date: Optional[date] = None,
+        columnar_storage: bool = False,
+        snapshot_every: Optional[int] = None,
+        compact_on_load: bool = False,
+    ) -> None:
+        assert (
+            snapshot_every is None or snapshot_every > 0
+        ), "The snapshot interval should be greater than 0"
+        self.contracted_service_creation_date = contracted_service_creation_date
+        self.columnar_storage = columnar_storage
+        self.snapshot_every = snapshot_every
+        self.compact_on_load = compact_on_load
+        self._connection = sqlite3.connect(database, check_same_thread=False)
+        self._lock = threading.RLock()
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(SCHEMA)
+
+    @staticmethod
+    def populate(
+        credit_account_rows: List[CreditAccountRow],
+        credit_rows: List[CreditRow],
+        credit_logs_rows: List[CreditLogRow],
+        operation_logs_rows: List[OperationLogRow],
+        database: str = ":memory:",
+    ) -> "SQLiteCreditAccountRepository":
+        repo = SQLiteCreditAccountRepository(database)
+        repo.import_rows(
+            credit_rows,
+            credit_logs_rows,
+            operation_logs_rows,
+            credit_account_rows=credit_account_rows,
+        )
+        return repo
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def import_rows(
+        self,
+        credit_rows: Iterable[CreditRow],
+        credit_logs_rows: Iterable[CreditLogRow],
+        operation_logs_rows: Iterable[OperationLogRow],
+        credit_account_rows: Iterable[CreditAccountRow] = (),
+    ) -> None:
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO credit_accounts VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        _to_blob(row.id),
+                        _to_blob(row.company_id),
+                        row.balance,
+                        row.created_at.isoformat(),
+                        row.updated_at.isoformat(),
+                        row.version,
+                    )
+                    for row in credit_account_rows
+                ],
+            )
+            self._write_rows(credit_rows, credit_logs_rows, operation_logs_rows)
+
+    def create_account(self, account: CreditAccount) -> None:
+        now = datetime.now()
+        row = CreditAccountRow(
+            created_at=now,
+            updated_at=now,
+            id=account.get_id(),
+            balance=account.get_balance(),
+            company_id=account.company_id,
+        )
+        with self._lock:
+            # replacing the row would reset the version other copies compare to
+            if self._connection.execute(
+                "SELECT 1 FROM credit_accounts WHERE company_id = ?",
+                (_to_blob(account.company_id),),
+            ).fetchone():
+                raise ValueError(
+                    f"CreditAccount {account.get_id()} was already created"
+                )
+            self.import_rows([], [], [], credit_account_rows=[row])
+
+    def load_account_by_company_id(self, company_id: UUID) -> Optional[CreditAccount]:
+        with self._lock:
+            account_row = self._connection.execute(
+                "SELECT id, version FROM credit_accounts WHERE company_id = ?",
+                (_to_blob(company_id),),
+            ).fetchone()
+            if not account_row:
+                return None
+            account = self._restore_account(UUID(bytes=account_row[0]), company_id)
+            account.version = account_row[1]
+            # the new archive is a write, so copies loaded before it become stale
+            if self.compact_on_load and account.compact():
+                self._flush(
+                    "compact", account, [], lambda use: True, create_credits=False
+                )
+        return account
+
+    def load_accounts_by_company_ids(
+        self, company_ids: Iterable[UUID]
+    ) -> Dict[UUID, CreditAccount]:
+        accounts: Dict[UUID, CreditAccount] = {}
+        for company_id in company_ids:
+            if company_id in accounts:
+                continue
+            account = self.load_account_by_company_id(company_id)
+            if account:
+                accounts[company_id] = account
+        return accounts
+
+    def _restore_account(self, account_id: UUID, company_id: UUID) -> CreditAccount:
+        archived_periods = [
+            _load_archived_period(row)
+            for row in self._connection.execute(
+                LOAD_ARCHIVED_PERIODS_QUERY, (account_id.bytes,)
+            )
+        ]
+        credits, rows = self._restore_credits(
+            account_id, UNARCHIVED_CREDITS, [account_id.bytes]
+        )
+        account = CreditAccount.restore(
+            company_id=company_id,
+            reference_date=date.today(),
+            credit_state_list=credits,
+            archived_periods=archived_periods,
+            archive_loader=functools.partial(self._load_archived_credits, account_id),
+        )
+        if instrumentation.enabled:
+            instrumentation.record(
+                f"{type(self).__name__}.load_account_by_company_id",
+                "rows_touched",
+                1 + len(archived_periods) + rows,
+            )
+        return account
+
+    def _load_archived_credits(
+        self, account_id: UUID, credit_ids: List[UUID]
+    ) -> List[CreditTransaction]:
+        placeholders = ", ".join("?" for _ in credit_ids)
+        with self._lock:
+            credits, _ = self._restore_credits(
+                account_id,
+                f"IN ({placeholders})",
+                [credit_id.bytes for credit_id in credit_ids],
+            )
+        return credits
+
+    def _restore_credits(
+        self, account_id: UUID, credits_filter: str, parameters: List[Any]
+    ) -> Tuple[List[CreditTransaction], int]:
+        """Replays the credits of the account whose id passes ``credits_filter``."""
+        contract_service_creation_date = self.contracted_service_creation_date
+        snapshots = {
+            snapshot.credit_id: snapshot
+            for snapshot in map(
+                _load_snapshot,
+                self._connection.execute(
+                    LOAD_SNAPSHOTS_QUERY.format(credits=credits_filter),
+                    [account_id.bytes, *parameters],
+                ),
+            )
+        }
+        credits: Dict[UUID, CreditTransaction] = {}
+        rows = len(snapshots)
+        for row in self._connection.execute(
+            LOAD_CREDITS_QUERY.format(credits=credits_filter),
+            [account_id.bytes, *parameters],
+        ):
+            rows += 1
+            credit_id = UUID(bytes=row[0])
+            credit_state = credits.get(credit_id)
+            if not credit_state:
+                credit_state = CreditTransaction(
+                    creation_date=_to_date(row[7]),
+                    account_id=account_id,
+                    type=row[5],
+                    contract_service_id=_to_uuid(row[6]),
+                    id=credit_id,
+                    contract_service_creation_date=contract_service_creation_date,
+                    columnar_storage=self.columnar_storage,
+                )
+                credits[credit_id] = credit_state
+                if credit_id in snapshots:
+                    credit_state.restore_snapshot(snapshots[credit_id])
+            if row[9] is None or row[14] is None:
+                continue
+            clog = CreditLogRow(
+                created_at=_to_date(row[12]),
+                updated_at=_to_date(row[13]),
+                credit_moviment=row[11],
+                account_id=account_id,
+                credit_id=credit_id,
+                operation_id=UUID(bytes=row[10]),
+                id=UUID(bytes=row[9]),
+            )
+            olog = OperationLogRow(
+                created_at=_to_date(row[20]),
+                updated_at=_to_date(row[21]),
+                owner_id=UUID(bytes=row[14]),
+                description=row[15],
+                total_movement=row[16],
+                operation=row[17],
+                account_id=account_id,
+                id=clog.operation_id,
+                object_type=row[18],
+                object_id=row[19],
+            )
+            credit_state.register_movement(restore_movement(clog, olog))
+        for credit_state in credits.values():
+            credit_state.mark_all_as_persisted()
+        return list(credits.values()), rows
+
+    def iter_operation_logs(
+        self,
+        account_id: Optional[UUID] = None,
+        operation: Optional[str] = None,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+    ) -> Iterator[OperationLogRow]:
+        """Streams the operation log rows matching every given filter."""
+        where, parameters = self._log_filters("o", account_id, operation, start, end)
+        query = (
+            "SELECT o.id, o.account_id, o.owner_id, o.description, o.total_movement, "
+            "o.operation, o.object_type, o.object_id, o.created_at, o.updated_at "
+            f"FROM operation_logs AS o {where}"
+        )
+        for row in self._stream(query, parameters):
+            yield OperationLogRow(
+                created_at=_to_date(row[8]),
+                updated_at=_to_date(row[9]),
+                owner_id=UUID(bytes=row[2]),
+                description=row[3],
+                total_movement=row[4],
+                operation=row[5],
+                account_id=UUID(bytes=row[1]),
+                id=UUID(bytes=row[0]),
+                object_type=row[6],
+                object_id=row[7],
+            )
+
+    def iter_credit_logs(
+        self,
+        account_id: Optional[UUID] = None,
+        operation: Optional[str] = None,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+    ) -> Iterator[CreditLogRow]:
+        """Streams the credit log rows matching every given filter.
+
+        ``operation`` is matched against the operation log of each row.
+        """
+        where, parameters = self._log_filters("l", account_id, operation, start, end)
+        query = (
+            "SELECT l.id, l.account_id, l.credit_id, l.operation_id, "
+            "l.credit_moviment, l.created_at, l.updated_at "
+            "FROM credit_logs AS l "
+            "JOIN operation_logs AS o ON o.id = l.operation_id "
+            f"{where} ORDER BY l.seq"
+        )
+        for row in self._stream(query, parameters):
+            yield CreditLogRow(
+                created_at=_to_date(row[5]),
+                updated_at=_to_date(row[6]),
+                credit_moviment=row[4],
+                account_id=UUID(bytes=row[1]),
+                credit_id=UUID(bytes=row[2]),
+                operation_id=UUID(bytes=row[3]),
+                id=UUID(bytes=row[0]),
+            )
+
+    def _stream(self, query: str, parameters: List[Any]) -> Iterator[Tuple[Any, ...]]:
+        with self._lock:
+            cursor = self._connection.execute(query, parameters)
+        while True:
+            with self._lock:
+                rows = cursor.fetchmany(STREAM_CHUNK_SIZE)
+            if not rows:
+                return
+            yield from rows
+
+    @staticmethod
+    def _log_filters(
+        table: str,
+        account_id: Optional[UUID],
+        operation: Optional[str],
+        start: Optional[date],
+        end: Optional[date],
+    ) -> Tuple[str, List[Any]]:
+        conditions: List[str] = []
+        parameters: List[Any] = []
+        if account_id:
+            conditions.append(f"{table}.account_id = ?")
+            parameters.append(account_id.bytes)
+        if operation:
+            conditions.append("o.operation = ?")
+            parameters.append(operation.upper())
+        # plain comparisons keep the (account_id, created_at) indexes usable
+        if start:
+            conditions.append(f"{table}.created_at >= ?")
+            parameters.append(_to_date_bound(start))
+        if end:
+            conditions.append(f"{table}.created_at < ?")
+            parameters.append(_to_date_bound(end))
+        if not conditions:
+            return "", parameters
+        return "WHERE " + " AND ".join(conditions), parameters
+
+    def add_credits(self, account: CreditAccount) -> None:
+        new_credits = [
+            credit for credit in account.get_pending_transactions() if not credit.id
+        ]
+        self._flush(
+            "add_credits",
+            account,
+            new_credits,
+            lambda use: True,
+            create_credits=True,
+        )
+
+    def consume_credits(self, account: CreditAccount) -> None:
+        self._flush_operation("consume_credits", account, "CONSUME")
+
+    def expire(self, account: CreditAccount) -> None:
+        self._flush_operation("expire", account, "EXPIRE")
+
+    def save(self, account: CreditAccount) -> None:
+        self._flush(
+            "save",
+            account,
+            account.get_pending_transactions(),
+            lambda use: True,
+            create_credits=True,
+        )
+
+    def _flush_operation(
+        self, method_name: str, account: CreditAccount, operation_type: str
+    ) -> None:
+        persisted_credits = [
+            credit for credit in account.get_pending_transactions() if credit.id
+        ]
+        self._flush(
+            method_name,
+            account,
+            persisted_credits,
+            lambda use: use.operation_type == operation_type,
+            create_credits=False,
+        )
+
+    def _flush(
+        self,
+        method_name: str,
+        account: CreditAccount,
+        credits: List[CreditTransaction],
+        should_persist: Callable[[Any], bool],
+        create_credits: bool,
+    ) -> None:
+        now = account._reference_date
+        credit_rows: List[CreditRow] = []
+        credit_logs_rows: List[CreditLogRow] = []
+        operation_logs_rows: List[OperationLogRow] = []
+        persisted = [
+            (
+                credit,
+                [use for use in credit.get_pending_movements() if should_persist(use)],
+            )
+            for credit in credits
+        ]
+        # credits with nothing to write keep their pending movements untouched
+        persisted = [
+            (credit, movements)
+            for credit, movements in persisted
+            if movements or (create_credits and not credit.id)
+        ]
+        unassigned_ids = _list_unassigned_ids(persisted)
+        try:
+            with self._lock, self._connection:
+                version = self._compare_and_swap(account)
+                # building the rows gives ids to new credits and movements
+                for credit, movements in persisted:
+                    if create_credits and not credit.id:
+                        credit_rows.append(make_credit_row(account, credit, now))
+                    for use in movements:
+                        credit_log, operation_log = make_movement_rows(
+                            account, credit, use, now
+                        )
+                        credit_logs_rows.append(credit_log)
+                        operation_logs_rows.append(operation_log)
+                self._write_rows(credit_rows, credit_logs_rows, operation_logs_rows)
+                archive_rows = self._write_archive(account)
+        except BaseException:
+            # nothing was written, so a retry must write them as new again
+            for owner, id_field in unassigned_ids:
+                setattr(owner, id_field, None)
+            raise
+        if version is not None:
+            account.version = version
+        for credit, movements in persisted:
+            credit.mark_as_persisted(*movements)
+        account.mark_archive_as_persisted()
+        if instrumentation.enabled:
+            instrumentation.record(
+                f"{type(self).__name__}.{method_name}",
+                "rows_touched",
+                len(credit_rows)
+                + len(credit_logs_rows)
+                + len(operation_logs_rows)
+                + archive_rows,
+            )
+        if self.snapshot_every:
+            with self._lock, self._connection:
+                for credit, _ in persisted:
+                    self._take_snapshot(credit, self.snapshot_every)
+
+    def take_snapshots(self, company_id: UUID) -> int:
+        """Snapshots every credit of the account now; returns how many were taken."""
+        account = self.load_account_by_company_id(company_id)
+        if not account:
+            return 0
+        with self._lock, self._connection:
+            return sum(
+                self._take_snapshot(credit) for credit in account._credit_state_list
+            )
+
+    def _take_snapshot(self, credit: CreditTransaction, every: int = 1) -> bool:
+        if not credit.id or credit.get_pending_movements():
+            return False
+        logs, last_log_seq = self._connection.execute(
+            "SELECT COUNT(*), MAX(seq) FROM credit_logs "
+            "WHERE account_id = ? AND credit_id = ?",
+            (_to_blob(credit.account_id), _to_blob(credit.id)),
+        ).fetchone()
+        covered = self._connection.execute(
+            "SELECT movements FROM credit_snapshots WHERE credit_id = ?",
+            (_to_blob(credit.id),),
+        ).fetchone()
+        if not logs or logs - (covered[0] if covered else 0) < every:
+            return False
+        snapshot = credit.take_snapshot()
+        # a credit with log rows that were not replayed can't be summarized
+        if snapshot.movements != logs:
+            return False
+        self._connection.execute(
+            "INSERT OR REPLACE INTO credit_snapshots VALUES "
+            "(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                _to_blob(credit.id),
+                _to_blob(credit.account_id),
+                last_log_seq,
+                snapshot.movements,
+                snapshot.remaining_value,
+                snapshot.consumed_value,
+                snapshot.refunded_value,
+                snapshot.expired_value,
+                snapshot.granted_value,
+                snapshot.expired,
+                snapshot.expiration_date.isoformat(),
+                _dump_snapshot_state(snapshot),
+            ),
+        )
+        return True
+
+    def _compare_and_swap(self, account: CreditAccount) -> Optional[int]:
+        company_id = _to_blob(account.company_id)
+        updated = self._connection.execute(
+            "UPDATE credit_accounts SET version = version + 1 "
+            "WHERE company_id = ? AND version = ?",
+            (company_id, account.version),
+        )
+        if updated.rowcount:
+            return account.version + 1
+        exists = self._connection.execute(
+            "SELECT 1 FROM credit_accounts WHERE company_id = ?", (company_id,)
+        ).fetchone()
+        if exists:
+            raise StaleAccountError(
+                f"CreditAccount {account.get_id()} was changed since it was loaded"
+            )
+        return None
+
+    def _write_archive(self, account: CreditAccount) -> int:
+        """Replaces the stored archive of the account when it changed."""
+        if not account.has_pending_archive():
+            return 0
+        account_id = _to_blob(account.get_id())
+        periods = account.get_archived_periods()
+        for table in ("archived_credit_periods", "archived_credits"):
+            self._connection.execute(
+                f"DELETE FROM {table} WHERE account_id = ?", (account_id,)
+            )
+        self._connection.executemany(
+            "INSERT INTO archived_credit_periods VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    account_id,
+                    period.period.isoformat(),
+                    period.remaining_value,
+                    period.consumed_value,
+                    period.refunded_value,
+                    period.expired_value,
+                    _dump_archived_period_state(period),
+                )
+                for period in periods
+            ],
+        )
+        self._connection.executemany(
+            "INSERT INTO archived_credits VALUES (?, ?)",
+            [
+                (credit_id.bytes, account_id)
+                for period in periods
+                for credit_id in period.credit_ids
+            ],
+        )
+        return len(periods) + sum(len(period) for period in periods)
+
+    def _write_rows(
+        self,
+        credit_rows: Iterable[CreditRow],
+        credit_logs_rows: Iterable[CreditLogRow],
+        operation_logs_rows: Iterable[OperationLogRow],
+    ) -> None:
+        self._connection.executemany(
+            "INSERT INTO credits ("
+            "id, account_id, initial_value, consumed_value, expiration_date, type, "
+            "contracted_service_id, created_at, updated_at"
+            ") VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (id) DO UPDATE SET "
+            "initial_value = excluded.initial_value, "
+            "consumed_value = excluded.consumed_value, "
+            "updated_at = excluded.updated_at",
+            [
+                (
+                    _to_blob(row.id),
+                    _to_blob(row.account_id),
+                    row.initial_value,
+                    row.consumed_value,
+                    row.expiration_date.isoformat(),
+                    row.type,
+                    _to_blob(row.contracted_service_id),
+                    row.created_at.isoformat(),
+                    row.updated_at.isoformat(),
+                )
+                for row in credit_rows
+            ],
+        )
+        self._connection.executemany(
+            "INSERT INTO credit_logs ("
+            "id, account_id, credit_id, operation_id, credit_moviment, "
+            "created_at, updated_at"
+            ") VALUES (?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (id) DO UPDATE SET "
+            "credit_moviment = excluded.credit_moviment, "
+            "updated_at = excluded.updated_at",
+            [
+                (
+                    _to_blob(row.id),
+                    _to_blob(row.account_id),
+                    _to_blob(row.credit_id),
+                    _to_blob(row.operation_id),
+                    row.credit_moviment,
+                    row.created_at.isoformat(),
+                    row.updated_at.isoformat(),
+                )
+                for row in credit_logs_rows
+            ],
+        )
+        self._connection.executemany(
+            "INSERT OR REPLACE INTO operation_logs VALUES "
+            "(?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    _to_blob(row.id),
+                    _to_blob(row.account_id),
+                    _to_blob(row.owner_id),
+                    row.description,
+                    row.total_movement,
+                    row.operation,
+                    row.object_type,
+                    row.object_id,
+                    row.created_at.isoformat(),
+                    row.updated_at.isoformat(),
+                )
+                for row in operation_logs_rows
+            ],
+        )
+
+
+instrumentation.instrument(
+    SQLiteCreditAccountRepository,
+    "load_account_by_company_id",
+    "add_credits",
+    "consume_credits",
+    "expire",
+    "save",
+)
@@ -0,0 +1,67 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import List
+from unittest import TestCase
+from uuid import UUID, uuid1
+
+from credits_account.infra.repository.async_credit_account_repository import (
+    AsyncCreditAccountRepository,
+    AsyncInMemoryCreditAccountRepository,
+    ThreadPoolCreditAccountRepository,
+)
+from credits_account.infra.repository.sqlite_credit_account_repository import (
+    SQLiteCreditAccountRepository,
+)
+from credits_account.tests.test_in_memory_repository import (
+    get_repository_with_accounts,
+)
+
+now = date(2022, 9, 1)
+
+
+async def consume_everything(
+    sut: AsyncCreditAccountRepository, company_ids: List[UUID]
+) -> List[int]:
+    accounts = await asyncio.gather(
+        *(sut.load_account_by_company_id(company_id) for company_id in company_ids)
+    )
+    for account in accounts:
+        account._reference_date = now
+        account.consume(account.get_balance(), "Você consumiu créditos")
+    await asyncio.gather(*(sut.consume_credits(account) for account in accounts))
+    reloaded = await sut.load_accounts_by_company_ids([*company_ids, uuid1()])
+    balances = []
+    for account in reloaded.values():
+        account._reference_date = now
+        balances.append(account.get_balance())
+    return balances
+
+
+class TestAsyncCreditAccountRepository(TestCase):
+    def test_in_memory_repository_supports_concurrent_calls(self) -> None:
+        repository = get_repository_with_accounts([1, 2, 3])
+        sut = AsyncInMemoryCreditAccountRepository(repository)
+        result = asyncio.run(consume_everything(sut, [*repository.credit_account_rows]))
+        assert result == [0, 0, 0]
+
+    def test_thread_pool_adapter_runs_the_sync_repository(self) -> None:
+        repository = get_repository_with_accounts([1, 2, 3])
+        sut = ThreadPoolCreditAccountRepository(repository)
+        result = asyncio.run(consume_everything(sut, [*repository.credit_account_rows]))
+        assert result == [0, 0, 0]
+
+    def test_thread_pool_adapter_runs_the_sqlite_repository(self) -> None:
+        repository = get_repository_with_accounts([1, 2, 3])
+        sqlite_repository = SQLiteCreditAccountRepository.populate(
+            list(repository.credit_account_rows.values()),
+            list(repository.credit_rows.values()),
+            list(repository.credit_logs_rows.values()),
+            list(repository.operation_logs_rows.values()),
+        )
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            sut = ThreadPoolCreditAccountRepository(sqlite_repository, executor)
+            result = asyncio.run(
+                consume_everything(sut, [*repository.credit_account_rows])
+            )
+        assert result == [0, 0, 0]
@@ -0,0 +1,40 @@
+import os
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+
+from credits_account.benchmarks import credit_benchmarks
+from credits_account.benchmarks.synthetic_accounts import (
+    SyntheticAccountGenerator,
+    SyntheticAccountSpec,
+)
+
+
+class TestBenchmarks(TestCase):
+    def test_generator_is_deterministic(self) -> None:
+        spec = SyntheticAccountSpec(transactions=6, movements_per_transaction=4)
+        first, second = (SyntheticAccountGenerator(spec) for _ in range(2))
+        account = first.make_account(1)
+        assert account.company_id == second.make_account(1).company_id
+        assert account.company_id != first.make_account(2).company_id
+        assert account.get_balance() == second.make_account(1).get_balance()
+        assert sum(t.count_movements("CONSUME") for t in account._transactions) == 18
+        repository, (company_id,) = first.make_repository(1)
+        loaded_account = repository.load_account_by_company_id(company_id)
+        loaded_account._reference_date = spec.reference_date
+        assert loaded_account.get_balance() == first.make_account().get_balance()
+
+    def test_results_are_written_and_compared(self) -> None:
+        tiny = SyntheticAccountSpec(transactions=3, movements_per_transaction=3)
+        with patch.dict(credit_benchmarks.TIERS, {"tiny": tiny}):
+            results = credit_benchmarks.run_benchmarks(["tiny"], repeat=2, number=2)
+        assert len(results) == 8
+        assert all(result.min <= result.median for result in results)
+        assert all(result.number == 2 for result in results)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "results.json")
+            credit_benchmarks.write_results(results, path)
+            loaded_results = credit_benchmarks.load_results(path)
+        assert loaded_results == results
+        comparisons = credit_benchmarks.compare_results(results, loaded_results[:2])
+        assert [comparison.ratio for comparison in comparisons] == [1.0, 1.0]
@@ -0,0 +1,73 @@
+from datetime import date
+from unittest import TestCase
+from uuid import uuid1
+
+from credits_account.infra.repository.cached_credit_account_repository import (
+    CachedCreditAccountRepository,
+)
+from credits_account.tests.test_in_memory_repository import (
+    get_repository_with_accounts,
+)
+
+now = date(2022, 9, 1)
+
+
+class TestCachedCreditAccountRepository(TestCase):
+    def test_loads_hand_out_copies_and_writes_invalidate(self) -> None:
+        repository = get_repository_with_accounts([10])
+        company_id = next(iter(repository.credit_account_rows))
+        sut = CachedCreditAccountRepository(repository)
+        account = sut.load_account_by_company_id(company_id)
+        account._reference_date = now
+        account.consume(4, "Você consumiu créditos")
+        cached_account = sut.load_account_by_company_id(company_id)
+        cached_account._reference_date = now
+        assert cached_account.get_balance() == 10
+        assert (sut.hits, sut.misses) == (1, 1)
+        sut.consume_credits(account)
+        assert len(sut) == 0
+        recovered_account = sut.load_account_by_company_id(company_id)
+        recovered_account._reference_date = now
+        assert recovered_account.get_balance() == 6
+        assert recovered_account.version == 2
+        assert (sut.hits, sut.misses) == (1, 2)
+
+    def test_evicts_least_recently_used_and_expired_accounts(self) -> None:
+        repository = get_repository_with_accounts([10, 10, 10])
+        company_ids = list(repository.credit_account_rows)
+        clock = [0.0]
+        sut = CachedCreditAccountRepository(
+            repository, max_size=2, ttl=10, clock=lambda: clock[0]
+        )
+        sut.load_accounts_by_company_ids(company_ids[:2])
+        sut.load_account_by_company_id(company_ids[0])
+        sut.load_account_by_company_id(company_ids[2])
+        assert sut.evictions == 1
+        assert company_ids[1] not in sut._accounts
+        clock[0] = 10
+        assert sut.load_account_by_company_id(company_ids[0])
+        assert (sut.hits, sut.misses, sut.evictions) == (1, 4, 2)
+        assert sut.load_account_by_company_id(uuid1()) is None
+        assert len(sut) == 2
+
+    def test_cache_hits_can_be_written_and_refunded(self) -> None:
+        repository = get_repository_with_accounts([10])
+        company_id = next(iter(repository.credit_account_rows))
+        account = repository.load_account_by_company_id(company_id)
+        account._reference_date = now
+        account.consume(3, "Você consumiu créditos", object_type="a", object_id="1")
+        repository.consume_credits(account)
+        sut = CachedCreditAccountRepository(repository)
+        sut.load_account_by_company_id(company_id)
+        cached_account = sut.load_account_by_company_id(company_id)
+        cached_account._reference_date = now
+        assert sut.hits == 1
+        assert len(cached_account._credit_state_list[0]._usage_list) == 0
+        assert cached_account.refund("a", "1")
+        cached_account.consume(5, "Você consumiu créditos")
+        sut.save(cached_account)
+        recovered_account = sut.load_account_by_company_id(company_id)
+        recovered_account._reference_date = now
+        assert recovered_account.get_balance() == 5
+        assert recovered_account.is_refunded("a", "1")
+        assert len(recovered_account._credit_state_list[0]._usage_list) == 4
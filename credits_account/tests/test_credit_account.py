@@ -2,7 +2,7 @@ import uuid
 from datetime import date
 from unittest import TestCase
 
-from credits_account.domain.entities import CreditTransaction
+from credits_account.domain.entities import ConsumeRequest, CreditTransaction
 from credits_account.domain.entities.credit_account import CreditAccount
 from credits_account.domain.entities.credit_movement.add_movement import (
     AddCreditMovement,
@@ -167,3 +167,105 @@ class TestCreditAccount(TestCase):
         sut._reference_date = date(2022, 11, 1)
         sut.renew()
         assert sut.get_balance() == 5
+
+    def test_refund_only_touches_transactions_consumed_by_the_object(self) -> None:
+        sut = CreditAccount(
+            company_id=company_id,
+            credit_state_list=[],
+            reference_date=date(2022, 10, 1),
+        )
+        sut.add(5, "Você adicionou créditos", "subscription")
+        sut.add(5, "Você adicionou créditos", "subscription")
+        sut.consume(3, "Você consumiu créditos", object_type="booking", object_id="1")
+        sut.consume(4, "Você consumiu créditos", object_type="booking", object_id="2")
+        assert sut.get_balance() == 3
+        assert not sut.is_refunded("booking", "1")
+        assert not sut.refund("booking", "3")
+        assert sut.refund("booking", "1")
+        assert sut.is_refunded("booking", "1")
+        assert not sut.is_refunded("booking", "2")
+        assert sut.get_balance() == 6
+        assert not sut.refund("booking", "1")
+        assert sut.get_balance() == 6
+
+    def test_consume_many_reports_each_request_and_skips_the_failed_ones(
+        self,
+    ) -> None:
+        sut = CreditAccount(
+            company_id=company_id,
+            credit_state_list=[],
+            reference_date=date(2022, 10, 1),
+        )
+        sut.add(5, "Você adicionou créditos", "subscription")
+        sut.add(5, "Você adicionou créditos", "subscription")
+        results = sut.consume_many(
+            [
+                ConsumeRequest(4, "Você consumiu créditos", object_id="1"),
+                ConsumeRequest(7, "Você consumiu créditos", object_id="2"),
+                ConsumeRequest(0, "Você consumiu créditos", object_id="3"),
+                ConsumeRequest(6, "Você consumiu créditos", object_id="4"),
+            ]
+        )
+        assert [result.consumed for result in results] == [True, False, False, True]
+        assert results[1].error
+        assert sut.get_balance() == 0
+        assert sum(len(t.get_consumed_movements()) for t in sut._transactions) == 3
+
+    def test_consume_skips_credits_expired_at_the_consume_date(self) -> None:
+        expired_credit = CreditTransaction(
+            creation_date=date(2022, 9, 1),
+            account_id=company_id,
+            type="subscription",
+        )
+        expired_credit.register_movement(
+            AddCreditMovement(5, "Você adicionou créditos")
+        )
+        sut = CreditAccount(
+            company_id=company_id,
+            credit_state_list=[expired_credit],
+            reference_date=date(2022, 10, 1),
+        )
+        sut.add(5, "Você adicionou créditos", "subscription")
+        sut.consume(5, "Você consumiu créditos")
+        assert sut.get_balance() == 0
+        assert expired_credit.get_consumed_movements() == []
+        with self.assertRaises(ValueError):
+            sut.consume(1, "Você consumiu créditos")
+
+    def test_compact_archives_expired_credits_and_keeps_them_refundable(
+        self,
+    ) -> None:
+        sut = CreditAccount(
+            company_id=company_id,
+            credit_state_list=[],
+            reference_date=date(2022, 9, 1),
+        )
+        sut.add(10, "Você adicionou créditos", "subscription")
+        sut.consume(4, "Você consumiu créditos", object_type="a", object_id="1")
+        sut.consume(2, "Você consumiu créditos", object_type="a", object_id="2")
+        sut.refund("a", "2")
+        sut._reference_date = date(2022, 10, 1)
+        sut.expire()
+        sut.renew()
+        assert sut.compact() == 0
+        sut.mark_as_persisted()
+        assert sut.compact() == 0
+        for credit in sut._credit_state_list:
+            credit.id = uuid.uuid1()
+        balance, expired = sut.get_balance(), sut.count_expired()
+        assert sut.compact() == 1
+        assert len(sut._credit_state_list) == 1
+        assert (sut.get_balance(), sut.count_expired()) == (balance, expired)
+        (period,) = sut.get_archived_periods()
+        assert period.period == date(2022, 10, 1)
+        assert (period.consumed_value, period.expired_value) == (-6, -6)
+        assert sut.has_pending_archive()
+        sut.mark_archive_as_persisted()
+        assert sut.is_refunded("a", "2")
+        assert not sut.refund("a", "2")
+        assert sut.refund("a", "1")
+        assert sut.get_archived_periods() == []
+        assert sut.has_pending_archive()
+        assert len(sut._credit_state_list) == 2
+        assert sut.count_expired() == expired + 4
+        assert sut.get_balance() == balance == 10
@@ -0,0 +1,96 @@
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Any, List, Optional
+from unittest import TestCase
+from uuid import UUID, uuid1
+
+from credits_account.domain.credit_account_history import (
+    CreditAccountHistory,
+    HistoryPage,
+)
+from credits_account.domain.entities import CreditTransaction
+
+
+@dataclass
+class Operation:
+    type: str
+    id: Optional[UUID] = field(default_factory=uuid1)
+    credits: List[Any] = field(default_factory=list)
+    created_at: datetime = datetime(2022, 9, 1)
+
+
+def make_credit() -> CreditTransaction:
+    return CreditTransaction(
+        creation_date=date(2022, 9, 1),
+        account_id=uuid1(),
+        type="subscription",
+        id=uuid1(),
+    )
+
+
+class TestCreditAccountHistory(TestCase):
+    def test_membership_and_lookups_use_the_indexes(self) -> None:
+        credit = make_credit()
+        add = Operation("add", credits=[credit])
+        consume = Operation("consume", credits=[credit])
+        sut = CreditAccountHistory()
+        sut.register_operation(add, consume)
+        assert add in sut and consume in sut and credit in sut
+        assert Operation("add", id=add.id, credits=[credit]) in sut
+        assert Operation("add", id=add.id) not in sut
+        assert Operation("add") not in sut
+        assert make_credit() not in sut
+        assert sut.get_operation(consume.id) is consume
+        assert sut.get_credit(credit.id) is credit
+        assert sut.get_operation(uuid1()) is None
+        assert list(sut) == [add, consume]
+
+    def test_members_without_id_are_matched_by_equality(self) -> None:
+        add = Operation("add", id=None)
+        sut = CreditAccountHistory()
+        sut.register_operation(add)
+        assert Operation("add", id=None) in sut
+        assert Operation("consume", id=None) not in sut
+        assert Operation("add") not in sut
+
+    def test_typed_queries_are_read_only_views(self) -> None:
+        sut = CreditAccountHistory()
+        sut.register_operation(Operation("ADD"))
+        operations = sut.get_operations("add")
+        sut.register_operation(Operation("add"))
+        assert len(operations) == 2
+        assert not hasattr(operations, "append")
+        assert sut.get_operations("refund") == []
+        assert sut.list_operation_types() == ("ADD",)
+
+    def test_time_range_queries_page_with_a_cursor(self) -> None:
+        sut = CreditAccountHistory()
+        first_day = datetime(2022, 9, 1)
+        operations = [
+            Operation(
+                "consume" if day % 3 else "add",
+                created_at=first_day + timedelta(days=day // 2),
+            )
+            for day in range(20)
+        ]
+        sut.register_operation(*operations[::-1])
+        by_time = sorted(
+            operations[::-1], key=lambda operation: operation.created_at
+        )
+        assert sut.query(limit=100).operations == by_time
+
+        start, end = first_day + timedelta(days=2), first_day + timedelta(days=7)
+        pages = [sut.query(start, end, limit=3)]
+        while pages[-1].next_cursor:
+            pages.append(sut.query(start, end, limit=3, cursor=pages[-1].next_cursor))
+        assert [len(page.operations) for page in pages] == [3, 3, 3, 1]
+        assert [o for page in pages for o in page.operations] == [
+            o for o in by_time if start <= o.created_at < end
+        ]
+
+        adds = sut.query(start, operation_type="add", limit=2)
+        assert all(operation.type == "add" for operation in adds.operations)
+        rest = sut.query(start, operation_type="ADD", cursor=adds.next_cursor)
+        assert len(adds.operations) + len(rest.operations) == 5
+        assert rest.next_cursor is None
+        assert sut.query(operation_type="refund") == HistoryPage()
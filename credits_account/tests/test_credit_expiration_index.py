@@ -0,0 +1,88 @@
+import random
+from datetime import date, timedelta
+from unittest import TestCase
+from unittest.mock import patch
+from uuid import uuid1
+
+from credits_account.domain.credit_expiration_index import CreditExpirationIndex
+from credits_account.domain.entities import CreditTransaction
+from credits_account.domain.entities.credit_movement import AddCreditMovement
+
+account_id = uuid1()
+
+
+def make_transaction(creation_date: date, value: int) -> CreditTransaction:
+    transaction = CreditTransaction(
+        creation_date=creation_date,
+        account_id=account_id,
+        type="subscription",
+    )
+    transaction.register_movement(AddCreditMovement(value, "Você adicionou créditos"))
+    return transaction
+
+
+class TestCreditExpirationIndex(TestCase):
+    def test_matches_a_full_scan_for_any_reference_date(self) -> None:
+        rnd = random.Random(7)
+        first_day = date(2022, 1, 1)
+        transactions = [
+            make_transaction(
+                first_day + timedelta(days=rnd.randrange(365)), rnd.randrange(1, 50)
+            )
+            for _ in range(40)
+        ]
+        sut = CreditExpirationIndex(transactions[:20])
+        for transaction in transactions[20:]:
+            sut.add(transaction)
+        for transaction in transactions[::3]:
+            transaction.consume(1, ignore_is_expired_check=True)
+            sut.update(transaction)
+        for transaction in transactions[::7]:
+            transaction.expire(transaction.get_expiration_date())
+            sut.update(transaction)
+        for offset in range(0, 420, 5):
+            at = first_day + timedelta(days=offset)
+            balance = sum(
+                t.get_remaining_value() for t in transactions if not t.is_expired(at)
+            )
+            expired = sum(
+                t.get_remaining_value() for t in transactions if t.is_expired(at)
+            )
+            assert sut.get_balance(at) == balance
+            assert sut.get_expired_value(at) == expired
+            expiring = sut.get_expiring_until(at)
+            assert {id(t) for t in expiring} == {
+                id(t) for t in transactions if t.get_expiration_date() <= at
+            }
+            expiration_dates = [t.get_expiration_date() for t in expiring]
+            assert expiration_dates == sorted(expiration_dates)
+
+    def test_out_of_order_inserts_rebuild_the_tree_once(self) -> None:
+        first_day = date(2022, 1, 1)
+        transactions = [
+            make_transaction(first_day + timedelta(days=offset), 1)
+            for offset in range(300, 0, -1)
+        ]
+        with patch.object(
+            CreditExpirationIndex,
+            "_add_to_tree",
+            side_effect=AssertionError("the tree is built in one pass"),
+        ):
+            sut = CreditExpirationIndex(transactions[:200])
+        with patch.object(
+            CreditExpirationIndex,
+            "_rebuild",
+            autospec=True,
+            side_effect=CreditExpirationIndex._rebuild,
+        ) as rebuild:
+            for transaction in transactions[200:]:
+                sut.add(transaction)
+            at = first_day + timedelta(days=100)
+            assert sut.get_balance(at) == sum(
+                not t.is_expired(at) for t in transactions
+            )
+            assert sut.get_expired_value(at) == sum(
+                t.is_expired(at) for t in transactions
+            )
+        assert rebuild.call_count == 1
+        assert len(sut) == 300
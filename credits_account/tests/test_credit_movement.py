@@ -0,0 +1,33 @@
+from unittest import TestCase
+
+from credits_account.domain.credit_operations_enum import (
+    OperationCode,
+    OperationCreditsEnum,
+)
+from credits_account.domain.entities.credit_movement import (
+    AddCreditMovement,
+    ConsumeCreditMovement,
+    CreditMovementFactory,
+)
+
+
+class TestCreditMovement(TestCase):
+    def test_movements_are_slotted_and_keep_the_arithmetic_protocol(self) -> None:
+        add = AddCreditMovement(10, "Você adicionou créditos")
+        consume = ConsumeCreditMovement(4, 4, "Você consumiu créditos")
+        consume.set_movement_origin("booking", "1")
+        assert not hasattr(add, "__dict__")
+        assert not hasattr(consume, "__dict__")
+        assert sum([add, consume]) == 6
+        assert int(consume) == -4
+        assert add - 3 == 7
+        assert (consume.object_type, consume.object_id) == ("booking", "1")
+
+    def test_operation_codes_follow_operation_enum(self) -> None:
+        for operation in OperationCreditsEnum:
+            movement = CreditMovementFactory(1, operation.name, 1, "").make()
+            assert movement.operation_type == operation.name
+            assert movement.operation_code == operation.code
+            assert OperationCode.from_operation_type(operation.name).operation == (
+                operation
+            )
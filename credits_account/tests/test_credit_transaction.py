@@ -2,7 +2,9 @@ from datetime import date
 from unittest import TestCase
 from uuid import uuid1
 
+from credits_account.domain.credit_operations_enum import OperationCode
 from credits_account.domain.entities import CreditTransaction
+from credits_account.domain.entities.credit_movement import ColumnarMovementStore
 from credits_account.domain.entities.credit_movement.add_movement import (
     AddCreditMovement,
 )
@@ -56,3 +58,125 @@ class TestCreditTransaction(TestCase):
         sut.consume(10, reference_date=creation_date)
         assert sut.get_remaining_value() == 0
         # assert len(sut.get_consumed_movements()) == 1
+
+    def test_running_totals_follow_registered_movements(self) -> None:
+        creation_date = date(2022, 12, 28)
+        sut = CreditTransaction(
+            creation_date=creation_date,
+            type="subscription",
+            account_id=uuid1(),
+        )
+        sut.register_movement(AddCreditMovement(10, "Você adicionou créditos"))
+        sut.consume(4, reference_date=creation_date, object_type="a", object_id="1")
+        sut.consume(2, reference_date=creation_date, object_type="b", object_id="2")
+        sut.refund("a", "1")
+        assert sut.get_remaining_value() == sum(sut._usage_list) == 8
+        assert sut.get_consumed_value() == -6
+        assert sut.get_refunded_value() == 4
+        sut.expire(date(2023, 1, 28))
+        assert sut.get_expired_movement_value() == -8
+        assert sut.get_remaining_value() == sum(sut._usage_list) == 0
+
+    def test_movements_are_indexed_by_operation_type(self) -> None:
+        creation_date = date(2022, 12, 28)
+        sut = CreditTransaction(
+            creation_date=creation_date,
+            type="subscription",
+            account_id=uuid1(),
+        )
+        sut.register_movement(AddCreditMovement(10, "Você adicionou créditos"))
+        sut.consume(4, reference_date=creation_date)
+        sut.consume(2, reference_date=creation_date)
+        assert sut.count_movements("consume") == 2
+        assert sut.count_movements("ADD") == 1
+        assert sut.get_consumed_movements() == sut._usage_list[1:]
+        assert not sut.has_expired_operation()
+        sut.expire(date(2023, 1, 28))
+        assert sut.has_expired_operation()
+        assert sut.get_movements("expire") == [sut._usage_list[-1]]
+
+    def test_cached_expiration_date_follows_contract_service_creation_date(
+        self,
+    ) -> None:
+        sut = CreditTransaction(
+            creation_date=date(2022, 1, 15),
+            type="subscription",
+            account_id=uuid1(),
+        )
+        assert sut.get_expiration_date() == date(2022, 2, 15)
+        sut.contract_service_creation_date = date(2021, 12, 31)
+        assert sut.get_expiration_date() == date(2022, 2, 28)
+        sut.creation_date = date(2022, 2, 28)
+        assert sut.get_expiration_date() == date(2022, 3, 31)
+
+    def test_columnar_storage_matches_list_storage(self) -> None:
+        creation_date = date(2022, 12, 28)
+        transactions = [
+            CreditTransaction(
+                creation_date=creation_date,
+                type="subscription",
+                account_id=uuid1(),
+                columnar_storage=columnar_storage,
+            )
+            for columnar_storage in (False, True)
+        ]
+        for sut in transactions:
+            sut.register_movement(
+                AddCreditMovement(10, "Você adicionou créditos", uuid1(), uuid1())
+            )
+            sut.consume(
+                4, reference_date=creation_date, object_type="a", object_id="1"
+            )
+            sut.consume(2, reference_date=creation_date)
+            sut.refund("a", "1")
+            sut.expire(date(2023, 1, 28))
+        listed, columnar = transactions
+        pending = columnar.get_pending_movements()
+        for movement in pending:
+            movement.id = uuid1()
+        columnar.mark_all_as_persisted()
+        assert [m.id for m in columnar._usage_list] == [m.id for m in pending]
+        assert len(columnar._usage_list) == len(listed._usage_list) == 5
+        store = columnar._usage_list
+        assert isinstance(store, ColumnarMovementStore)
+        assert store.total() == listed.get_remaining_value() == 0
+        assert store.total(OperationCode.CONSUME) == listed.get_consumed_value() == -6
+        assert store.total(OperationCode.RENEW) == 0
+        assert columnar.get_consumed_value() == listed.get_consumed_value()
+        assert not columnar.can_refund("a", "1")
+        for listed_movement, columnar_movement in zip(
+            listed._usage_list, columnar._usage_list
+        ):
+            assert type(listed_movement) == type(columnar_movement)
+            assert listed_movement.credit_movement == columnar_movement.credit_movement
+            assert listed_movement.operation_log == columnar_movement.operation_log
+            assert getattr(listed_movement, "object_id", "") == getattr(
+                columnar_movement, "object_id", ""
+            )
+
+    def test_restored_snapshot_keeps_state_and_refunds(self) -> None:
+        creation_date = date(2022, 12, 28)
+        sut = CreditTransaction(
+            creation_date=creation_date, type="subscription", account_id=uuid1()
+        )
+        sut.add(10, "Você adicionou créditos")
+        sut.consume(4, reference_date=creation_date, object_type="a", object_id="1")
+        sut.consume(3, reference_date=creation_date, object_type="b", object_id="2")
+        sut.refund("b", "2")
+        restored = CreditTransaction(
+            creation_date=creation_date, type="subscription", account_id=uuid1()
+        )
+        restored.restore_snapshot(sut.take_snapshot())
+        assert restored.get_movements("CONSUME") == []
+        assert restored.count_movements("CONSUME") == 2
+        assert restored.get_remaining_value() == sut.get_remaining_value() == 6
+        assert restored.get_consumed_value() == -7
+        assert not restored.can_refund("b", "2")
+        assert restored.refund("a", "1")
+        assert restored.get_remaining_value() == 10
+        restored.expire(date(2023, 1, 28))
+        snapshot = restored.take_snapshot()
+        assert snapshot.movements == 6
+        assert snapshot.expired
+        assert snapshot.refunded_origins
+        assert restored.renew().get_remaining_value() == 10
@@ -0,0 +1,68 @@
+from datetime import date
+from unittest import TestCase
+
+from credits_account.infra.jobs.expire_and_renew_sweep import (
+    ExpireAndRenewSweep,
+    sweep_shard,
+)
+from credits_account.infra.repository.in_memory_credit_account_repository import (
+    StaleAccountError,
+)
+from credits_account.tests.test_in_memory_repository import (
+    get_repository_with_accounts,
+)
+
+created_at = date(2022, 9, 1)
+swept_at = date(2022, 10, 1)
+
+
+class TestExpireAndRenewSweep(TestCase):
+    def test_sweep_matches_a_sequential_run(self) -> None:
+        repository = get_repository_with_accounts(
+            [10, 20, 30, 40, 50], [1, 2, 3, 4, 5]
+        )
+        sequential = repository.shard(repository.credit_account_rows)
+        sweep_shard(0, sequential, list(sequential.credit_account_rows), swept_at)
+        reports = []
+        sut = ExpireAndRenewSweep(
+            repository, workers=2, chunk_size=2, on_shard_done=reports.append
+        )
+        result = sut.run(swept_at)
+        assert [report.shard for report in result] == [0, 1, 2]
+        assert sorted(report.shard for report in reports) == [0, 1, 2]
+        assert sum(report.accounts for report in result) == 5
+        assert len(repository.credit_rows) == len(sequential.credit_rows) == 10
+        assert len(repository.credit_logs_rows) == len(sequential.credit_logs_rows)
+        for company_id in repository.credit_account_rows:
+            account = repository.load_account_by_company_id(company_id)
+            expected = sequential.load_account_by_company_id(company_id)
+            account._reference_date = expected._reference_date = swept_at
+            assert account.get_balance() == expected.get_balance()
+            assert account.count_expired() == expected.count_expired() == 0
+
+    def test_a_writer_that_loaded_before_the_sweep_gets_a_stale_account(self) -> None:
+        repository = get_repository_with_accounts([10, 20], [1, 2])
+        company_id = next(iter(repository.credit_account_rows))
+        writer_account = repository.load_account_by_company_id(company_id)
+        writer_account._reference_date = created_at
+        ExpireAndRenewSweep(repository, workers=1).run(swept_at)
+        assert repository.credit_account_rows[company_id].version == 2
+        writer_account.consume(1, "Você consumiu créditos")
+        with self.assertRaises(StaleAccountError):
+            repository.consume_credits(writer_account)
+
+    def test_an_account_written_during_the_sweep_is_left_unswept(self) -> None:
+        repository = get_repository_with_accounts([10, 20], [1, 2])
+        company_ids = list(repository.credit_account_rows)
+        result = sweep_shard(0, repository.shard(company_ids), company_ids, swept_at)
+        writer_account = repository.load_account_by_company_id(company_ids[0])
+        writer_account._reference_date = created_at
+        writer_account.consume(1, "Você consumiu créditos")
+        repository.consume_credits(writer_account)
+        logs = len(repository.credit_logs_rows)
+        ExpireAndRenewSweep(repository).merge(result)
+        assert result.report.stale_company_ids == [company_ids[0]]
+        assert repository.credit_account_rows[company_ids[0]].version == 2
+        assert repository.credit_account_rows[company_ids[1]].version == 2
+        swept = result.accounts[1]
+        assert len(repository.credit_logs_rows) == logs + len(swept.credit_logs_rows)
@@ -0,0 +1,58 @@
+import importlib.util
+import random
+from datetime import date, timedelta
+from unittest import TestCase, skipUnless
+from uuid import uuid1
+
+from credits_account.infra.repository.in_memory_credit_account_repository import (
+    CreditAccountRow,
+    InMemoryCreditAccountRepository,
+)
+
+HAS_NUMPY = importlib.util.find_spec("numpy") is not None
+
+
+@skipUnless(HAS_NUMPY, "numpy is not installed")
+class TestFleetBalanceEngine(TestCase):
+    def test_matches_the_hydrated_accounts(self) -> None:
+        from credits_account.infra.analytics.fleet_balance_engine import (
+            FleetBalanceEngine,
+        )
+
+        rnd = random.Random(3)
+        repository = InMemoryCreditAccountRepository()
+        first_day = date(2022, 1, 1)
+        company_ids = [uuid1() for _ in range(5)]
+        for company_id in company_ids:
+            repository.credit_account_rows[company_id] = CreditAccountRow(
+                first_day, first_day, id=company_id, balance=0, company_id=company_id
+            )
+            for month in range(6):
+                reference_date = first_day + timedelta(days=31 * month)
+                account = repository.load_account_by_company_id(company_id)
+                account._reference_date = reference_date
+                account.expire()
+                account.add(rnd.randrange(10, 100), "Você adicionou créditos", "a")
+                account.consume(
+                    rnd.randrange(1, 10),
+                    "Você consumiu créditos",
+                    object_type="booking",
+                    object_id=str(month),
+                )
+                if month % 2:
+                    account.refund("booking", str(month))
+                repository.save(account)
+
+        sut = FleetBalanceEngine(repository)
+        for offset in range(0, 240, 10):
+            at = first_day + timedelta(days=offset)
+            results = sut.compute(at)
+            for company_id in company_ids:
+                account = repository.load_account_by_company_id(company_id)
+                account._reference_date = at
+                assert results[company_id].balance == account.get_balance()
+                assert results[company_id].expired == account.count_expired()
+                consumed = sum(
+                    credit.get_consumed_value() for credit in account._transactions
+                )
+                assert results[company_id].movements_by_type["CONSUME"] == consumed
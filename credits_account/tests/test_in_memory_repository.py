@@ -1,16 +1,21 @@
 import datetime
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
 from datetime import date
+from itertools import zip_longest
 from typing import Any, List
 from unittest import TestCase
+from unittest.mock import patch
 from uuid import uuid1
 
+from credits_account.domain.entities import CreditAccount
 from credits_account.infra.repository.in_memory_credit_account_repository import (
     CreditAccountRow,
     CreditLogRow,
     CreditRow,
     InMemoryCreditAccountRepository,
     OperationLogRow,
+    StaleAccountError,
 )
 
 company_id = uuid1()
@@ -84,6 +89,23 @@ def get_operation_log_row() -> List[Any]:
     )
 
 
+def get_repository_with_accounts(
+    added: List[int], consumed: List[int] = []
+) -> InMemoryCreditAccountRepository:
+    repository = InMemoryCreditAccountRepository()
+    for added_value, consumed_value in zip_longest(added, consumed, fillvalue=0):
+        account_id = uuid1()
+        repository.credit_account_rows[account_id] = CreditAccountRow(
+            now, now, id=account_id, balance=0, company_id=account_id
+        )
+        account = CreditAccount(account_id, [], reference_date=now)
+        account.add(added_value, "Você adicionou créditos", "subscription")
+        if consumed_value:
+            account.consume(consumed_value, "Você consumiu créditos")
+        repository.save(account)
+    return repository
+
+
 class TestInMemoryCreditAccount(TestCase):
     def test_must_return_an_credit_account_with_previous_add_operation(self) -> None:
         sut = InMemoryCreditAccountRepository.populate(
@@ -188,3 +210,329 @@ class TestInMemoryCreditAccount(TestCase):
             recoveredAccount._transactions[-1]._usage_list[-2].operation_type
             != "EXPIRE"
         )
+
+    def test_load_only_restores_credits_from_the_requested_account(self) -> None:
+        sut = InMemoryCreditAccountRepository.populate(
+            get_account_rows(),
+            get_credit_rows(),
+            get_credit_log_rows(),
+            get_operation_log_row(),
+        )
+        other_company_id = uuid1()
+        other_account = CreditAccount(other_company_id, [], reference_date=now)
+        other_account.add(7, "Você adicionou créditos", "subscription")
+        sut.credit_account_rows[other_company_id] = CreditAccountRow(
+            now, now, balance=7, company_id=other_company_id, id=other_company_id
+        )
+        sut.add_credits(other_account)
+        account = sut.load_account_by_company_id(company_id)
+        account._reference_date = now
+        assert len(account._credit_state_list) == 1
+        assert account.get_balance() == 10
+        recovered_other_account = sut.load_account_by_company_id(other_company_id)
+        recovered_other_account._reference_date = now
+        assert len(recovered_other_account._credit_state_list) == 1
+        assert recovered_other_account.get_balance() == 7
+
+    def test_load_accounts_by_company_ids_skips_missing_accounts(self) -> None:
+        sut = InMemoryCreditAccountRepository.populate(
+            get_account_rows(),
+            get_credit_rows(),
+            get_credit_log_rows(),
+            get_operation_log_row(),
+        )
+        missing_company_id = uuid1()
+        accounts = sut.load_accounts_by_company_ids(
+            [company_id, missing_company_id, company_id]
+        )
+        assert list(accounts) == [company_id]
+        account = accounts[company_id]
+        account._reference_date = now
+        assert account.get_balance() == 10
+
+    def test_save_only_persists_movements_created_since_load(self) -> None:
+        sut = InMemoryCreditAccountRepository.populate(
+            get_account_rows(),
+            get_credit_rows(),
+            get_credit_log_rows(),
+            get_operation_log_row(),
+        )
+        account = sut.load_account_by_company_id(company_id)
+        account._reference_date = now
+        assert account.get_pending_transactions() == []
+        account.add(5, "Você adicionou créditos", "subscription")
+        account.consume(
+            12, "Você consumiu créditos", object_type="booking", object_id="1"
+        )
+        account.refund("booking", "1")
+        assert len(account.get_pending_transactions()) == 2
+        sut.save(account)
+        assert account.get_pending_transactions() == []
+        assert len(sut.credit_rows) == 2
+        assert len(sut.credit_logs_rows) == 6
+        assert len(sut.operation_logs_rows) == 6
+        sut.save(account)
+        assert len(sut.credit_logs_rows) == 6
+        recovered_account = sut.load_account_by_company_id(company_id)
+        recovered_account._reference_date = now
+        assert recovered_account.get_balance() == 15
+        assert recovered_account.is_refunded("booking", "1")
+
+    def test_columnar_storage_round_trip(self) -> None:
+        sut = InMemoryCreditAccountRepository.populate(
+            get_account_rows(),
+            get_credit_rows(),
+            get_credit_log_rows(),
+            get_operation_log_row(),
+        )
+        sut.columnar_storage = True
+        account = sut.load_account_by_company_id(company_id)
+        account._reference_date = now
+        account.consume(
+            4, "Você consumiu créditos", object_type="booking", object_id="1"
+        )
+        sut.save(account)
+        recovered_account = sut.load_account_by_company_id(company_id)
+        recovered_account._reference_date = now
+        assert recovered_account.get_balance() == 6
+        consume = recovered_account._credit_state_list[0]._usage_list[-1]
+        assert consume.id in sut.credit_logs_rows
+        assert recovered_account.refund("booking", "1")
+        assert recovered_account.get_balance() == 10
+
+    def test_concurrent_writes_on_the_same_account_are_detected(self) -> None:
+        sut = InMemoryCreditAccountRepository.populate(
+            get_account_rows(),
+            get_credit_rows(),
+            get_credit_log_rows(),
+            get_operation_log_row(),
+        )
+        first = sut.load_account_by_company_id(company_id)
+        second = sut.load_account_by_company_id(company_id)
+        for account in (first, second):
+            account._reference_date = now
+            account.consume(8, "Você consumiu créditos")
+        sut.consume_credits(first)
+        with self.assertRaises(StaleAccountError):
+            sut.consume_credits(second)
+        assert second.get_pending_transactions()
+        sut.consume_credits(first)
+        recovered_account = sut.load_account_by_company_id(company_id)
+        recovered_account._reference_date = now
+        assert recovered_account.get_balance() == 2
+        assert recovered_account.version == first.version == 2
+
+    def test_threads_writing_different_accounts_do_not_conflict(self) -> None:
+        sut = InMemoryCreditAccountRepository(lock_stripes=4)
+        company_ids = [uuid1() for _ in range(16)]
+        for account_id in company_ids:
+            sut.credit_account_rows[account_id] = CreditAccountRow(
+                now, now, id=account_id, balance=0, company_id=account_id
+            )
+            account = CreditAccount(account_id, [], reference_date=now)
+            account.add(50, "Você adicionou créditos", "subscription")
+            sut.save(account)
+
+        def consume_all(account_id) -> int:
+            for _ in range(50):
+                account = sut.load_account_by_company_id(account_id)
+                account._reference_date = now
+                account.consume(1, "Você consumiu créditos")
+                sut.save(account)
+            return account.version
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            versions = list(executor.map(consume_all, company_ids))
+        assert versions == [51] * 16
+        for account_id in company_ids:
+            account = sut.load_account_by_company_id(account_id)
+            account._reference_date = now
+            assert account.get_balance() == 0
+
+    def test_loads_replay_only_movements_after_the_latest_snapshot(self) -> None:
+        sut = InMemoryCreditAccountRepository.populate(
+            get_account_rows(),
+            get_credit_rows(),
+            get_credit_log_rows(),
+            get_operation_log_row(),
+        )
+        sut.snapshot_every = 3
+        for object_id in ("1", "2", "3"):
+            account = sut.load_account_by_company_id(company_id)
+            account._reference_date = now
+            account.consume(
+                2,
+                "Você consumiu créditos",
+                object_type="booking",
+                object_id=object_id,
+            )
+            sut.consume_credits(account)
+        assert sut.credit_snapshots[credit_row_id].movements == 3
+        recovered_account = sut.load_account_by_company_id(company_id)
+        recovered_account._reference_date = now
+        credit = recovered_account._credit_state_list[0]
+        assert len(credit._usage_list) == 1
+        assert recovered_account.get_balance() == 4
+        assert recovered_account.refund("booking", "1")
+        sut.save(recovered_account)
+        assert sut.take_snapshots(company_id) == 1
+        assert sut.credit_snapshots[credit_row_id].movements == 5
+        recovered_account = sut.load_account_by_company_id(company_id)
+        recovered_account._reference_date = now
+        assert len(recovered_account._credit_state_list[0]._usage_list) == 0
+        assert recovered_account.get_balance() == 6
+        assert recovered_account.is_refunded("booking", "1")
+        assert not recovered_account.refund("booking", "1")
+        assert recovered_account.refund("booking", "3")
+
+    def test_compacted_credits_are_loaded_only_when_a_refund_needs_them(
+        self,
+    ) -> None:
+        sut = InMemoryCreditAccountRepository.populate(
+            get_account_rows(),
+            get_credit_rows(),
+            get_credit_log_rows(),
+            get_operation_log_row(),
+        )
+        account = sut.load_account_by_company_id(company_id)
+        account._reference_date = now
+        account.consume(4, "Você consumiu créditos", object_type="a", object_id="1")
+        sut.consume_credits(account)
+        account._reference_date = date(2022, 10, 1)
+        account.expire()
+        sut.expire(account)
+        sut.compact_on_load = True
+        compacted_account = sut.load_account_by_company_id(company_id)
+        assert compacted_account.version == account.version + 1
+        with self.assertRaises(StaleAccountError):
+            sut.save(account)
+        (period,) = sut.archived_periods[company_id]
+        assert period.credit_ids == [credit_row_id]
+        assert (period.consumed_value, period.expired_value) == (-4, -6)
+        recovered_account = sut.load_account_by_company_id(company_id)
+        assert recovered_account._credit_state_list == []
+        assert recovered_account.refund("a", "1")
+        assert len(recovered_account._credit_state_list) == 1
+        sut.save(recovered_account)
+        assert sut.archived_periods[company_id] == []
+        sut.compact_on_load = False
+        refunded_account = sut.load_account_by_company_id(company_id)
+        assert refunded_account.is_refunded("a", "1")
+        assert refunded_account.count_expired() == 4
+
+    def test_log_iterators_are_not_broken_by_concurrent_writes(self) -> None:
+        sut = InMemoryCreditAccountRepository.populate(
+            get_account_rows(),
+            get_credit_rows(),
+            get_credit_log_rows(),
+            get_operation_log_row(),
+        )
+        account = sut.load_account_by_company_id(company_id)
+        account._reference_date = now
+        account.consume(2, "Você consumiu créditos")
+        sut.consume_credits(account)
+        for account_id in (None, company_id):
+            expected_credit_logs = list(sut.iter_credit_logs(account_id))
+            expected_operation_logs = list(sut.iter_operation_logs(account_id))
+            credit_logs = sut.iter_credit_logs(account_id)
+            operation_logs = sut.iter_operation_logs(account_id)
+            first_rows = [next(credit_logs), next(operation_logs)]
+            account.consume(1, "Você consumiu créditos")
+            sut.consume_credits(account)
+            assert [first_rows[0], *credit_logs] == expected_credit_logs
+            assert [first_rows[1], *operation_logs] == expected_operation_logs
+        assert len(list(sut.iter_credit_logs(company_id, "consume"))) == 3
+        assert list(sut.iter_credit_logs(uuid1())) == []
+
+    def test_log_iterators_release_the_locks_between_chunks(self) -> None:
+        sut = get_repository_with_accounts([10, 10], [1, 2])
+        expected_credit_logs = list(sut.iter_credit_logs(operation="consume"))
+        expected_operation_logs = list(sut.iter_operation_logs())
+        with patch(
+            "credits_account.infra.repository.in_memory_credit_account_repository"
+            ".STREAM_CHUNK_SIZE",
+            1,
+        ):
+            credit_logs = sut.iter_credit_logs(operation="consume")
+            operation_logs = sut.iter_operation_logs()
+            first_rows = [next(credit_logs), next(operation_logs)]
+            assert not any(lock.locked() for lock in sut._locks)
+            assert [first_rows[0], *credit_logs] == expected_credit_logs
+            assert [first_rows[1], *operation_logs] == expected_operation_logs
+        assert len(expected_credit_logs) == 2
+        assert len(expected_operation_logs) == 4
+
+    def test_operation_writes_keep_pending_movements_of_other_types(self) -> None:
+        sut = InMemoryCreditAccountRepository.populate(
+            get_account_rows(),
+            get_credit_rows(),
+            get_credit_log_rows(),
+            get_operation_log_row(),
+        )
+        account = sut.load_account_by_company_id(company_id)
+        account._reference_date = now
+        account.consume(3, "Você consumiu créditos", object_type="a", object_id="1")
+        sut.consume_credits(account)
+        assert account.refund("a", "1")
+        account.consume(2, "Você consumiu créditos")
+        sut.expire(account)
+        sut.consume_credits(account)
+        (credit,) = account.get_pending_transactions()
+        assert [use.operation_type for use in credit.get_pending_movements()] == [
+            "REFUND"
+        ]
+        sut.save(account)
+        assert account.get_pending_transactions() == []
+        recovered_account = sut.load_account_by_company_id(company_id)
+        recovered_account._reference_date = now
+        assert recovered_account.get_balance() == account.get_balance() == 8
+        assert recovered_account.is_refunded("a", "1")
+
+    def test_snapshots_do_not_change_a_renewed_account(self) -> None:
+        results = []
+        for snapshot_every in (None, 1):
+            sut = InMemoryCreditAccountRepository.populate(
+                get_account_rows(),
+                get_credit_rows(),
+                get_credit_log_rows(),
+                get_operation_log_row(),
+            )
+            sut.snapshot_every = snapshot_every
+            account = sut.load_account_by_company_id(company_id)
+            account._reference_date = date(2022, 10, 5)
+            account.expire()
+            sut.expire(account)
+            account.renew()
+            sut.save(account)
+            recovered_account = sut.load_account_by_company_id(company_id)
+            recovered_account._reference_date = date(2022, 11, 3)
+            results.append(
+                (
+                    recovered_account.get_balance(),
+                    [
+                        credit.get_expiration_date()
+                        for credit in recovered_account._credit_state_list
+                    ],
+                )
+            )
+        assert results[0] == results[1] == (10, [date(2022, 10, 1), date(2022, 11, 5)])
+
+    def test_creating_an_existing_account_keeps_its_version(self) -> None:
+        sut = InMemoryCreditAccountRepository.populate(
+            get_account_rows(),
+            get_credit_rows(),
+            get_credit_log_rows(),
+            get_operation_log_row(),
+        )
+        account = sut.load_account_by_company_id(company_id)
+        account._reference_date = now
+        account.consume(3, "Você consumiu créditos")
+        sut.consume_credits(account)
+        with self.assertRaises(ValueError):
+            sut.create_account(CreditAccount(company_id, [], reference_date=now))
+        assert account.version == sut.credit_account_rows[company_id].version == 1
+        account.consume(2, "Você consumiu créditos")
+        sut.consume_credits(account)
+        recovered_account = sut.load_account_by_company_id(company_id)
+        recovered_account._reference_date = now
+        assert recovered_account.get_balance() == 5
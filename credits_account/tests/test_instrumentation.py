@@ -0,0 +1,77 @@
+import logging
+from datetime import date
+from unittest import TestCase
+from uuid import uuid1
+
+from credits_account.domain import instrumentation
+from credits_account.domain.entities import CreditAccount
+from credits_account.infra.metrics.metrics_sinks import (
+    InMemoryMetricsSink,
+    LoggingMetricsSink,
+    PrometheusMetricsSink,
+)
+from credits_account.infra.repository.in_memory_credit_account_repository import (
+    CreditAccountRow,
+    InMemoryCreditAccountRepository,
+)
+
+now = date(2022, 9, 1)
+
+
+class TestInstrumentation(TestCase):
+    def tearDown(self) -> None:
+        instrumentation.disable()
+
+    def test_disabled_instrumentation_leaves_the_hot_paths_untouched(self) -> None:
+        consume = CreditAccount.__dict__["consume"]
+        instrumentation.enable(InMemoryMetricsSink())
+        assert CreditAccount.__dict__["consume"] is not consume
+        instrumentation.disable()
+        assert CreditAccount.__dict__["consume"] is consume
+        assert not instrumentation.enabled
+
+    def test_records_calls_latencies_and_counts(self) -> None:
+        sink = PrometheusMetricsSink()
+        instrumentation.enable(sink)
+        company_id = uuid1()
+        repository = InMemoryCreditAccountRepository()
+        repository.credit_account_rows[company_id] = CreditAccountRow(
+            now, now, id=company_id, balance=0, company_id=company_id
+        )
+        account = CreditAccount(company_id, [], reference_date=now)
+        account.add(10, "Você adicionou créditos", "subscription")
+        account.add(10, "Você adicionou créditos", "subscription")
+        repository.add_credits(account)
+        account.consume(15, "Você consumiu créditos")
+        repository.consume_credits(account)
+        repository.load_account_by_company_id(company_id)
+
+        consume_many = sink.operations["CreditAccount.consume_many"]
+        assert sink.operations["CreditAccount.consume"].calls == 1
+        assert consume_many.counts == {"transactions_scanned": 2}
+        assert sum(consume_many.buckets) == 1
+        add_credits = sink.operations["InMemoryCreditAccountRepository.add_credits"]
+        assert add_credits.counts == {"rows_touched": 6}
+        load = sink.operations[
+            "InMemoryCreditAccountRepository.load_account_by_company_id"
+        ]
+        assert load.counts == {"rows_touched": 11}
+        rendered = sink.render()
+        assert (
+            'credits_account_calls_total{operation="CreditAccount.consume"} 1'
+            in rendered
+        )
+        assert (
+            'credits_account_call_seconds_count{operation="CreditAccount.consume"} 1'
+            in rendered
+        )
+        assert "# TYPE credits_account_rows_touched_total counter" in rendered
+
+    def test_logging_sink(self) -> None:
+        instrumentation.enable(LoggingMetricsSink(level=logging.INFO))
+        account = CreditAccount(uuid1(), [], reference_date=now)
+        with self.assertLogs("credits_account.metrics", logging.INFO) as logs:
+            account.get_balance()
+        assert logs.output[0].startswith(
+            "INFO:credits_account.metrics:CreditAccount.get_balance took"
+        )
@@ -0,0 +1,62 @@
+import io
+import json
+from datetime import date
+from unittest import TestCase
+from uuid import uuid1
+
+from credits_account.infra.export.log_export import write_csv, write_jsonl
+from credits_account.infra.repository.in_memory_credit_account_repository import (
+    InMemoryCreditAccountRepository,
+)
+from credits_account.infra.repository.sqlite_credit_account_repository import (
+    SQLiteCreditAccountRepository,
+)
+from credits_account.tests.test_in_memory_repository import (
+    company_id,
+    get_account_rows,
+    get_credit_log_rows,
+    get_credit_rows,
+    get_operation_log_row,
+    now,
+)
+
+
+class TestLogExport(TestCase):
+    def test_repositories_stream_filtered_logs_to_jsonl_and_csv(self) -> None:
+        for repository_class in (
+            InMemoryCreditAccountRepository,
+            SQLiteCreditAccountRepository,
+        ):
+            sut = repository_class.populate(
+                get_account_rows(),
+                get_credit_rows(),
+                get_credit_log_rows(),
+                get_operation_log_row(),
+            )
+            account = sut.load_account_by_company_id(company_id)
+            account._reference_date = date(2022, 9, 20)
+            account.consume(3, "Você consumiu créditos", object_id="1")
+            sut.consume_credits(account)
+
+            consumes = sut.iter_operation_logs(
+                company_id, "consume", start=date(2022, 9, 2)
+            )
+            stream = io.StringIO()
+            assert write_jsonl(consumes, stream, chunk_size=1) == 1
+            (record,) = [json.loads(line) for line in stream.getvalue().splitlines()]
+            assert record["operation"] == "CONSUME"
+            assert record["object_id"] == "1"
+            assert record["created_at"] == "2022-09-20"
+
+            credit_logs = sut.iter_credit_logs(
+                company_id, start=now, end=date(2023, 1, 1)
+            )
+            stream = io.StringIO()
+            assert write_csv(credit_logs, stream, chunk_size=1) == 2
+            header, *lines = stream.getvalue().splitlines()
+            assert header.startswith("created_at,updated_at,credit_moviment")
+            assert [line.split(",")[2] for line in lines] == ["10", "-3"]
+
+            assert list(sut.iter_credit_logs(company_id, "ADD", end=now)) == []
+            assert list(sut.iter_operation_logs(uuid1())) == []
+            assert write_csv(iter(()), stream) == 0
@@ -0,0 +1,81 @@
+import importlib.util
+import os
+import tempfile
+from datetime import date
+from unittest import TestCase, skipUnless
+
+from credits_account.infra.analytics.log_segment import LogSegment, write_log_segment
+from credits_account.infra.repository.in_memory_credit_account_repository import (
+    InMemoryCreditAccountRepository,
+)
+from credits_account.tests.test_in_memory_repository import (
+    company_id,
+    credit_row_id,
+    get_account_rows,
+    get_credit_log_rows,
+    get_credit_rows,
+    get_operation_log_row,
+    now,
+)
+
+HAS_NUMPY = importlib.util.find_spec("numpy") is not None
+
+
+class TestLogSegment(TestCase):
+    def setUp(self) -> None:
+        repository = InMemoryCreditAccountRepository.populate(
+            get_account_rows(),
+            get_credit_rows(),
+            get_credit_log_rows(),
+            get_operation_log_row(),
+        )
+        account = repository.load_account_by_company_id(company_id)
+        account._reference_date = date(2022, 9, 15)
+        account.consume(4, "Você consumiu créditos", date(2022, 9, 15))
+        repository.consume_credits(account)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "credit_logs.segment")
+        rows = (
+            (row, repository.operation_logs_rows[row.operation_id].operation)
+            for row in repository.iter_credit_logs()
+        )
+        assert write_log_segment(self.path, rows, chunk_size=1) == 2
+
+    def test_columns_are_exposed_as_memoryviews(self) -> None:
+        with LogSegment(self.path) as segment:
+            assert len(segment) == 2
+            assert (segment.first_date, segment.last_date) == (
+                now,
+                date(2022, 9, 15),
+            )
+            movements = segment.memoryview("movement")
+            codes = segment.memoryview("operation_code")
+            account_ids = segment.memoryview("account_id")
+            assert movements.tolist() == [10, -4]
+            assert codes.tolist() == [1, 2]
+            credit_ids = segment.memoryview("credit_id")
+            assert bytes(account_ids[16:32]) == company_id.bytes
+            assert bytes(credit_ids[:16]) == credit_row_id.bytes
+            for view in (movements, codes, account_ids, credit_ids):
+                view.release()
+
+    @skipUnless(HAS_NUMPY, "numpy is not installed")
+    def test_columns_are_exposed_as_numpy_arrays(self) -> None:
+        import numpy as np
+
+        segment = LogSegment(self.path)
+        movements = segment.numpy("movement")
+        dates = segment.numpy("date")
+        assert not movements.flags.owndata
+        assert int(movements[segment.numpy("operation_code") == 2].sum()) == -4
+        assert dates[1] == np.datetime64("2022-09-15")
+        assert segment.numpy("account_id")[0].tobytes() == company_id.bytes
+        del movements, dates
+        segment.close()
+
+    def test_rejects_files_that_are_not_segments(self) -> None:
+        with open(self.path, "r+b") as segment:
+            segment.write(b"NOPE")
+        with self.assertRaises(ValueError):
+            LogSegment(self.path)
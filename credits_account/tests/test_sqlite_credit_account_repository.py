@@ -0,0 +1,296 @@
+from datetime import date, datetime
+from typing import List
+from unittest import TestCase
+from uuid import uuid1
+
+from credits_account.domain.entities import CreditAccount
+from credits_account.infra.repository.in_memory_credit_account_repository import (
+    CreditLogRow,
+    OperationLogRow,
+    StaleAccountError,
+)
+from credits_account.infra.repository.sqlite_credit_account_repository import (
+    SQLiteCreditAccountRepository,
+)
+from credits_account.tests.test_in_memory_repository import (
+    company_id,
+    credit_row_id,
+    get_account_rows,
+    get_credit_log_rows,
+    get_credit_rows,
+    get_operation_log_row,
+    now,
+)
+
+
+def make_sut() -> SQLiteCreditAccountRepository:
+    sut = SQLiteCreditAccountRepository.populate(
+        get_account_rows(),
+        get_credit_rows(),
+        get_credit_log_rows(),
+        get_operation_log_row(),
+    )
+    sut.contracted_service_creation_date = now
+    return sut
+
+
+class TestSQLiteCreditAccountRepository(TestCase):
+    def test_must_return_an_credit_account_with_previous_add_operation(self) -> None:
+        sut = make_sut()
+        account = sut.load_account_by_company_id(company_id)
+        account._reference_date = now
+        assert account.get_balance() == 10
+        assert account._credit_state_list[0].contract_service_creation_date == now
+        assert sut.load_account_by_company_id(uuid1()) is None
+
+    def test_add_consume_and_expire_round_trip(self) -> None:
+        sut = make_sut()
+        account = sut.load_account_by_company_id(company_id)
+        account._reference_date = now
+        account.add(100, "Você adicionou créditos", "subscription")
+        sut.add_credits(account)
+        account.consume(
+            105, "Você consumiu créditos", object_type="booking", object_id="1"
+        )
+        sut.consume_credits(account)
+        recovered_account = sut.load_account_by_company_id(company_id)
+        recovered_account._reference_date = now
+        assert recovered_account.get_balance() == 5
+        assert recovered_account.refund("booking", "1")
+        sut.save(recovered_account)
+        recovered_account._reference_date = date(2022, 10, 1)
+        recovered_account.expire()
+        sut.expire(recovered_account)
+        expired_account = sut.load_account_by_company_id(company_id)
+        expired_account._reference_date = date(2022, 10, 1)
+        assert expired_account.get_balance() == 0
+        assert expired_account.is_refunded("booking", "1")
+        assert expired_account._transactions[0]._usage_list[-1].operation_type == (
+            "EXPIRE"
+        )
+
+    def test_save_writes_only_pending_movements(self) -> None:
+        sut = make_sut()
+        account = sut.load_account_by_company_id(company_id)
+        account._reference_date = now
+        account.consume(3, "Você consumiu créditos")
+        sut.save(account)
+        sut.save(account)
+        other_company_id = uuid1()
+        other_account = CreditAccount(other_company_id, [], reference_date=now)
+        sut.create_account(other_account)
+        assert sut.load_accounts_by_company_ids(
+            [company_id, other_company_id, uuid1()]
+        ).keys() == {company_id, other_company_id}
+        count = sut._connection.execute("SELECT COUNT(*) FROM credit_logs").fetchone()
+        assert count == (2,)
+
+    def test_stale_account_cannot_be_saved(self) -> None:
+        sut = make_sut()
+        first = sut.load_account_by_company_id(company_id)
+        second = sut.load_account_by_company_id(company_id)
+        for account in (first, second):
+            account._reference_date = now
+            account.consume(8, "Você consumiu créditos")
+        sut.save(first)
+        with self.assertRaises(StaleAccountError):
+            sut.save(second)
+        recovered_account = sut.load_account_by_company_id(company_id)
+        recovered_account._reference_date = now
+        assert recovered_account.get_balance() == 2
+        assert recovered_account.version == 1
+
+    def test_loads_replay_only_movements_after_the_latest_snapshot(self) -> None:
+        sut = make_sut()
+        sut.snapshot_every = 2
+        for object_id in ("1", "2", "3"):
+            account = sut.load_account_by_company_id(company_id)
+            account._reference_date = now
+            account.consume(
+                2,
+                "Você consumiu créditos",
+                object_type="booking",
+                object_id=object_id,
+            )
+            sut.consume_credits(account)
+        recovered_account = sut.load_account_by_company_id(company_id)
+        recovered_account._reference_date = now
+        assert len(recovered_account._credit_state_list[0]._usage_list) == 0
+        assert recovered_account.get_balance() == 4
+        assert recovered_account.refund("booking", "2")
+        sut.save(recovered_account)
+        recovered_account = sut.load_account_by_company_id(company_id)
+        recovered_account._reference_date = now
+        assert len(recovered_account._credit_state_list[0]._usage_list) == 1
+        assert recovered_account.get_balance() == 6
+        assert recovered_account.is_refunded("booking", "2")
+        assert sut.take_snapshots(company_id) == 1
+
+    def test_a_stale_flush_can_be_retried(self) -> None:
+        sut = make_sut()
+        first = sut.load_account_by_company_id(company_id)
+        second = sut.load_account_by_company_id(company_id)
+        first._reference_date = second._reference_date = now
+        first.consume(1, "Você consumiu créditos")
+        sut.consume_credits(first)
+        second.add(100, "Você adicionou créditos", "subscription")
+        second.consume(2, "Você consumiu créditos")
+        with self.assertRaises(StaleAccountError):
+            sut.add_credits(second)
+        new_credit = second._credit_state_list[-1]
+        assert new_credit.id is None
+        assert all(use.id is None for use in new_credit.get_pending_movements())
+        second.version = first.version
+        sut.add_credits(second)
+        sut.consume_credits(second)
+        recovered_account = sut.load_account_by_company_id(company_id)
+        recovered_account._reference_date = now
+        assert len(recovered_account._credit_state_list) == 2
+        assert recovered_account.get_balance() == 107
+
+    def test_compacted_credits_are_loaded_only_when_a_refund_needs_them(
+        self,
+    ) -> None:
+        sut = make_sut()
+        account = sut.load_account_by_company_id(company_id)
+        account._reference_date = now
+        account.consume(4, "Você consumiu créditos", object_type="a", object_id="1")
+        sut.consume_credits(account)
+        account._reference_date = date(2022, 10, 1)
+        account.expire()
+        sut.expire(account)
+        sut.compact_on_load = True
+        compacted_account = sut.load_account_by_company_id(company_id)
+        assert compacted_account.version == account.version + 1
+        with self.assertRaises(StaleAccountError):
+            sut.save(account)
+        recovered_account = sut.load_account_by_company_id(company_id)
+        assert recovered_account._credit_state_list == []
+        (period,) = recovered_account.get_archived_periods()
+        assert (period.consumed_value, period.expired_value) == (-4, -6)
+        assert period.refundable_origins == {("a", "1"): [credit_row_id]}
+        assert recovered_account.refund("a", "1")
+        assert len(recovered_account._credit_state_list) == 1
+        sut.save(recovered_account)
+        sut.compact_on_load = False
+        refunded_account = sut.load_account_by_company_id(company_id)
+        assert refunded_account.get_archived_periods() == []
+        assert refunded_account.is_refunded("a", "1")
+        assert refunded_account.count_expired() == 4
+
+    def test_log_date_filters_compare_stored_dates_through_the_index(self) -> None:
+        sut = make_sut()
+        created_at = datetime(2022, 9, 1, 10)
+        operation_id = uuid1()
+        sut.import_rows(
+            [],
+            [
+                CreditLogRow(
+                    created_at,
+                    created_at,
+                    -3,
+                    account_id=company_id,
+                    credit_id=credit_row_id,
+                    operation_id=operation_id,
+                    id=uuid1(),
+                )
+            ],
+            [
+                OperationLogRow(
+                    created_at,
+                    created_at,
+                    company_id,
+                    "Você consumiu créditos",
+                    -3,
+                    "CONSUME",
+                    account_id=company_id,
+                    id=operation_id,
+                )
+            ],
+        )
+
+        def movements(start: date, end: date) -> List[int]:
+            return [
+                row.credit_moviment
+                for row in sut.iter_credit_logs(company_id, start=start, end=end)
+            ]
+
+        assert movements(now, date(2022, 9, 2)) == [10, -3]
+        assert movements(datetime(2022, 9, 1, 10), date(2022, 9, 2)) == [-3]
+        assert movements(datetime(2022, 8, 31), datetime(2022, 9, 1, 10)) == [10]
+        assert movements(date(2022, 9, 2), date(2023, 1, 1)) == []
+        where, parameters = sut._log_filters(
+            "l", company_id, None, now, datetime(2022, 9, 1, 10)
+        )
+        ((*_, plan),) = sut._connection.execute(
+            f"EXPLAIN QUERY PLAN SELECT l.id FROM credit_logs AS l {where}",
+            parameters,
+        ).fetchall()
+        assert "credit_logs_account_created_at" in plan
+        assert "created_at>? AND created_at<?" in plan
+
+    def test_operation_writes_keep_pending_movements_of_other_types(self) -> None:
+        sut = make_sut()
+        account = sut.load_account_by_company_id(company_id)
+        account._reference_date = now
+        account.consume(3, "Você consumiu créditos", object_type="a", object_id="1")
+        sut.consume_credits(account)
+        assert account.refund("a", "1")
+        account.consume(2, "Você consumiu créditos")
+        sut.expire(account)
+        sut.consume_credits(account)
+        (credit,) = account.get_pending_transactions()
+        assert [use.operation_type for use in credit.get_pending_movements()] == [
+            "REFUND"
+        ]
+        sut.save(account)
+        assert account.get_pending_transactions() == []
+        recovered_account = sut.load_account_by_company_id(company_id)
+        recovered_account._reference_date = now
+        assert recovered_account.get_balance() == account.get_balance() == 8
+        assert recovered_account.is_refunded("a", "1")
+
+    def test_snapshots_do_not_change_a_renewed_account(self) -> None:
+        results = []
+        for snapshot_every in (None, 1):
+            sut = SQLiteCreditAccountRepository.populate(
+                get_account_rows(),
+                get_credit_rows(),
+                get_credit_log_rows(),
+                get_operation_log_row(),
+            )
+            sut.snapshot_every = snapshot_every
+            account = sut.load_account_by_company_id(company_id)
+            account._reference_date = date(2022, 10, 5)
+            account.expire()
+            sut.expire(account)
+            account.renew()
+            sut.save(account)
+            recovered_account = sut.load_account_by_company_id(company_id)
+            recovered_account._reference_date = date(2022, 11, 3)
+            results.append(
+                (
+                    recovered_account.get_balance(),
+                    [
+                        credit.get_expiration_date()
+                        for credit in recovered_account._credit_state_list
+                    ],
+                )
+            )
+        assert results[0] == results[1] == (10, [date(2022, 10, 1), date(2022, 11, 5)])
+
+    def test_creating_an_existing_account_keeps_its_version(self) -> None:
+        sut = make_sut()
+        account = sut.load_account_by_company_id(company_id)
+        account._reference_date = now
+        account.consume(3, "Você consumiu créditos")
+        sut.consume_credits(account)
+        with self.assertRaises(ValueError):
+            sut.create_account(CreditAccount(company_id, [], reference_date=now))
+        stored_account = sut.load_account_by_company_id(company_id)
+        assert account.version == stored_account.version == 1
+        account.consume(2, "Você consumiu créditos")
+        sut.consume_credits(account)
+        recovered_account = sut.load_account_by_company_id(company_id)
+        recovered_account._reference_date = now
+        assert recovered_account.get_balance() == 5